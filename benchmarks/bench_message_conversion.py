@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark and cross-check memoized conversion of long conversations.
+
+Builds a synthetic Claude Code session (tool calls that read, edit and write files,
+tool results of varying size) and replays it turn by turn the way clients resend it: each
+turn is the whole transcript so far, parsed afresh. Every turn is converted with the
+message cache disabled and enabled, the outputs are asserted identical, and the
+per-turn conversion cost of the last turns is reported.
+
+Usage:
+    python benchmarks/bench_message_conversion.py [--messages 200] [--turns 20] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.core.config import config
+from src.core.model_manager import ModelManager
+from src.conversion.message_cache import message_cache
+from src.conversion.request_converter import convert_claude_to_openai
+from src.models.claude import ClaudeMessagesRequest
+
+SYSTEM_PROMPT = "You are an interactive CLI tool that helps users with software engineering tasks. " * 80
+TOOLS = [
+    {"name": name, "description": f"{name} tool. " * 20, "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}}}
+    for name in ("Read", "Edit", "Write", "Bash", "Grep", "Glob")
+]
+
+
+def session(messages: int, seed: int = 0):
+    """A user task followed by assistant tool calls and their results."""
+    rng = random.Random(seed)
+    transcript = [{"role": "user", "content": [{"type": "text", "text": "Fix the failing tests in src/ and explain the cause."}]}]
+    index = 0
+    while len(transcript) < messages:
+        tool_id = f"toolu_{seed:02d}{index:05d}"
+        tool = rng.choice(TOOLS)["name"]
+        if tool == "Edit":
+            tool_input = {"file_path": f"src/module_{index}.py", "old_string": "x = 1\n" * rng.randint(1, 20), "new_string": "x = 2\n" * rng.randint(1, 20)}
+        elif tool == "Write":
+            body = "".join(f"    result_{line} = helper(\"{line}\", ünïcode=True)\n" for line in range(rng.randint(20, 200)))
+            tool_input = {"file_path": f"src/module_{index}.py", "content": f"def generated_{index}():\n{body}"}
+        else:
+            tool_input = {"path": f"src/module_{index}.py", "limit": 200, "flags": ["-n", "--color=never"]}
+        transcript.append({"role": "assistant", "content": [
+            {"type": "text", "text": f"Next I will run {tool} on module {index}."},
+            {"type": "tool_use", "id": tool_id, "name": tool, "input": tool_input},
+        ]})
+        output = "".join(f"{line:5d}  value = compute(item_{line}, ünïcode)\n" for line in range(rng.randint(5, 400)))
+        transcript.append({"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": tool_id, "content": [{"type": "text", "text": output}]},
+        ]})
+        index += 1
+    return transcript[:messages]
+
+
+def request_json(transcript) -> str:
+    return json.dumps({
+        "model": "claude-sonnet-4", "max_tokens": 4096, "stream": True,
+        "system": SYSTEM_PROMPT, "tools": TOOLS, "messages": transcript,
+    })
+
+
+def convert_turns(bodies, model_manager, cache_bytes: int):
+    config.conversion_cache_max_bytes = cache_bytes
+    outputs = []
+    elapsed = []
+    for body in bodies:
+        request = ClaudeMessagesRequest.model_validate_json(body)
+        start = time.perf_counter()
+        outputs.append(convert_claude_to_openai(request, model_manager))
+        elapsed.append(time.perf_counter() - start)
+    return outputs, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    transcript = session(args.messages)
+    # Clients resend the transcript growing by one tool round trip per turn
+    first = max(1, args.messages - 2 * args.turns + 1)
+    bodies = [request_json(transcript[:end]) for end in range(first, args.messages + 1, 2)]
+    model_manager = ModelManager(config)
+    cache_bytes = config.conversion_cache_max_bytes or 33554432
+
+    best_off = best_on = float("inf")
+    for _ in range(args.repeat):
+        uncached, off = convert_turns(bodies, model_manager, 0)
+        message_cache.__init__()
+        cached, on = convert_turns(bodies, model_manager, cache_bytes)
+        assert cached == uncached
+        # The first turn fills the cache; steady state is every later turn
+        best_off = min(best_off, sum(off[1:]) / len(off[1:]))
+        best_on = min(best_on, sum(on[1:]) / len(on[1:]))
+
+    print(f"session: {args.messages} messages, {len(bodies)} turns, {len(bodies[-1]) // 1024} KiB per request")
+    print(f"  convert, no cache  : {best_off * 1e3:7.3f} ms/turn")
+    print(f"  convert, memoized  : {best_on * 1e3:7.3f} ms/turn")
+    print(f"  speedup            : {best_off / best_on:7.2f}x")
+    print(f"  cache              : {message_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark and cross-check decoding of /v1/messages bodies turn by turn.
+
+Replays a long conversation the way clients resend it (each turn is the whole
+transcript so far) and decodes every turn three ways: as FastAPI's body parameter
+did (stdlib json.loads, then model_validate), with the request decoder validating
+everything (DECODE_CACHE_MAX_BYTES=0) and with the request decoder reusing the
+messages validated on the previous turn. All three are asserted to decode and
+convert to the same OpenAI request; decode and decode+convert (message cache on)
+time per turn is reported relative to the FastAPI baseline. By default the turns
+are a synthetic Claude Code session with tool results and base64 images; --input
+takes recorded request bodies (JSON files) of one conversation, in order.
+
+Usage:
+    python benchmarks/bench_request_decoding.py [--messages 300] [--turns 20] [--repeat 5]
+    python benchmarks/bench_request_decoding.py --input recorded/*.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bench_message_conversion import request_json, session
+from src.core import json_backend
+from src.core.config import config
+from src.core.model_manager import ModelManager
+from src.conversion.message_cache import message_cache
+from src.conversion.request_converter import convert_claude_to_openai
+from src.conversion.request_decoder import RequestDecoder
+from src.models.claude import ClaudeMessagesRequest
+
+IMAGE_BYTES = 24 * 1024
+CACHE_BYTES = 67108864
+
+
+def with_images(transcript, every: int = 20, seed: int = 0):
+    """Attach a base64 screenshot to every `every`-th tool result."""
+    rng = random.Random(seed)
+    data = base64.b64encode(rng.randbytes(IMAGE_BYTES)).decode("ascii")
+    for index, message in enumerate(transcript):
+        if message["role"] == "user" and index % every == 2:
+            message["content"].append({"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": data}})
+    return transcript
+
+
+def fastapi_decode(body: bytes, client_key=None) -> ClaudeMessagesRequest:
+    return ClaudeMessagesRequest.model_validate(json.loads(body))
+
+
+def replay(bodies, decode, model_manager, convert: bool):
+    """Per-turn time of decoding (and converting) every body, in order."""
+    elapsed = []
+    requests = []
+    for body in bodies:
+        start = time.perf_counter()
+        request = decode(body, "benchmark-key")
+        if convert:
+            request = convert_claude_to_openai(request, model_manager)
+        elapsed.append(time.perf_counter() - start)
+        requests.append(request)
+    return requests, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--input", nargs="*", help="recorded /v1/messages request bodies of one conversation")
+    args = parser.parse_args()
+
+    if args.input:
+        bodies = [open(path, "rb").read() for path in args.input]
+    else:
+        transcript = with_images(session(args.messages))
+        # Clients resend the transcript growing by one tool round trip per turn
+        first = max(1, args.messages - 2 * args.turns + 1)
+        bodies = [request_json(transcript[:end]).encode("utf-8") for end in range(first, args.messages + 1, 2)]
+    model_manager = ModelManager(config)
+    config.conversion_cache_max_bytes = config.conversion_cache_max_bytes or 33554432
+
+    def decoder(cache_bytes: int):
+        def decode(body, client_key):
+            config.decode_cache_max_bytes = cache_bytes
+            return instance.decode(body, client_key)
+        instance = RequestDecoder()
+        return decode
+
+    modes = {"fastapi": lambda: fastapi_decode, "full": lambda: decoder(0), "memo": lambda: decoder(CACHE_BYTES)}
+    expected, _ = replay(bodies, fastapi_decode, model_manager, False)
+    for make in modes.values():
+        decoded, _ = replay(bodies, make(), model_manager, False)
+        assert [request.model_dump() for request in decoded] == [request.model_dump() for request in expected]
+        assert [convert_claude_to_openai(request, model_manager) for request in decoded] == [
+            convert_claude_to_openai(request, model_manager) for request in expected
+        ]
+
+    timings = {}
+    for mode, make in modes.items():
+        best_decode = best_total = float("inf")
+        for _ in range(args.repeat):
+            # The first turn fills the memos; steady state is every later turn
+            _, decode = replay(bodies, make(), model_manager, False)
+            message_cache.__init__()
+            _, total = replay(bodies, make(), model_manager, True)
+            best_decode = min(best_decode, sum(decode[1:]) / len(decode[1:]))
+            best_total = min(best_total, sum(total[1:]) / len(total[1:]))
+        timings[mode] = best_decode, best_total
+
+    last = json.loads(bodies[-1])
+    print(f"JSON backend: {json_backend.BACKEND}")
+    print(f"session: {len(last['messages'])} messages, {len(bodies)} turns, {len(bodies[-1]) // 1024} KiB per request")
+    baseline = timings["fastapi"]
+    for mode, (decode, total) in timings.items():
+        print(f"  {mode:8} decode {decode * 1e3:8.3f} ms/turn ({baseline[0] / decode:.2f}x)   "
+              f"decode+convert {total * 1e3:8.3f} ms/turn ({baseline[1] / total:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request cost of singleflight / response-cache keys.
+
+Every non-streaming request gets a request_shape() (src/core/singleflight.py); only
+when a call of the same shape is in flight is the full request_key() computed. This
+converts a synthetic Claude Code session, keys the converted request with json_backend
+(sorted keys) and with the previous json.dumps(sort_keys=True), asserts both give the
+same key for this session (floats with exponents can differ, see request_key), and
+reports both costs next to the conversion they follow.
+
+Usage:
+    python benchmarks/bench_request_key.py [--messages 300] [--repeat 30]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bench_message_conversion import request_json, session
+from src.core import json_backend
+from src.core.config import config
+from src.core.model_manager import ModelManager
+from src.core.singleflight import request_key, request_shape
+from src.conversion.request_converter import convert_claude_to_openai
+from src.models.claude import ClaudeMessagesRequest
+
+
+def json_dumps_key(request, namespace: str = "") -> str:
+    """request_key as computed with the standard library before json_backend."""
+    digest = getattr(request.get("tools"), "digest", None)
+    if digest is not None:
+        request = dict(request, tools=digest)
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{namespace}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def best_of(repeat: int, call):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    body = request_json(session(args.messages))
+    claude_request = ClaudeMessagesRequest.model_validate_json(body)
+    model_manager = ModelManager(config)
+    # Uncached conversion: the cost every request pays at least once
+    config.conversion_cache_max_bytes = 0
+    request = convert_claude_to_openai(claude_request, model_manager)
+    assert request_key(request) == json_dumps_key(request)
+
+    convert = best_of(args.repeat, lambda: convert_claude_to_openai(claude_request, model_manager))
+    shape = best_of(args.repeat, lambda: request_shape(request))
+    current = best_of(args.repeat, lambda: request_key(request))
+    previous = best_of(args.repeat, lambda: json_dumps_key(request))
+
+    print(f"session: {args.messages} messages, {len(body) // 1024} KiB, JSON backend: {json_backend.BACKEND}")
+    print(f"  convert (uncached)        : {convert * 1e3:8.3f} ms")
+    print(f"  request_shape (always)    : {shape * 1e3:8.3f} ms")
+    print(f"  request_key (json_backend): {current * 1e3:8.3f} ms ({current / convert:.0%} of convert)")
+    print(f"  request_key (json.dumps)  : {previous * 1e3:8.3f} ms ({previous / convert:.0%} of convert)")
+
+
+if __name__ == "__main__":
+    main()
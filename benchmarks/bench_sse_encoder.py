@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of Claude SSE frame encoding over a recorded delta corpus.
+
+Compares the previous f-string + json.dumps(nested dict) frames with the
+templated frames from src.core.sse_encoder. The corpus is an OpenAI-format
+SSE capture (`data: {...}` lines); any upstream stream saved with
+`curl -N ... > capture.sse` can be passed with --corpus.
+
+Usage:
+    python benchmarks/bench_sse_encoder.py [--corpus FILE] [--repeat 20]
+    JSON_BACKEND=json python benchmarks/bench_sse_encoder.py   # stdlib only
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.core import json_backend, sse_encoder
+from src.core.constants import Constants
+from src.core.stream_delta import delta_from_dict
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "delta_corpus.sse")
+
+
+def load_events(path: str):
+    """Turn a captured OpenAI stream into the (kind, index, value) events the converter emits."""
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("data: ") or line.strip() == "data: [DONE]":
+                continue
+            delta = delta_from_dict(json.loads(line[6:]))
+            if delta.reasoning:
+                events.append(("thinking", 0, delta.reasoning))
+            if delta.content:
+                events.append(("text", 0, delta.content))
+            for tc in delta.tool_calls or ():
+                if tc.arguments:
+                    events.append(("json", 1, tc.arguments))
+            events.append(("stop", 0, None))
+    return events
+
+
+def encode_fstring(events) -> int:
+    total = 0
+    for kind, index, value in events:
+        if kind == "text":
+            frame = f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': index, 'delta': {'type': Constants.DELTA_TEXT, 'text': value}}, ensure_ascii=False)}\n\n"
+        elif kind == "thinking":
+            frame = f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': index, 'delta': {'type': Constants.DELTA_THINKING, 'thinking': value}}, ensure_ascii=False)}\n\n"
+        elif kind == "json":
+            frame = f"event: {Constants.EVENT_CONTENT_BLOCK_DELTA}\ndata: {json.dumps({'type': Constants.EVENT_CONTENT_BLOCK_DELTA, 'index': index, 'delta': {'type': Constants.DELTA_INPUT_JSON, 'partial_json': value}}, ensure_ascii=False)}\n\n"
+        else:
+            frame = f"event: {Constants.EVENT_PING}\ndata: {json.dumps({'type': Constants.EVENT_PING}, ensure_ascii=False)}\n\n"
+        total += len(frame.encode("utf-8"))
+    return total
+
+
+def encode_templates(events) -> int:
+    total = 0
+    for kind, index, value in events:
+        if kind == "text":
+            frame = sse_encoder.text_delta(index, value)
+        elif kind == "thinking":
+            frame = sse_encoder.thinking_delta(index, value)
+        elif kind == "json":
+            frame = sse_encoder.input_json_delta(index, value)
+        else:
+            frame = sse_encoder.PING
+        total += len(frame)
+    return total
+
+
+def bench(fn, events, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(events)
+        best = min(best, time.perf_counter() - start)
+    return best / len(events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    events = load_events(args.corpus)
+    old_us = bench(encode_fstring, events, args.repeat)
+    new_us = bench(encode_templates, events, args.repeat)
+    print(f"corpus: {os.path.basename(args.corpus)} ({len(events)} frames), JSON backend: {json_backend.BACKEND}")
+    print(f"  f-string + json.dumps : {old_us:6.2f} us/frame")
+    print(f"  sse_encoder templates : {new_us:6.2f} us/frame")
+    print(f"  speedup               : {old_us / new_us:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
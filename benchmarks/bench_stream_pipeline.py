@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-chunk cost of the /v1/messages streaming pipeline.
+
+Compares the old serialize -> reparse path (model_dump + json.dumps into a
+"data: ..." line, then json.loads and dict lookups in the converter) with the
+typed path (StreamDelta built directly from the SDK chunk object).
+
+Usage:
+    python benchmarks/bench_stream_pipeline.py [--chunks 5000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai.types.chat import ChatCompletionChunk
+
+from src.core.stream_delta import delta_from_chunk
+
+
+def build_chunks(count: int):
+    """Build a realistic mix of thinking, text and tool-call chunks."""
+    chunks = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 2:
+            delta = {"reasoning_content": "thinking about step %d " % i}
+        elif kind < 9:
+            delta = {"content": "token%d " % i}
+        else:
+            delta = {
+                "tool_calls": [
+                    {"index": 0, "function": {"arguments": '"path": "src/file_%d.py", ' % i}}
+                ]
+            }
+        chunks.append(
+            ChatCompletionChunk.model_validate(
+                {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": 1767225600,
+                    "model": "glm-4.7",
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+            )
+        )
+    return chunks
+
+
+def old_path(chunks) -> int:
+    """The previous pipeline: dump to an SSE line, then parse it back in the converter."""
+    seen = 0
+    for chunk in chunks:
+        line = f"data: {json.dumps(chunk.model_dump(), ensure_ascii=False)}"
+        if line.startswith("data: "):
+            data = json.loads(line[6:])
+            choices = data.get("choices", [])
+            if not choices:
+                continue
+            delta = choices[0].get("delta", {})
+            if delta.get("reasoning_content") or delta.get("thinking"):
+                seen += 1
+            if delta.get("content") is not None:
+                seen += 1
+            if delta.get("tool_calls"):
+                seen += 1
+    return seen
+
+
+def new_path(chunks) -> int:
+    """The typed pipeline: attribute access straight off the SDK object."""
+    seen = 0
+    for chunk in chunks:
+        delta = delta_from_chunk(chunk)
+        if not delta.has_choice:
+            continue
+        if delta.reasoning:
+            seen += 1
+        if delta.content is not None:
+            seen += 1
+        if delta.tool_calls:
+            seen += 1
+    return seen
+
+
+def bench(fn, chunks, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        fn(chunks)
+        best = min(best, time.process_time() - start)
+    return best / len(chunks) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.chunks)
+    assert old_path(chunks) == new_path(chunks)
+
+    old_us = bench(old_path, chunks, args.repeat)
+    new_us = bench(new_path, chunks, args.repeat)
+    print(f"chunks: {args.chunks}, best of {args.repeat} (CPU time per chunk)")
+    print(f"  serialize -> reparse : {old_us:8.2f} us")
+    print(f"  typed StreamDelta    : {new_us:8.2f} us")
+    print(f"  speedup              : {old_us / new_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
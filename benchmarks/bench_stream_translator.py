@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark and cross-check the Claude stream translator.
+
+Replays a recorded delta corpus through the previous dict-based converter loop
+and through src.conversion.stream_translator.StreamTranslator, asserts both
+produce identical bytes, then reports the per-delta cost of each. --fuzz N
+additionally feeds N randomly re-chunked tool-call streams through both.
+
+Usage:
+    python benchmarks/bench_stream_translator.py [--corpus FILE] [--repeat 20] [--fuzz 0]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.core import sse_encoder
+from src.core.constants import Constants
+from src.core.stream_delta import StreamDelta, ToolCallFragment, delta_from_dict
+from src.conversion.delta_coalescer import TEXT, THINKING, DeltaCoalescer
+from src.conversion.json_scanner import IncrementalJSONScanner
+from src.conversion.stream_translator import StreamTranslator
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "delta_corpus.sse")
+MESSAGE_ID = "msg_benchmark"
+
+
+def load_deltas(path: str):
+    deltas = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                deltas.append(delta_from_dict(json.loads(line[6:])))
+    return deltas
+
+
+def translate_dicts(deltas, model: str) -> bytes:
+    """The previous converter loop: per-tool state in string-keyed dicts."""
+    out = [sse_encoder.message_start(MESSAGE_ID, model), sse_encoder.text_block_start(0), sse_encoder.PING]
+    coalescer = DeltaCoalescer()
+    tool_block_counter = 0
+    current_tool_calls = {}
+    final_stop_reason = Constants.STOP_END_TURN
+    usage_data = {"input_tokens": 0, "output_tokens": 0}
+    for delta in deltas:
+        if delta.usage:
+            usage_data = {
+                "input_tokens": delta.usage["prompt_tokens"],
+                "output_tokens": delta.usage["completion_tokens"],
+                "cache_read_input_tokens": delta.usage["cached_tokens"],
+            }
+        if not delta.has_choice:
+            continue
+        if delta.reasoning:
+            frames = coalescer.add(THINKING, 0, delta.reasoning)
+            if frames:
+                out.append(frames)
+        if delta.content is not None:
+            frames = coalescer.add(TEXT, 0, delta.content)
+            if frames:
+                out.append(frames)
+        for tc_delta in delta.tool_calls or ():
+            if tc_delta.index not in current_tool_calls:
+                current_tool_calls[tc_delta.index] = {
+                    "id": None, "name": None, "args_buffer": "", "scanner": IncrementalJSONScanner(),
+                    "json_sent": False, "claude_index": None, "started": False,
+                }
+            tool_call = current_tool_calls[tc_delta.index]
+            if tc_delta.id:
+                tool_call["id"] = tc_delta.id
+            if tc_delta.name:
+                tool_call["name"] = tc_delta.name
+            if tool_call["id"] and tool_call["name"] and not tool_call["started"]:
+                tool_block_counter += 1
+                tool_call["claude_index"] = tool_block_counter
+                tool_call["started"] = True
+                out.append(sse_encoder.tool_block_start(tool_block_counter, tool_call["id"], tool_call["name"]))
+            if tool_call["started"] and tc_delta.arguments is not None and not tool_call["json_sent"]:
+                fragment = tc_delta.arguments
+                end = tool_call["scanner"].feed(fragment)
+                if end >= 0:
+                    fragment = fragment[:end]
+                    tool_call["json_sent"] = True
+                tool_call["args_buffer"] += fragment
+                if end < 0 and not tool_call["scanner"].scalar:
+                    continue
+                try:
+                    json.loads(tool_call["args_buffer"])
+                except json.JSONDecodeError:
+                    continue
+                tool_call["json_sent"] = True
+                out.append(sse_encoder.input_json_delta(tool_call["claude_index"], tool_call["args_buffer"]))
+        if delta.finish_reason:
+            final_stop_reason = {
+                "length": Constants.STOP_MAX_TOKENS,
+                "tool_calls": Constants.STOP_TOOL_USE,
+                "function_call": Constants.STOP_TOOL_USE,
+            }.get(delta.finish_reason, Constants.STOP_END_TURN)
+    out.append(sse_encoder.content_block_stop(0))
+    for tool_call in current_tool_calls.values():
+        if tool_call["started"]:
+            out.append(sse_encoder.content_block_stop(tool_call["claude_index"]))
+    out.append(sse_encoder.message_delta(final_stop_reason, usage_data))
+    out.append(sse_encoder.MESSAGE_STOP)
+    return b"".join(out)
+
+
+def translate_slots(deltas, model: str) -> bytes:
+    translator = StreamTranslator(model, message_id=MESSAGE_ID)
+    out = [translator.start()]
+    for delta in deltas:
+        frames = translator.feed(delta)
+        if frames:
+            out.append(frames)
+    out.append(translator.finish())
+    return b"".join(out)
+
+
+def random_tool_stream(rng: random.Random):
+    """Text followed by one or two tool calls whose arguments arrive in random slices."""
+    deltas = [StreamDelta(has_choice=True, content="Looking")]
+    for index in range(rng.randint(1, 2)):
+        args = json.dumps({"path": f"src/{index}.py", "lines": [rng.randint(0, 99) for _ in range(5)], "q": "a\"b}"})
+        deltas.append(StreamDelta(has_choice=True, tool_calls=[ToolCallFragment(index, f"call_{index}", "read", "")]))
+        pos = 0
+        while pos < len(args):
+            step = rng.randint(1, 7)
+            deltas.append(StreamDelta(has_choice=True, tool_calls=[ToolCallFragment(index, arguments=args[pos:pos + step])]))
+            pos += step
+    deltas.append(StreamDelta(has_choice=True, finish_reason="tool_calls"))
+    deltas.append(StreamDelta(usage={"prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 0}))
+    return deltas
+
+
+def bench(fn, deltas, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(deltas, "glm-4.7")
+        best = min(best, time.perf_counter() - start)
+    return best / len(deltas) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--fuzz", type=int, default=0)
+    args = parser.parse_args()
+
+    deltas = load_deltas(args.corpus)
+    assert translate_dicts(deltas, "glm-4.7") == translate_slots(deltas, "glm-4.7")
+
+    rng = random.Random(0)
+    for _ in range(args.fuzz):
+        stream = random_tool_stream(rng)
+        assert translate_dicts(stream, "m") == translate_slots(stream, "m")
+
+    old_us = bench(translate_dicts, deltas, args.repeat)
+    new_us = bench(translate_slots, deltas, args.repeat)
+    print(f"corpus: {os.path.basename(args.corpus)} ({len(deltas)} deltas), fuzzed streams: {args.fuzz}")
+    print(f"  dict-based loop  : {old_us:6.2f} us/delta")
+    print(f"  StreamTranslator : {new_us:6.2f} us/delta")
+    print(f"  speedup          : {old_us / new_us:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,101 @@
 from fastapi import APIRouter, HTTPException, Request, Header, Depends
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime
 import uuid
 from typing import Optional
+from pydantic import ValidationError
 
 from src.core.config import config
 from src.core.logging import logger
-from src.core.client import OpenAIClient
-from src.models.claude import ClaudeMessagesRequest, ClaudeTokenCountRequest
+from src.core.disconnect import start_disconnect_watcher, stop_disconnect_watcher, watch_stream
+from src.core.metrics import metrics
+from src.models.claude import ClaudeTokenCountRequest
 from src.models.openai import OpenAIChatCompletionRequest
-from src.conversion.request_converter import convert_claude_to_openai
+from src.conversion.request_converter import convert_claude_to_openai, prefix_fingerprint
+from src.conversion.request_decoder import decode_messages_request
+from src.conversion.context_fit import ContextTooLong, fit_context
 from src.conversion.response_converter import (
     convert_openai_to_claude_response,
     convert_openai_streaming_to_claude_with_cancellation,
 )
-from src.core.model_manager import model_manager
+from src.core.profiles import Profile, profiles
+from src.core.rate_limit import RateLimitExceeded, client_identity, client_rate_limiter
+from src.core.response_cache import response_cache
+from src.core.token_estimate import chars_per_token
+from src.core.upstreams import AFFINITY_KEY
 
 router = APIRouter()
 
-# Get custom headers from config
-custom_headers = config.get_custom_headers()
+# Client for the main configuration; requests are routed to a profile's client
+openai_client = profiles.default.client
 
-openai_client = OpenAIClient(
-    config.openai_api_key,
-    config.openai_base_url,
-    config.request_timeout,
-    api_version=config.azure_api_version,
-    custom_headers=custom_headers,
-)
+async def client_api_key(x_api_key: Optional[str] = Header(None), authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """The client's API key from either x-api-key header or Authorization header.
 
-async def validate_api_key(x_api_key: Optional[str] = Header(None), authorization: Optional[str] = Header(None)):
-    """Validate the client's API key from either x-api-key header or Authorization header."""
-    client_api_key = None
-    
-    # Extract API key from headers
+    Once checked against the profile it also identifies the client for rate limiting
+    (see rate_limit_identity()).
+    """
     if x_api_key:
-        client_api_key = x_api_key
-    elif authorization and authorization.startswith("Bearer "):
-        client_api_key = authorization.replace("Bearer ", "")
-    
-    # Skip validation if ANTHROPIC_API_KEY is not set in the environment
-    if not config.anthropic_api_key:
+        return x_api_key
+    if authorization and authorization.startswith("Bearer "):
+        return authorization.replace("Bearer ", "")
+    return None
+
+
+def validate_api_key(profile: Profile, client_api_key: Optional[str]):
+    """Validate the client's API key against the profile the request is routed to.
+
+    Each profile may expect its own key, and the model can route a request to a
+    profile, so this runs after profiles.resolve(http_request, model).
+    """
+    # Skip validation if ANTHROPIC_API_KEY is not set for this profile
+    if not profile.anthropic_api_key:
         return
-        
+
     # Validate the client API key
-    if not client_api_key or not config.validate_client_api_key(client_api_key):
+    if not client_api_key or client_api_key != profile.anthropic_api_key:
         logger.warning(f"Invalid API key provided by client")
         raise HTTPException(
             status_code=401,
             detail="Invalid API key. Please provide a valid Anthropic API key."
         )
 
+
+def rate_limit_identity(profile: Profile, client_api_key: Optional[str], http_request: Request) -> str:
+    """Rate-limit key: the API key if the profile checks keys, otherwise the client address."""
+    address = http_request.client.host if http_request.client else None
+    return client_identity(client_api_key, bool(profile.anthropic_api_key), address)
+
+
+def rate_limited_response(error: RateLimitExceeded, openai_format: bool = False) -> JSONResponse:
+    """429 in the Anthropic (or, for /v1/chat/completions, OpenAI) error format."""
+    if openai_format:
+        content = {"error": {"message": str(error), "type": "rate_limit_error", "code": "rate_limit_exceeded"}}
+    else:
+        content = {"type": "error", "error": {"type": "rate_limit_error", "message": str(error)}}
+    return JSONResponse(status_code=429, content=content, headers={"retry-after": error.retry_after_header})
+
+
+def context_too_long_response(error: ContextTooLong, openai_format: bool = False) -> JSONResponse:
+    """400 for a request that does not fit the model's context window, before any upstream call."""
+    if openai_format:
+        content = {"error": {"message": str(error), "type": "invalid_request_error", "code": "context_length_exceeded"}}
+    else:
+        content = {"type": "error", "error": {"type": "invalid_request_error", "message": str(error)}}
+    return JSONResponse(status_code=400, content=content)
+
 @router.post("/v1/messages")
-async def create_message(request: ClaudeMessagesRequest, http_request: Request, _: None = Depends(validate_api_key)):
+async def create_message(http_request: Request, client_key: Optional[str] = Depends(client_api_key)):
+    # Decoded here rather than by FastAPI so each turn only validates the new messages
+    try:
+        request = decode_messages_request(await http_request.body(), client_key)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+    profile = profiles.resolve(http_request, request.model)
+    validate_api_key(profile, client_key)
+    openai_client = profile.client
+    charge = None
     try:
         logger.debug(
             f"Processing Claude request: model={request.model}, stream={request.stream}"
@@ -62,10 +105,27 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
         request_id = str(uuid.uuid4())
 
         # Convert Claude request to OpenAI format
-        openai_request = convert_claude_to_openai(request, model_manager)
+        openai_request = convert_claude_to_openai(request, profile.model_manager)
+
+        # Successive turns share this prefix; routing on it keeps provider prompt caches warm
+        if openai_client.routes_by_prefix:
+            openai_request[AFFINITY_KEY] = prefix_fingerprint(openai_request)
+
+        # Over the model's context window: shrink per CONTEXT_FIT_POLICY or reject with a 400
+        openai_request = fit_context(openai_request)
+
+        # Per-client request/token budgets (input charged from an estimate, corrected from usage)
+        charge = client_rate_limiter.admit(rate_limit_identity(profile, client_key, http_request), openai_request)
+
+        # Temperature-0 requests may be answered from the response cache (opt-in)
+        cache_key = response_cache.key_for(profile.name, openai_request, http_request.headers, request.metadata)
+        cached = await response_cache.get(cache_key) if cache_key else None
+        if cached is not None and charge is not None:
+            # No upstream call: only the request itself counts against the client's budget
+            charge.settle({"prompt_tokens": 0, "completion_tokens": 0})
 
         # Add Requesty auto_cache if enabled
-        if config.requesty_auto_cache and "extra_body" not in openai_request:
+        if profile.requesty_auto_cache and "extra_body" not in openai_request:
             openai_request["extra_body"] = {
                 "requesty": {
                     "auto_cache": True
@@ -80,9 +140,17 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
         if request.stream:
             # Streaming response - wrap in error handling
             try:
-                openai_stream = openai_client.create_chat_completion_stream(
-                    openai_request, request_id
-                )
+                if cached is not None:
+                    openai_stream = response_cache.replay(cached)
+                else:
+                    openai_stream = openai_client.create_chat_completion_delta_stream(
+                        openai_request, request_id
+                    )
+                    if cache_key:
+                        openai_stream = response_cache.record(cache_key, openai_stream)
+                if charge is not None:
+                    # Settled by the stream from its usage delta
+                    openai_stream, charge = charge.track_deltas(openai_stream), None
                 return StreamingResponse(
                     convert_openai_streaming_to_claude_with_cancellation(
                         openai_stream,
@@ -114,13 +182,28 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
                 return JSONResponse(status_code=e.status_code, content=error_response)
         else:
             # Non-streaming response
-            openai_response = await openai_client.create_chat_completion(
-                openai_request, request_id
-            )
+            if cached is not None:
+                openai_response = cached
+            else:
+                watcher = start_disconnect_watcher(http_request, openai_client, request_id)
+                try:
+                    openai_response = await openai_client.create_chat_completion(
+                        openai_request, request_id
+                    )
+                finally:
+                    stop_disconnect_watcher(watcher)
+                if cache_key:
+                    await response_cache.put(cache_key, openai_response)
+            if charge is not None:
+                charge.settle(openai_response.get("usage"))
             claude_response = convert_openai_to_claude_response(
                 openai_response, request
             )
             return claude_response
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except ContextTooLong as e:
+        return context_too_long_response(e)
     except HTTPException:
         raise
     except Exception as e:
@@ -130,14 +213,22 @@ async def create_message(request: ClaudeMessagesRequest, http_request: Request,
         logger.error(traceback.format_exc())
         error_message = openai_client.classify_openai_error(str(e))
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        if charge is not None:
+            # Failed or cancelled before usage was known (a no-op once settled)
+            charge.refund()
 
 
 @router.post("/v1/chat/completions")
-async def create_chat_completion(request: OpenAIChatCompletionRequest, http_request: Request, _: None = Depends(validate_api_key)):
+async def create_chat_completion(request: OpenAIChatCompletionRequest, http_request: Request, client_key: Optional[str] = Depends(client_api_key)):
     """
     OpenAI-compatible chat completions endpoint.
     Directly forwards OpenAI format requests to the target API.
     """
+    profile = profiles.resolve(http_request, request.model)
+    validate_api_key(profile, client_key)
+    openai_client = profile.client
+    charge = None
     try:
         logger.debug(
             f"Processing OpenAI chat completion request: model={request.model}, stream={request.stream}"
@@ -150,13 +241,19 @@ async def create_chat_completion(request: OpenAIChatCompletionRequest, http_requ
         openai_request = request.model_dump(exclude_none=True)
 
         # Apply model mapping if needed
-        mapped_model = model_manager.map_model(request.model)
+        mapped_model = profile.model_manager.map_model(request.model)
         if mapped_model != request.model:
             openai_request["model"] = mapped_model
             logger.debug(f"Mapped model {request.model} -> {mapped_model}")
 
+        if openai_client.routes_by_prefix:
+            openai_request[AFFINITY_KEY] = prefix_fingerprint(openai_request)
+
+        openai_request = fit_context(openai_request)
+        charge = client_rate_limiter.admit(rate_limit_identity(profile, client_key, http_request), openai_request)
+
         # Add Requesty auto_cache if enabled (and not already set)
-        if config.requesty_auto_cache and "extra_body" not in openai_request:
+        if profile.requesty_auto_cache and "extra_body" not in openai_request:
             openai_request["extra_body"] = {
                 "requesty": {
                     "auto_cache": True
@@ -171,11 +268,19 @@ async def create_chat_completion(request: OpenAIChatCompletionRequest, http_requ
         if request.stream:
             # Streaming response
             try:
-                openai_stream = openai_client.create_chat_completion_stream(
-                    openai_request, request_id
-                )
+                if config.openai_stream_passthrough:
+                    openai_stream = openai_client.create_chat_completion_passthrough(
+                        openai_request, request_id
+                    )
+                else:
+                    openai_stream = openai_client.create_chat_completion_stream(
+                        openai_request, request_id
+                    )
+                if charge is not None:
+                    # Settled by the stream from its usage line
+                    openai_stream, charge = charge.track_bytes(openai_stream), None
                 return StreamingResponse(
-                    openai_stream,
+                    watch_stream(openai_stream, http_request, openai_client, request_id),
                     media_type="text/event-stream",
                     headers={
                         "Cache-Control": "no-cache",
@@ -199,11 +304,21 @@ async def create_chat_completion(request: OpenAIChatCompletionRequest, http_requ
                 return JSONResponse(status_code=e.status_code, content=error_response)
         else:
             # Non-streaming response
-            openai_response = await openai_client.create_chat_completion(
-                openai_request, request_id
-            )
+            watcher = start_disconnect_watcher(http_request, openai_client, request_id)
+            try:
+                openai_response = await openai_client.create_chat_completion(
+                    openai_request, request_id
+                )
+            finally:
+                stop_disconnect_watcher(watcher)
+            if charge is not None:
+                charge.settle(openai_response.get("usage"))
             return openai_response
 
+    except RateLimitExceeded as e:
+        return rate_limited_response(e, openai_format=True)
+    except ContextTooLong as e:
+        return context_too_long_response(e, openai_format=True)
     except HTTPException:
         raise
     except Exception as e:
@@ -212,13 +327,19 @@ async def create_chat_completion(request: OpenAIChatCompletionRequest, http_requ
         logger.error(traceback.format_exc())
         error_message = openai_client.classify_openai_error(str(e))
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        if charge is not None:
+            # Failed or cancelled before usage was known (a no-op once settled)
+            charge.refund()
 
 
 @router.post("/v1/messages/count_tokens")
-async def count_tokens(request: ClaudeTokenCountRequest, _: None = Depends(validate_api_key)):
+async def count_tokens(request: ClaudeTokenCountRequest, http_request: Request, client_key: Optional[str] = Depends(client_api_key)):
+    profile = profiles.resolve(http_request, request.model)
+    validate_api_key(profile, client_key)
     try:
-        # For token counting, we'll use a simple estimation
-        # In a real implementation, you might want to use tiktoken or similar
+        # For token counting, we'll use a simple estimation with the characters per
+        # token of the mapped model's tokenizer (see model_registry)
 
         total_chars = 0
 
@@ -242,8 +363,8 @@ async def count_tokens(request: ClaudeTokenCountRequest, _: None = Depends(valid
                     if hasattr(block, "text") and block.text is not None:
                         total_chars += len(block.text)
 
-        # Rough estimation: 4 characters per token
-        estimated_tokens = max(1, total_chars // 4)
+        model = profile.model_manager.map_model(request.model)
+        estimated_tokens = max(1, int(total_chars / chars_per_token(model)))
 
         return {"input_tokens": estimated_tokens}
 
@@ -253,41 +374,55 @@ async def count_tokens(request: ClaudeTokenCountRequest, _: None = Depends(valid
 
 
 @router.get("/health")
-async def health_check():
-    """Health check endpoint with port and model information"""
-    return {
+async def health_check(http_request: Request):
+    """Health check endpoint with port and model information (for the profile the request routes to)"""
+    profile = profiles.resolve(http_request)
+    server = http_request.scope.get("server")
+    health = {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "server": {
             "host": config.host,
-            "port": config.port,
+            "port": server[1] if server and server[1] else config.port,
         },
+        "profile": profile.name,
         "models": {
-            "big_model": config.big_model,
-            "middle_model": config.middle_model,
-            "small_model": config.small_model,
+            "big_model": profile.big_model,
+            "middle_model": profile.middle_model,
+            "small_model": profile.small_model,
         },
         "api_status": {
-            "openai_api_configured": bool(config.openai_api_key),
-            "api_key_valid": config.validate_api_key(),
-            "client_api_key_validation": bool(config.anthropic_api_key),
-            "openai_base_url": config.openai_base_url,
+            "openai_api_configured": bool(profile.openai_api_key),
+            "api_key_valid": bool(profile.openai_api_key and profile.openai_api_key.strip()),
+            "client_api_key_validation": bool(profile.anthropic_api_key),
+            "openai_base_url": profile.openai_base_url,
         },
+        "upstreams": profile.client.upstreams.stats(),
         "requesty": {
-            "auto_cache_enabled": config.requesty_auto_cache,
+            "auto_cache_enabled": profile.requesty_auto_cache,
             "requesty_api_key_configured": bool(config.requesty_api_key),
         },
     }
+    if len(profiles.profiles) > 1:
+        health["profiles"] = {name: p.summary() for name, p in profiles.profiles.items()}
+    return health
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Proxy runtime metrics (counters, gauges, histograms and component stats)"""
+    return metrics.snapshot()
 
 
 @router.get("/test-connection")
-async def test_connection():
+async def test_connection(http_request: Request):
     """Test API connectivity to OpenAI"""
+    profile = profiles.resolve(http_request)
     try:
         # Simple test request to verify API connectivity
-        test_response = await openai_client.create_chat_completion(
+        test_response = await profile.client.create_chat_completion(
             {
-                "model": config.small_model,
+                "model": profile.small_model,
                 "messages": [{"role": "user", "content": "Hello"}],
                 "max_tokens": 5,
             }
@@ -296,7 +431,7 @@ async def test_connection():
         return {
             "status": "success",
             "message": "Successfully connected to OpenAI API",
-            "model_used": config.small_model,
+            "model_used": profile.small_model,
             "timestamp": datetime.now().isoformat(),
             "response_id": test_response.get("id", "unknown"),
         }
@@ -338,6 +473,7 @@ async def root():
             "chat_completions": "/v1/chat/completions",
             "count_tokens": "/v1/messages/count_tokens",
             "health": "/health",
+            "metrics": "/metrics",
             "test_connection": "/test-connection",
         },
     }
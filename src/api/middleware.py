@@ -0,0 +1,23 @@
+from src.core.profiles import profiles
+
+
+class ProfilePathMiddleware:
+    """Serve `/{profile}/v1/...` as `/v1/...` for that profile.
+
+    Keeps the old one-proxy-per-port layout reachable by path when all profiles run in
+    one process: `ANTHROPIC_BASE_URL=http://host:8082/glm` behaves like the GLM proxy.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and len(profiles.profiles) > 1:
+            path = scope["path"]
+            name, sep, rest = path[1:].partition("/")
+            if sep and name in profiles.profiles:
+                scope = dict(scope)
+                scope["path"] = "/" + rest
+                scope["raw_path"] = scope["path"].encode()
+                scope["proxy_profile"] = name
+        await self.app(scope, receive, send)
@@ -0,0 +1,139 @@
+"""Fitting converted requests into the target model's context window.
+
+A request whose estimated input (token_estimate.py) does not fit the mapped model's
+context window, minus the room reserved for output, is either rejected up front or
+shrunk by the policies in CONTEXT_FIT_POLICY, applied in order until it fits:
+
+- truncate: tool results longer than CONTEXT_TOOL_RESULT_MAX_TOKENS are cut to their
+  head and tail, oldest first.
+- drop_oldest: the oldest messages are dropped, keeping the system prompt, the first
+  user message and the latest message. An assistant message with tool calls is
+  dropped together with its tool results, so no call is left without its result.
+
+If the request still does not fit (or CONTEXT_FIT_POLICY=reject), ContextTooLong is
+raised before any upstream I/O. Fitting is opt-in: CONTEXT_FIT_POLICY=off (the
+default) forwards everything as is.
+Windows come from the model registry (model_registry.py); models without one, and
+no DEFAULT_CONTEXT_WINDOW, are never fitted.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.config import config
+from src.core.constants import Constants
+from src.core.metrics import metrics
+from src.core.model_registry import model_registry
+from src.core.token_estimate import chars_per_token, message_chars, tools_chars
+
+logger = logging.getLogger(__name__)
+
+
+class ContextTooLong(Exception):
+    def __init__(self, model: str, estimate: int, window: int, reserved: int):
+        super().__init__(
+            f"Prompt is too long for {model}: about {estimate} tokens, but its context window of {window} "
+            f"tokens leaves {window - reserved} for input after reserving {reserved} for output. "
+            f"Shorten the conversation (e.g. compact it) or use a model with a larger context window."
+        )
+
+
+def context_window(model: str) -> Optional[int]:
+    """Context window of `model` from the model registry, DEFAULT_CONTEXT_WINDOW, or None."""
+    info = model_registry.resolve(model)
+    if info is not None and info.context_window:
+        return info.context_window
+    return config.default_context_window or None
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """`text` cut to about max_chars, keeping its head and tail."""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars // 2
+    tail = max_chars - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n\n[... {omitted} characters omitted by proxy ...]\n\n{text[-tail:]}"
+
+
+def _truncate_tool_results(messages: List[Dict[str, Any]], sizes: List[int], total: int, budget: int, ratio: float) -> int:
+    limit = int(config.context_tool_result_max_tokens * ratio)
+    for index, message in enumerate(messages):
+        if total <= budget:
+            break
+        content = message.get("content")
+        if message.get("role") != Constants.ROLE_TOOL or not isinstance(content, str) or len(content) <= limit:
+            continue
+        messages[index] = dict(message, content=truncate_text(content, limit))
+        size = message_chars(messages[index])
+        total -= sizes[index] - size
+        sizes[index] = size
+        metrics.inc("context_fit_truncated_tool_results_total")
+    return total
+
+
+def _units(messages: List[Dict[str, Any]], start: int) -> List[Tuple[int, int]]:
+    """[begin, end) ranges from `start` that can be dropped without splitting a tool call from its results."""
+    units = []
+    index = start
+    while index < len(messages):
+        end = index + 1
+        if messages[index].get("role") == Constants.ROLE_ASSISTANT and messages[index].get("tool_calls"):
+            while end < len(messages) and messages[end].get("role") == Constants.ROLE_TOOL:
+                end += 1
+        units.append((index, end))
+        index = end
+    return units
+
+
+def _drop_oldest(messages: List[Dict[str, Any]], sizes: List[int], total: int, budget: int) -> int:
+    first = 0
+    while first < len(messages) and messages[first].get("role") == Constants.ROLE_SYSTEM:
+        first += 1
+    # The first user message states the task; keep it
+    if first < len(messages) and messages[first].get("role") == Constants.ROLE_USER:
+        first += 1
+    end = first
+    for begin, unit_end in _units(messages, first)[:-1]:
+        if total <= budget:
+            break
+        total -= sum(sizes[begin:unit_end])
+        end = unit_end
+    if end > first:
+        metrics.inc("context_fit_dropped_messages_total", end - first)
+        del messages[first:end]
+        del sizes[first:end]
+    return total
+
+
+def fit_context(request: Dict[str, Any]) -> Dict[str, Any]:
+    """`request`, or a copy shrunk to fit the model's context window; raises ContextTooLong."""
+    policies = config.context_fit_policy
+    if not policies or "off" in policies:
+        return request
+    window = context_window(request.get("model") or "")
+    if not window:
+        return request
+
+    # A max_tokens close to the window must not leave no room for input
+    reserved = min(request.get("max_tokens") or 0, window // 2)
+    ratio = chars_per_token(request.get("model"))
+    budget = int((window - reserved) * ratio)
+    messages = list(request.get("messages") or ())
+    sizes = [message_chars(message) for message in messages]
+    total = tools_chars(request.get("tools")) + sum(sizes)
+    if total <= budget:
+        return request
+
+    for policy in policies:
+        if policy == "truncate":
+            total = _truncate_tool_results(messages, sizes, total, budget, ratio)
+        elif policy == "drop_oldest":
+            total = _drop_oldest(messages, sizes, total, budget)
+        if total <= budget:
+            metrics.inc("context_fit_total", action="fitted")
+            logger.info(f"Fitted request for {request['model']} into its {window}-token context window ({', '.join(policies)})")
+            return dict(request, messages=messages)
+
+    metrics.inc("context_fit_total", action="rejected")
+    raise ContextTooLong(request["model"], int(total / ratio), window, reserved)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+from src.core import sse_encoder
+from src.core.metrics import metrics, ratio
+
+TEXT = 0
+THINKING = 1
+
+_ENCODERS = {TEXT: sse_encoder.text_delta, THINKING: sse_encoder.thinking_delta}
+
+# Yielded by with_flush_ticks when the coalescing window expires with no new delta
+FLUSH_TICK = object()
+
+
+class DeltaCoalescer:
+    """Micro-batches consecutive text/thinking deltas into fewer SSE events.
+
+    Deltas of the same kind and block index are concatenated until either the
+    flush window (measured from the first buffered delta) elapses or the buffered
+    payload reaches max_bytes. Anything that is not a text/thinking delta must call
+    flush() first, so events are never reordered. A window of 0 disables buffering.
+    """
+
+    __slots__ = ("window", "max_bytes", "kind", "index", "parts", "size", "first_at", "events_in", "events_out")
+
+    def __init__(self, window_ms: int = 0, max_bytes: int = 0):
+        self.window = window_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.kind = None
+        self.index = 0
+        self.parts = []
+        self.size = 0
+        self.first_at = 0.0
+        self.events_in = 0
+        self.events_out = 0
+
+    def add(self, kind: int, index: int, value: str) -> Optional[bytes]:
+        """Buffer one delta; return any frames that must be written now."""
+        self.events_in += 1
+        if self.window <= 0:
+            self.events_out += 1
+            return _ENCODERS[kind](index, value)
+
+        flushed = None
+        if self.parts and (kind != self.kind or index != self.index):
+            flushed = self.flush()
+        if not self.parts:
+            self.kind = kind
+            self.index = index
+            self.first_at = time.monotonic()
+        self.parts.append(value)
+        self.size += len(value.encode("utf-8"))
+
+        if self.max_bytes and self.size >= self.max_bytes:
+            frame = self.flush()
+            return flushed + frame if flushed else frame
+        return flushed
+
+    def flush(self) -> Optional[bytes]:
+        """Emit everything buffered as a single delta event."""
+        if not self.parts:
+            return None
+        value = self.parts[0] if len(self.parts) == 1 else "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        self.events_out += 1
+        return _ENCODERS[self.kind](self.index, value)
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until the buffered deltas must be flushed, or None if nothing is buffered."""
+        if not self.parts:
+            return None
+        return max(0.0, self.first_at + self.window - time.monotonic())
+
+    def record(self):
+        """Publish this stream's in/out event counts."""
+        metrics.inc("stream_delta_events_in_total", self.events_in)
+        metrics.inc("stream_delta_events_out_total", self.events_out)
+
+
+async def with_flush_ticks(source: AsyncIterator, coalescer: DeltaCoalescer):
+    """Iterate `source`, yielding FLUSH_TICK whenever the coalescer's window expires first.
+
+    While nothing is buffered the source is awaited directly; only a pending window
+    pays for a task + timed wait.
+    """
+    iterator = source.__aiter__()
+    next_item = None
+    try:
+        while True:
+            timeout = coalescer.time_left()
+            if next_item is None:
+                if timeout is None:
+                    try:
+                        yield await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    continue
+                next_item = asyncio.ensure_future(iterator.__anext__())
+
+            done, _ = await asyncio.wait((next_item,), timeout=timeout)
+            if not done:
+                yield FLUSH_TICK
+                continue
+
+            task, next_item = next_item, None
+            try:
+                item = task.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if next_item is not None:
+            next_item.cancel()
+
+
+def _coalescing_stats():
+    events_in = metrics.counter("stream_delta_events_in_total")
+    events_out = metrics.counter("stream_delta_events_out_total")
+    return {"events_in": events_in, "events_out": events_out, "in_out_ratio": ratio(events_in, events_out)}
+
+
+metrics.register_collector("stream_coalescing", _coalescing_stats)
@@ -0,0 +1,98 @@
+import re
+
+# Characters that can change scanner state outside / inside a JSON string
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONScanner:
+    """Resumable structural scanner for one JSON value that arrives in fragments.
+
+    Tracks nesting depth and string/escape state across `feed()` calls, so deciding
+    whether streamed tool-call arguments are complete costs O(len(fragment)) instead
+    of re-parsing the whole accumulated buffer with json.loads on every fragment.
+
+    The scanner only tracks structure; it does not validate scalars or separators.
+    Callers that need a guarantee of well-formed JSON should json.loads the buffer
+    once when `complete` flips to True.
+    """
+
+    __slots__ = ("depth", "in_string", "escape", "started", "complete", "scalar")
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.complete = False
+        # Top-level scalars (numbers, true/false/null) have no closing delimiter
+        self.scalar = False
+
+    def feed(self, fragment: str) -> int:
+        """Advance over `fragment`.
+
+        Returns -1 while the value is still open, otherwise the offset in `fragment`
+        just past the character that closed the top-level value. Once complete, any
+        further input is ignored and 0 is returned.
+        """
+        if self.complete:
+            return 0
+        if self.scalar:
+            return -1
+
+        pos = 0
+        end = len(fragment)
+
+        if not self.started:
+            while pos < end and fragment[pos] in _WHITESPACE:
+                pos += 1
+            if pos == end:
+                return -1
+            first = fragment[pos]
+            self.started = True
+            if first == '"':
+                self.in_string = True
+            elif first in "{[":
+                self.depth = 1
+            else:
+                self.scalar = True
+                return -1
+            pos += 1
+
+        while pos < end:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(fragment, pos)
+                if match is None:
+                    return -1
+                pos = match.end()
+                if match.group() == "\\":
+                    self.escape = True
+                    continue
+                self.in_string = False
+                if self.depth == 0:
+                    # A top-level string just closed
+                    self.complete = True
+                    return pos
+                continue
+
+            match = _STRUCTURAL.search(fragment, pos)
+            if match is None:
+                return -1
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+                    return pos
+
+        return -1
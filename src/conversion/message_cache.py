@@ -0,0 +1,148 @@
+"""Memo of converted messages, so long transcripts are not re-converted every turn.
+
+Claude Code resends the whole conversation on every turn; only the last messages
+are new. Messages with block content (tool calls, tool results, images) are looked
+up here before being converted, by a hash of the message's shape (block types,
+tool ids, string lengths and ends); the message's strings and structured values
+are kept with the entry and compared for equality on a hit. Plain-string messages
+are cheaper to convert than to key and bypass the cache.
+
+Each entry is charged for everything it keeps: the strings and structured values
+(tool inputs, images) it compares and the converted messages (argument strings,
+data URLs). Entries are evicted least recently used once the total exceeds
+CONVERSION_CACHE_MAX_BYTES (0 disables the cache). Callers get their own copy of
+each converted message dict.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.core.config import config
+from src.core.constants import Constants
+from src.core.metrics import metrics
+
+# Rough size charged for each dict, list or scalar besides the strings it holds
+OBJECT_BYTES = 64
+# Characters from each end of a string that go into the hashed key
+SIGNATURE_CHARS = 32
+
+
+def _content_key(msg: Any) -> Tuple[int, List[Any]]:
+    """(hash of the message's shape, values to compare).
+
+    Hashing every string would cost about as much as converting it, so the key only
+    covers ids, lengths and both ends of each string; the full strings and structured
+    values are compared on lookup, which for equal strings is a memcmp.
+    """
+    parts: List[Any] = [msg.role]
+    values: List[Any] = []
+    for block in msg.content:
+        block_type = block.type
+        parts.append(block_type)
+        if block_type == Constants.CONTENT_TEXT:
+            text = block.text
+            parts.append(len(text))
+            parts.append(text[:SIGNATURE_CHARS])
+            parts.append(text[-SIGNATURE_CHARS:])
+            values.append(text)
+        elif block_type == Constants.CONTENT_TOOL_USE:
+            parts.append(block.id)
+            parts.append(block.name)
+            values.append(block.input)
+        elif block_type == Constants.CONTENT_TOOL_RESULT:
+            parts.append(block.tool_use_id)
+            content = block.content
+            if isinstance(content, str):
+                parts.append(len(content))
+                parts.append(content[-SIGNATURE_CHARS:])
+            elif isinstance(content, list):
+                for item in content:
+                    text = item.get("text") if isinstance(item, dict) else None
+                    if isinstance(text, str):
+                        parts.append(len(text))
+                        parts.append(text[-SIGNATURE_CHARS:])
+            values.append(content)
+        else:
+            values.append(block.model_dump())
+    return hash(tuple(parts)), values
+
+
+def _size(value: Any) -> int:
+    """Estimated bytes held by a JSON-like value: its strings plus OBJECT_BYTES per object."""
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, dict):
+            size += OBJECT_BYTES + sum(len(key) for key in value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            size += OBJECT_BYTES
+            stack.extend(value)
+        else:
+            size += OBJECT_BYTES
+    return size
+
+
+def _copy(converted: Any) -> Any:
+    if isinstance(converted, list):
+        return [dict(message) for message in converted]
+    return dict(converted)
+
+
+class MessageCache:
+    """LRU of converted messages keyed by (conversion kind, content hash)."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[List[Any], Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, kind: str, msg: Any, converter: Callable[[Any], Any]) -> Any:
+        """converter(msg), or a copy of the result for an identical earlier message."""
+        max_bytes = config.conversion_cache_max_bytes
+        if max_bytes <= 0 or not isinstance(msg.content, list):
+            return converter(msg)
+
+        digest, values = _content_key(msg)
+        key = (kind, digest)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == values:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy(entry[1])
+
+        self.misses += 1
+        converted = converter(msg)
+        # Sized on a miss only: what the entry keeps, input and output
+        size = _size(values) + _size(converted)
+        if size <= max_bytes:
+            if entry is not None:
+                self._evict(key)
+            self._entries[key] = (values, converted, size)
+            self._bytes += size
+            while self._bytes > max_bytes:
+                self._evict(next(iter(self._entries)))
+        return _copy(converted)
+
+    def _evict(self, key: Tuple[str, int]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+message_cache = MessageCache()
+metrics.register_collector("message_conversion_cache", message_cache.stats)
@@ -1,10 +1,16 @@
+import hashlib
 import json
+import logging
 from typing import Dict, Any, List
-from venv import logger
+from src.core import json_backend
 from src.core.constants import Constants
+from src.conversion.message_cache import message_cache
+from src.conversion.tool_cache import tool_cache
+from src.conversion.tool_result_compaction import tool_result_compactor
 from src.models.claude import ClaudeMessagesRequest, ClaudeMessage
 from src.core.config import config
-import logging
+from src.core.logging import log_body
+from src.core.model_registry import model_registry
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +20,9 @@ def convert_claude_to_openai(
 ) -> Dict[str, Any]:
     """Convert Claude API request format to OpenAI format."""
 
-    # Map model
+    # Map model; its registry entry decides output limit and supported features
     openai_model = model_manager.map_claude_model_to_openai(claude_request.model)
+    model_info = model_registry.resolve(openai_model)
 
     # Convert messages
     openai_messages = []
@@ -43,16 +50,22 @@ def convert_claude_to_openai(
             )
 
     # Process Claude messages
+    # Assistant turns after the current message: how old a tool result is, for compaction
+    turns_left = 0
+    if tool_result_compactor.enabled:
+        turns_left = sum(1 for msg in claude_request.messages if msg.role == Constants.ROLE_ASSISTANT)
     i = 0
     while i < len(claude_request.messages):
         msg = claude_request.messages[i]
 
+        # Earlier turns come from the message cache; only new messages are converted
         if msg.role == Constants.ROLE_USER:
-            openai_message = convert_claude_user_message(msg)
+            openai_message = message_cache.convert("user", msg, convert_claude_user_message)
             openai_messages.append(openai_message)
         elif msg.role == Constants.ROLE_ASSISTANT:
-            openai_message = convert_claude_assistant_message(msg)
+            openai_message = message_cache.convert("assistant", msg, convert_claude_assistant_message)
             openai_messages.append(openai_message)
+            turns_left -= 1
 
             # Check if next message contains tool results
             if i + 1 < len(claude_request.messages):
@@ -68,46 +81,35 @@ def convert_claude_to_openai(
                 ):
                     # Process tool results
                     i += 1  # Skip to tool result message
-                    tool_results = convert_claude_tool_results(next_msg)
-                    openai_messages.extend(tool_results)
+                    tool_results = message_cache.convert("tool_results", next_msg, convert_claude_tool_results)
+                    openai_messages.extend(tool_result_compactor.compact(tool_results, turns_left))
 
         i += 1
 
+    if model_info is not None and model_info.images is False:
+        openai_messages = [without_images(message, openai_model) for message in openai_messages]
+
     # Build OpenAI request
+    max_output = (model_info.max_output if model_info is not None else None) or config.max_tokens_limit
     openai_request = {
         "model": openai_model,
         "messages": openai_messages,
         "max_tokens": min(
             max(claude_request.max_tokens, config.min_tokens_limit),
-            config.max_tokens_limit,
+            max_output,
         ),
         "temperature": claude_request.temperature,
         "stream": claude_request.stream,
     }
-    logger.debug(
-        f"Converted Claude request to OpenAI format: {json.dumps(openai_request, indent=2, ensure_ascii=False)}"
-    )
     # Add optional parameters
     if claude_request.stop_sequences:
         openai_request["stop"] = claude_request.stop_sequences
     if claude_request.top_p is not None:
         openai_request["top_p"] = claude_request.top_p
 
-    # Convert tools
+    # Convert tools (the same tool set is converted and serialized once, see tool_cache)
     if claude_request.tools:
-        openai_tools = []
-        for tool in claude_request.tools:
-            if tool.name and tool.name.strip():
-                openai_tools.append(
-                    {
-                        "type": Constants.TOOL_FUNCTION,
-                        Constants.TOOL_FUNCTION: {
-                            "name": tool.name,
-                            "description": tool.description or "",
-                            "parameters": tool.input_schema,
-                        },
-                    }
-                )
+        openai_tools = tool_cache.convert(claude_request.tools)
         if openai_tools:
             openai_request["tools"] = openai_tools
 
@@ -133,16 +135,42 @@ def convert_claude_to_openai(
             thinking_config["type"] = claude_request.thinking.type
         if hasattr(claude_request.thinking, 'budget_tokens') and claude_request.thinking.budget_tokens:
             thinking_config["budget_tokens"] = claude_request.thinking.budget_tokens
-        if thinking_config:
+        if thinking_config and model_info is not None and model_info.thinking is False:
+            logger.debug(f"Dropped thinking config: {openai_model} does not support it")
+        elif thinking_config:
             # Add to extra_body for providers that support it (GLM-4.7, etc.)
             if "extra_body" not in openai_request:
                 openai_request["extra_body"] = {}
             openai_request["extra_body"]["thinking"] = thinking_config
             logger.debug(f"Added thinking config: {thinking_config}")
 
+    log_body(logger, "Converted Claude request to OpenAI format", openai_request)
     return openai_request
 
 
+def prefix_fingerprint(openai_request: Dict[str, Any]) -> str:
+    """Stable hash of the model, system prompt, tools and first PREFIX_AFFINITY_MESSAGES messages.
+
+    Later turns of a conversation only append messages, so they get the same fingerprint.
+    """
+    messages = openai_request.get("messages") or []
+    system = [m for m in messages if m.get("role") == Constants.ROLE_SYSTEM]
+    early = [m for m in messages if m.get("role") != Constants.ROLE_SYSTEM][:config.prefix_affinity_messages]
+    tools = openai_request.get("tools")
+    # A cached tool set carries its digest, so its schemas are not serialized again
+    prefix = [openai_request.get("model"), system, getattr(tools, "digest", tools), early]
+    return hashlib.blake2b(json_backend.dumps_bytes(prefix), digest_size=16).hexdigest()
+
+
+def without_images(message: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """`message` with its image parts replaced by a note, for models without image input."""
+    content = message.get("content")
+    if not isinstance(content, list) or not any(part.get("type") == "image_url" for part in content):
+        return message
+    note = {"type": "text", "text": f"[Image omitted: {model} does not accept images]"}
+    return dict(message, content=[note if part.get("type") == "image_url" else part for part in content])
+
+
 def convert_claude_user_message(msg: ClaudeMessage) -> Dict[str, Any]:
     """Convert Claude user message to OpenAI format."""
     if msg.content is None:
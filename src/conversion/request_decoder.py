@@ -0,0 +1,128 @@
+"""Decoding of /v1/messages bodies that validates only the new tail of a conversation.
+
+Clients resend the whole conversation on every turn. The body is parsed with
+json_backend (orjson when installed), and the parsed messages are compared with
+the ones the same client sent last time in this conversation (keyed by client key
+and a digest of the first message). The longest equal prefix reuses the
+ClaudeMessage objects validated then; only the messages after it are validated
+with pydantic, together with the top-level fields (a tool set seen before reuses
+its validated models, see tool_cache.py). Comparing parsed messages is a C-level
+equality check, several times cheaper than validating them again, and reused
+messages are the same objects the message cache (message_cache.py) already holds,
+so its lookups compare by identity.
+
+Any validation error is reported by validating the whole body again, so clients
+get the same 422 errors (and error locations) as with full validation. Transcripts
+are kept least recently used up to DECODE_CACHE_MAX_BYTES (0 validates every
+message); client keys listed in STRICT_DECODING_KEYS are always validated in full.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from src.conversion.tool_cache import tool_cache
+from src.core import json_backend
+from src.core.config import config
+from src.core.metrics import metrics
+from src.models.claude import ClaudeMessage, ClaudeMessagesRequest
+
+_MESSAGES = TypeAdapter(List[ClaudeMessage])
+
+
+class _Transcript:
+    __slots__ = ("raw", "messages", "size")
+
+    def __init__(self, raw: List[Any], messages: List[ClaudeMessage], size: int):
+        self.raw = raw
+        self.messages = messages
+        self.size = size
+
+
+def _common_prefix(new: List[Any], old: List[Any]) -> int:
+    count = min(len(new), len(old))
+    index = 0
+    while index < count and new[index] == old[index]:
+        index += 1
+    return index
+
+
+class RequestDecoder:
+    """LRU of the last validated transcript of each conversation, sized by request body."""
+
+    def __init__(self):
+        self._transcripts: "OrderedDict[Tuple[Optional[str], str], _Transcript]" = OrderedDict()
+        self._bytes = 0
+        self.reused = 0
+        self.validated = 0
+
+    def decode(self, body: bytes, client_key: Optional[str] = None) -> ClaudeMessagesRequest:
+        """Parse a /v1/messages body; raises pydantic.ValidationError for invalid requests."""
+        try:
+            data = json_backend.loads(body)
+        except Exception:
+            # Each backend raises its own decode error; pydantic reports it uniformly
+            return ClaudeMessagesRequest.model_validate_json(body)
+
+        messages = data.get("messages") if isinstance(data, dict) else None
+        if not isinstance(messages, list) or client_key in config.strict_decoding_keys:
+            metrics.inc("request_decode_total", mode="full")
+            return ClaudeMessagesRequest.model_validate(data)
+
+        max_bytes = config.decode_cache_max_bytes
+        key = transcript = None
+        if max_bytes > 0 and messages:
+            key = (client_key, hashlib.blake2b(json_backend.dumps_bytes(messages[0]), digest_size=16).hexdigest())
+            transcript = self._transcripts.get(key)
+        reused = _common_prefix(messages, transcript.raw) if transcript is not None else 0
+        fields = dict(data, messages=[])
+        tools = fields.pop("tools", None)
+        try:
+            request = ClaudeMessagesRequest.model_validate(fields)
+            tail = _MESSAGES.validate_python(messages[reused:])
+            if tools is not None:
+                # A tool set seen before reuses its validated models (tool_cache.py)
+                request.tools = tool_cache.validate(tools)
+        except ValidationError:
+            # Validated again in full for error locations relative to the whole body
+            metrics.inc("request_decode_total", mode="full")
+            return ClaudeMessagesRequest.model_validate(data)
+
+        request.messages = transcript.messages[:reused] + tail if reused else tail
+        self.reused += reused
+        self.validated += len(tail)
+        metrics.inc("request_decode_total", mode="tail" if reused else "full")
+        if key is not None:
+            self._store(key, _Transcript(messages, list(request.messages), len(body)), max_bytes)
+        return request
+
+    def _store(self, key: Tuple[Optional[str], str], transcript: _Transcript, max_bytes: int):
+        old = self._transcripts.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        if transcript.size > max_bytes:
+            return
+        self._transcripts[key] = transcript
+        self._bytes += transcript.size
+        while self._bytes > max_bytes:
+            _, evicted = self._transcripts.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "conversations": len(self._transcripts),
+            "bytes": self._bytes,
+            "reused_messages": self.reused,
+            "validated_messages": self.validated,
+        }
+
+
+request_decoder = RequestDecoder()
+metrics.register_collector("request_decoding", request_decoder.stats)
+
+
+def decode_messages_request(body: bytes, client_key: Optional[str] = None) -> ClaudeMessagesRequest:
+    """Parse a /v1/messages body; raises pydantic.ValidationError for invalid requests."""
+    return request_decoder.decode(body, client_key)
@@ -0,0 +1,222 @@
+import json
+import logging
+import uuid
+from typing import Dict, Optional
+
+from src.core import sse_encoder
+from src.core.config import config
+from src.core.constants import Constants
+from src.core.stream_delta import StreamDelta
+from src.conversion.delta_coalescer import TEXT, THINKING, DeltaCoalescer
+from src.conversion.json_scanner import IncrementalJSONScanner
+
+logger = logging.getLogger(__name__)
+
+# Translator states
+PENDING = 0    # nothing sent yet
+STREAMING = 1  # message_start and the primary text block are out
+FINISHED = 2   # every block is closed and message_stop was sent
+
+_STOP_REASONS = {
+    "length": Constants.STOP_MAX_TOKENS,
+    "tool_calls": Constants.STOP_TOOL_USE,
+    "function_call": Constants.STOP_TOOL_USE,
+    "stop": Constants.STOP_END_TURN,
+}
+
+
+class ToolCallState:
+    """One streamed tool call and the Claude tool_use block it maps to."""
+
+    __slots__ = ("id", "name", "args_buffer", "scanner", "json_sent", "claude_index")
+
+    def __init__(self):
+        self.id: Optional[str] = None
+        self.name: Optional[str] = None
+        self.args_buffer = ""
+        self.scanner = IncrementalJSONScanner()
+        self.json_sent = False
+        # Set once the tool_use block has been started
+        self.claude_index: Optional[int] = None
+
+    def consume(self, fragment: str) -> Optional[str]:
+        """Feed one argument fragment; return the partial_json to send, if any.
+
+        Completeness is tracked by the IncrementalJSONScanner, so each fragment costs
+        O(len(fragment)). With STREAM_TOOL_ARGUMENTS enabled fragments are forwarded as
+        they arrive; otherwise the arguments are buffered and sent once as a single delta
+        when the value closes. Top-level scalars have no closing delimiter and are sent
+        by close().
+        """
+        if self.json_sent:
+            return None
+
+        end = self.scanner.feed(fragment)
+        if end >= 0:
+            # Drop anything after the closing bracket (some providers repeat the arguments)
+            fragment = fragment[:end]
+            self.json_sent = True
+
+        if config.stream_tool_arguments:
+            return fragment or None
+
+        self.args_buffer += fragment
+        if end < 0:
+            # JSON is incomplete, continue accumulating
+            return None
+        return self._checked_arguments()
+
+    def close(self) -> Optional[str]:
+        """Return the buffered arguments not sent yet (a scalar or a truncated value), if any."""
+        if self.json_sent or not self.args_buffer.strip():
+            return None
+        self.json_sent = True
+        return self._checked_arguments()
+
+    def _checked_arguments(self) -> str:
+        try:
+            json.loads(self.args_buffer)
+        except json.JSONDecodeError:
+            # Same fallback as non-streaming responses (response_converter.py)
+            logger.warning("Tool call %s has malformed arguments; sending them as raw_arguments", self.name)
+            return json.dumps({"raw_arguments": self.args_buffer})
+        return self.args_buffer
+
+
+class StreamTranslator:
+    """Turns StreamDelta records into Claude SSE bytes, independent of FastAPI.
+
+    start() opens the message and the primary text block, feed() translates one delta,
+    flush() drains the delta coalescer, and finish() closes every block. Thinking deltas
+    are sent on the primary text block, the same block text deltas use. Tool calls get
+    their own tool_use blocks, which stay open until finish(). feed() and finish() start
+    the message if start() was not called; once finished, further deltas are dropped and
+    finish() sends nothing again.
+    """
+
+    __slots__ = (
+        "model", "message_id", "state", "text_index", "next_index", "tools", "stop_reason", "usage",
+        "coalescer", "direct_events",
+    )
+
+    def __init__(self, model: str, coalescer: Optional[DeltaCoalescer] = None, message_id: Optional[str] = None):
+        self.model = model
+        self.message_id = message_id or f"msg_{uuid.uuid4().hex[:24]}"
+        self.state = PENDING
+        self.text_index = 0
+        self.next_index = 1
+        self.tools: Dict[int, ToolCallState] = {}
+        self.stop_reason = Constants.STOP_END_TURN
+        self.usage = {"input_tokens": 0, "output_tokens": 0}
+        self.coalescer = coalescer or DeltaCoalescer()
+        # Text/thinking frames encoded without going through a disabled coalescer
+        self.direct_events = 0 if self.coalescer.window <= 0 else None
+
+    def start(self) -> bytes:
+        self.state = STREAMING
+        return (
+            sse_encoder.message_start(self.message_id, self.model)
+            + sse_encoder.text_block_start(self.text_index)
+            + sse_encoder.PING
+        )
+
+    def feed(self, delta: StreamDelta) -> Optional[bytes]:
+        """Translate one delta; return the frames to write now, if any."""
+        if self.state == PENDING:
+            return self.start() + (self.feed(delta) or b"")
+        if self.state == FINISHED:
+            logger.debug("Dropping stream delta received after message_stop")
+            return None
+
+        usage = delta.usage
+        if usage:
+            self.usage = {
+                "input_tokens": usage["prompt_tokens"],
+                "output_tokens": usage["completion_tokens"],
+                "cache_read_input_tokens": usage["cached_tokens"],
+            }
+        if not delta.has_choice:
+            return None
+
+        out = None
+        if self.direct_events is not None:
+            # Coalescing disabled: encode straight away
+            if delta.reasoning:
+                out = sse_encoder.thinking_delta(self.text_index, delta.reasoning)
+                self.direct_events += 1
+            if delta.content is not None:
+                frames = sse_encoder.text_delta(self.text_index, delta.content)
+                out = out + frames if out else frames
+                self.direct_events += 1
+        else:
+            if delta.reasoning:
+                out = self.coalescer.add(THINKING, self.text_index, delta.reasoning)
+            if delta.content is not None:
+                frames = self.coalescer.add(TEXT, self.text_index, delta.content)
+                if frames:
+                    out = out + frames if out else frames
+
+        if delta.tool_calls:
+            # Tool events bypass the coalescing window
+            parts = [out, self.coalescer.flush()]
+            for fragment in delta.tool_calls:
+                parts.append(self._feed_tool(fragment))
+            out = b"".join(part for part in parts if part)
+
+        if delta.finish_reason:
+            self.stop_reason = _STOP_REASONS.get(delta.finish_reason, Constants.STOP_END_TURN)
+        return out or None
+
+    def _feed_tool(self, fragment) -> bytes:
+        tool = self.tools.get(fragment.index)
+        if tool is None:
+            tool = self.tools[fragment.index] = ToolCallState()
+        if fragment.id:
+            tool.id = fragment.id
+        if fragment.name:
+            tool.name = fragment.name
+
+        out = b""
+        # Start the tool_use block once both id and name are known
+        if tool.claude_index is None:
+            if not (tool.id and tool.name):
+                return out
+            tool.claude_index = self.next_index
+            self.next_index += 1
+            out = sse_encoder.tool_block_start(tool.claude_index, tool.id, tool.name)
+
+        if fragment.arguments is not None:
+            partial_json = tool.consume(fragment.arguments)
+            if partial_json:
+                out += sse_encoder.input_json_delta(tool.claude_index, partial_json)
+        return out
+
+    def flush(self) -> Optional[bytes]:
+        """Emit any coalesced text/thinking that is waiting for its window."""
+        return self.coalescer.flush()
+
+    def finish(self) -> bytes:
+        """Close all blocks and the message (once; later calls return nothing)."""
+        if self.state == FINISHED:
+            return b""
+        out = self.start() if self.state == PENDING else b""
+        self.state = FINISHED
+        pending = self.coalescer.flush()
+        if pending:
+            out += pending
+        out += sse_encoder.content_block_stop(self.text_index)
+        for tool in self.tools.values():
+            if tool.claude_index is not None:
+                partial_json = tool.close()
+                if partial_json:
+                    out += sse_encoder.input_json_delta(tool.claude_index, partial_json)
+                out += sse_encoder.content_block_stop(tool.claude_index)
+        return out + sse_encoder.message_delta(self.stop_reason, self.usage) + sse_encoder.MESSAGE_STOP
+
+    def record(self):
+        """Publish delta event counts (see DeltaCoalescer.record)."""
+        if self.direct_events:
+            self.coalescer.events_in += self.direct_events
+            self.coalescer.events_out += self.direct_events
+            self.direct_events = 0
+        self.coalescer.record()
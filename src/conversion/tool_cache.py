@@ -0,0 +1,132 @@
+"""Cache of validated and converted tool sets.
+
+Clients send the same tool definitions, with large JSON schemas, on every request.
+The request decoder (request_decoder.py) looks the parsed `tools` array up here
+before validation: a tool set seen before reuses its ClaudeTool models instead of
+validating the schemas again with pydantic, and the converter splices the OpenAI
+`tools` list built for it into the request. That list carries its serialized JSON
+and a content digest, so code that needs the tools as bytes (prefix fingerprints,
+token estimates, request keys) uses those instead of encoding the schemas again.
+
+A tool set is looked up by its tool names and compared for equality with the cached
+raw array, so a changed schema or description is a miss and replaces the entry.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import TypeAdapter
+
+from src.core import json_backend
+from src.core.config import config
+from src.core.constants import Constants
+from src.core.metrics import metrics
+from src.models.claude import ClaudeTool
+
+_TOOLS = TypeAdapter(List[ClaudeTool])
+
+
+class ToolPayload(list):
+    """OpenAI `tools` list with its serialized JSON (`data`) and digest.
+
+    Shared between requests: never mutate it, build a new list instead.
+    """
+
+    __slots__ = ("data", "digest")
+
+    def __init__(self, tools: List[Dict[str, Any]]):
+        super().__init__(tools)
+        self.data = json_backend.dumps_bytes(tools)
+        self.digest = hashlib.blake2b(self.data, digest_size=16).hexdigest()
+
+
+def convert_tools(tools: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Claude tool definitions as OpenAI function tools (unnamed tools are dropped)."""
+    openai_tools = []
+    for tool in tools:
+        if tool.name and tool.name.strip():
+            openai_tools.append(
+                {
+                    "type": Constants.TOOL_FUNCTION,
+                    Constants.TOOL_FUNCTION: {
+                        "name": tool.name,
+                        "description": tool.description or "",
+                        "parameters": tool.input_schema,
+                    },
+                }
+            )
+    return openai_tools
+
+
+class _ToolSet:
+    __slots__ = ("raw", "tools", "payload")
+
+    def __init__(self, raw: Optional[List[Any]], tools: List[ClaudeTool], payload: Optional[ToolPayload]):
+        self.raw = raw
+        self.tools = tools
+        self.payload = payload
+
+
+class ToolCache:
+    """LRU of validated tool sets and their ToolPayloads, keyed by the tools' names."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[Any, ...], _ToolSet]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, raw: Any) -> List[ClaudeTool]:
+        """The ClaudeTool models for a parsed `tools` array; raises pydantic.ValidationError."""
+        if config.tool_cache_size <= 0 or not isinstance(raw, list) or not all(isinstance(tool, dict) for tool in raw):
+            return _TOOLS.validate_python(raw)
+
+        key = tuple(tool.get("name") for tool in raw)
+        entry = self._entries.get(key)
+        if entry is not None and entry.raw == raw:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.tools
+
+        self.misses += 1
+        tools = _TOOLS.validate_python(raw)
+        self._store(key, _ToolSet(raw, tools, self._payload(tools)))
+        return tools
+
+    def convert(self, tools: Sequence[ClaudeTool]) -> Optional[List[Dict[str, Any]]]:
+        """The OpenAI tools for `tools`, or None if none of them has a name."""
+        if config.tool_cache_size <= 0:
+            return convert_tools(tools) or None
+
+        key = tuple(tool.name for tool in tools)
+        entry = self._entries.get(key)
+        if entry is not None and entry.tools is tools:
+            # Validated by validate() for this request, which counted the hit
+            return entry.payload
+        if entry is not None and entry.tools == list(tools):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.payload
+
+        self.misses += 1
+        payload = self._payload(tools)
+        self._store(key, _ToolSet(None, list(tools), payload))
+        return payload
+
+    @staticmethod
+    def _payload(tools: Sequence[ClaudeTool]) -> Optional[ToolPayload]:
+        openai_tools = convert_tools(tools)
+        return ToolPayload(openai_tools) if openai_tools else None
+
+    def _store(self, key: Tuple[Any, ...], entry: _ToolSet):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > config.tool_cache_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+tool_cache = ToolCache()
+metrics.register_collector("tool_cache", tool_cache.stats)
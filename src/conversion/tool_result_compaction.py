@@ -0,0 +1,84 @@
+"""Compaction of old, oversized tool results.
+
+One `cat` of a log file or a test run can add hundreds of KB to every later turn of a
+session. With TOOL_RESULT_COMPACT_CHARS set, a tool result longer than that which is
+at least TOOL_RESULT_COMPACT_AFTER_TURNS assistant turns old is replaced by its head
+and tail around an elision marker. The latest results are always sent in full.
+
+The compacted text is memoized by tool_use_id, so each result is compacted once per
+session rather than on every request. An entry is only reused if the result still
+has the same length and ends.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from src.core.config import config
+from src.core.constants import Constants
+from src.core.metrics import metrics
+from src.conversion.context_fit import truncate_text
+
+MAX_ENTRIES = 4096
+# Characters from each end of a result compared before reusing its compacted form
+SIGNATURE_CHARS = 32
+
+
+class ToolResultCompactor:
+    """LRU of compacted tool results keyed by tool_use_id."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self.hits = 0
+        self.compacted = 0
+        self.saved_chars = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.tool_result_compact_chars > 0
+
+    def compact(self, tool_messages: List[Dict[str, Any]], age: int) -> List[Dict[str, Any]]:
+        """Compact, in place, the oversized results among tool messages `age` assistant turns old."""
+        limit = config.tool_result_compact_chars
+        if limit <= 0 or age < config.tool_result_compact_after_turns:
+            return tool_messages
+        for message in tool_messages:
+            content = message.get("content")
+            if message.get("role") == Constants.ROLE_TOOL and isinstance(content, str) and len(content) > limit:
+                message["content"] = self._compacted(message.get("tool_call_id") or "", content, limit)
+                self.saved_chars += len(content) - len(message["content"])
+        return tool_messages
+
+    def _compacted(self, tool_use_id: str, content: str, limit: int) -> str:
+        entry = self._entries.get(tool_use_id)
+        if (
+            entry is not None
+            and entry[0] == len(content)
+            and entry[1].startswith(content[:SIGNATURE_CHARS])
+            and entry[1].endswith(content[-SIGNATURE_CHARS:])
+        ):
+            self._entries.move_to_end(tool_use_id)
+            self.hits += 1
+            return entry[1]
+
+        compacted = truncate_text(content, limit)
+        self.compacted += 1
+        metrics.inc("tool_results_compacted_total")
+        if tool_use_id:
+            self._entries[tool_use_id] = (len(content), compacted)
+            self._entries.move_to_end(tool_use_id)
+            while len(self._entries) > MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return compacted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "compacted": self.compacted,
+            "saved_chars": self.saved_chars,
+        }
+
+
+tool_result_compactor = ToolResultCompactor()
+metrics.register_collector("tool_result_compaction", tool_result_compactor.stats)
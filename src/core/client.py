@@ -1,15 +1,36 @@
 import asyncio
-import json
+import logging
+import time
+from urllib.parse import urlparse
 from fastapi import HTTPException
-from typing import Optional, AsyncGenerator, Dict, Any
+from typing import Optional, AsyncGenerator, Awaitable, Callable, Dict, Any, List
 from openai import AsyncOpenAI, AsyncAzureOpenAI
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from openai._exceptions import APIError, RateLimitError, AuthenticationError, BadRequestError
+from src.core import sse_encoder
+from src.core.config import config
+from src.core.hedging import hedger
+from src.core.limiter import UpstreamOverloadedError
+from src.core.http_pool import get_http_client, upstream_timeout
+from src.core.metrics import metrics
+from src.core.retry import RetryState
+from src.core.singleflight import SingleFlight
+from src.core.stream_buffer import StreamBuffer, StreamOverflowError
+from src.core.stream_delta import StreamDelta, delta_from_chunk
+from src.core.upstreams import AFFINITY_KEY, Upstream, UpstreamSet
+from src.core.usage_sniffer import UsageSniffer
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_chunk(chunk: ChatCompletionChunk) -> bytes:
+    return sse_encoder.openai_chunk(chunk.model_dump())
+
 
 class OpenAIClient:
     """Async OpenAI client with cancellation support."""
     
-    def __init__(self, api_key: str, base_url: str, timeout: int = 90, api_version: Optional[str] = None, custom_headers: Optional[Dict[str, str]] = None):
+    def __init__(self, api_key: str, base_url: str, timeout: int = 90, api_version: Optional[str] = None, custom_headers: Optional[Dict[str, str]] = None, pool_name: str = "default"):
         self.api_key = api_key
         self.base_url = base_url
         self.custom_headers = custom_headers or {}
@@ -22,24 +43,58 @@ class OpenAIClient:
         
         # Merge custom headers with default headers
         all_headers = {**default_headers, **self.custom_headers}
-        
-        # Detect if using Azure and instantiate the appropriate client
-        if api_version:
-            self.client = AsyncAzureOpenAI(
-                api_key=api_key,
-                azure_endpoint=base_url,
-                api_version=api_version,
-                timeout=timeout,
-                default_headers=all_headers
-            )
-        else:
-            self.client = AsyncOpenAI(
-                api_key=api_key,
-                base_url=base_url,
-                timeout=timeout,
-                default_headers=all_headers
-            )
+
+        # Share the process-wide connection pool; `timeout` bounds each read, not the whole request
+        http_client = get_http_client(pool_name)
+        upstream_timeouts = upstream_timeout(timeout)
+
+        # OPENAI_BASE_URL may list several equivalent endpoints (see src/core/upstreams.py)
+        base_urls = [url.strip() for url in base_url.split(",") if url.strip()]
+        api_keys = [key.strip() for key in (api_key or "").split(",")]
+        if len(api_keys) != len(base_urls):
+            api_keys = [api_key] * len(base_urls)
+
+        upstreams = []
+        for index, (url, key) in enumerate(zip(base_urls, api_keys)):
+            # Retries are handled here (see src/core/retry.py), not by the SDK
+            # Detect if using Azure and instantiate the appropriate client
+            if api_version:
+                client = AsyncAzureOpenAI(
+                    api_key=key,
+                    azure_endpoint=url,
+                    api_version=api_version,
+                    timeout=upstream_timeouts,
+                    max_retries=0,
+                    default_headers=all_headers,
+                    http_client=http_client
+                )
+            else:
+                client = AsyncOpenAI(
+                    api_key=key,
+                    base_url=url,
+                    timeout=upstream_timeouts,
+                    max_retries=0,
+                    default_headers=all_headers,
+                    http_client=http_client
+                )
+            name = urlparse(url).netloc or url
+            if any(upstream.name == name for upstream in upstreams):
+                name = f"{name}#{index + 1}"
+            upstreams.append(Upstream(name, url, client))
+        self.upstreams = UpstreamSet(pool_name, upstreams)
+        self.flights = SingleFlight(pool_name)
         self.active_requests: Dict[str, asyncio.Event] = {}
+        self.active_streams: Dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self):
+        """SDK client of the first configured endpoint."""
+        return self.upstreams.primary.client
+
+    @property
+    def routes_by_prefix(self) -> bool:
+        """Whether requests should carry a prefix fingerprint (with one endpoint it cannot change the pick)."""
+        return config.prefix_affinity_enabled and len(self.upstreams.upstreams) > 1
     
     async def create_chat_completion(self, request: Dict[str, Any], request_id: Optional[str] = None) -> Dict[str, Any]:
         """Send chat completion to OpenAI API with cancellation support."""
@@ -52,16 +107,20 @@ class OpenAIClient:
         try:
             # Extract extra_body parameters if present
             extra_body = request.pop("extra_body", None)
+            affinity = request.pop(AFFINITY_KEY, None)
 
-            # Create task that can be cancelled
+            # Create task that can be cancelled (including while it waits to retry)
             if extra_body:
-                completion_task = asyncio.create_task(
-                    self.client.chat.completions.create(**request, extra_body=extra_body)
-                )
+                create = lambda client: client.chat.completions.create(**request, extra_body=extra_body)
             else:
-                completion_task = asyncio.create_task(
-                    self.client.chat.completions.create(**request)
-                )
+                create = lambda client: client.chat.completions.create(**request)
+            if config.singleflight_enabled:
+                # Identical requests already in flight share one upstream call
+                flight = dict(request, extra_body=extra_body) if extra_body else request
+                completion = self.flights.do(flight, lambda: self._with_retries("non_stream", create, affinity))
+            else:
+                completion = self._with_retries("non_stream", create, affinity)
+            completion_task = asyncio.create_task(completion)
             
             if request_id:
                 # Wait for either completion or cancellation
@@ -91,6 +150,10 @@ class OpenAIClient:
             # Convert to dict format that matches the original interface
             return completion.model_dump()
         
+        except HTTPException:
+            raise
+        except UpstreamOverloadedError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except AuthenticationError as e:
             raise HTTPException(status_code=401, detail=self.classify_openai_error(str(e)))
         except RateLimitError as e:
@@ -108,44 +171,117 @@ class OpenAIClient:
             if request_id and request_id in self.active_requests:
                 del self.active_requests[request_id]
     
-    async def create_chat_completion_stream(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[str, None]:
-        """Send streaming chat completion to OpenAI API with cancellation support."""
+    async def create_chat_completion_stream(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+        """Send streaming chat completion and yield re-encoded OpenAI SSE frames (OPENAI_STREAM_PASSTHROUGH=false)."""
+        try:
+            async for frame in self._stream_chunks(request, request_id, _encode_chunk):
+                yield frame
+        except StreamOverflowError as e:
+            yield sse_encoder.openai_error("overloaded_error", str(e))
+            return
+        except HTTPException as e:
+            if e.status_code == 499:
+                raise
+            # Headers are already sent; report the upstream failure (e.g. retries exhausted) in-stream
+            yield sse_encoder.openai_error(sse_encoder.error_type_for_status(e.status_code), str(e.detail))
+            return
+
+        # Signal end of stream
+        yield sse_encoder.OPENAI_DONE
+
+    async def create_chat_completion_delta_stream(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[StreamDelta, None]:
+        """Send streaming chat completion and yield typed StreamDelta records (for the Claude converter)."""
+        async for delta in self._stream_chunks(request, request_id, delta_from_chunk):
+            yield delta
+
+    async def create_chat_completion_passthrough(self, request: Dict[str, Any], request_id: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+        """Send streaming chat completion and relay the upstream SSE bytes unchanged.
+
+        Chunks are forwarded as httpx delivers them; only the usage line is decoded.
+        """
+        extra_body = self._prepare_stream_request(request)
+        affinity = request.pop(AFFINITY_KEY, None)
+        # Fed from what is relayed (not per upstream attempt), so a losing hedge is not counted
+        sniffer = UsageSniffer()
+        try:
+            async for data in self._stream_from_reader(
+                lambda buffer, tried: self._read_upstream_bytes(request, extra_body, affinity, buffer, tried), request_id, request.get("model")
+            ):
+                sniffer.feed(data)
+                yield data
+        except StreamOverflowError as e:
+            yield sse_encoder.openai_error("overloaded_error", str(e))
+        except HTTPException as e:
+            if e.status_code == 499:
+                raise
+            yield sse_encoder.openai_error(sse_encoder.error_type_for_status(e.status_code), str(e.detail))
+        finally:
+            sniffer.record("chat_completions")
+
+    async def _stream_chunks(self, request: Dict[str, Any], request_id: Optional[str], convert: Callable[[ChatCompletionChunk], Any]) -> AsyncGenerator[Any, None]:
+        """Send streaming chat completion to OpenAI API and yield convert(chunk) for each chunk.
+
+        Conversion runs in the reader task, so the buffer holds sized items it can coalesce.
+        """
+        extra_body = self._prepare_stream_request(request)
+        affinity = request.pop(AFFINITY_KEY, None)
+        async for item in self._stream_from_reader(
+            lambda buffer, tried: self._read_upstream(request, extra_body, affinity, buffer, tried, convert), request_id, request.get("model")
+        ):
+            yield item
+
+    def _prepare_stream_request(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Enable streaming with usage reporting; return the popped extra_body, if any."""
+        # Ensure stream is enabled
+        request["stream"] = True
+        if "stream_options" not in request:
+            request["stream_options"] = {}
+        request["stream_options"]["include_usage"] = True
+
+        # Extract extra_body parameters if present
+        return request.pop("extra_body", None)
+
+    async def _stream_from_reader(self, read: Callable[[StreamBuffer, List[Upstream]], Awaitable[None]], request_id: Optional[str] = None, model: Optional[str] = None) -> AsyncGenerator[Any, None]:
+        """Run `read` as a reader task and yield what it puts into the buffer, with cancellation support.
+
+        cancel_request() cancels the reader task directly, so cancellation takes effect even
+        while the upstream is stalled between chunks (e.g. during a long thinking phase).
+        """
 
         # Create cancellation token if request_id provided
         if request_id:
             cancel_event = asyncio.Event()
             self.active_requests[request_id] = cancel_event
 
+        started = time.monotonic()
+        buffer = StreamBuffer(config.stream_buffer_max_bytes, config.stream_buffer_policy, request_id)
+        tried: List[Upstream] = []
+        reader = asyncio.create_task(read(buffer, tried))
+        if request_id:
+            self.active_streams[request_id] = reader
+
         try:
-            # Ensure stream is enabled
-            request["stream"] = True
-            if "stream_options" not in request:
-                request["stream_options"] = {}
-            request["stream_options"]["include_usage"] = True
+            if config.hedge_enabled and request_id and model:
+                buffer, reader, started = await self._hedge(read, buffer, reader, tried, started, request_id, model)
 
-            # Extract extra_body parameters if present
-            extra_body = request.pop("extra_body", None)
+            first = True
+            while True:
+                try:
+                    item = await buffer.get()
+                except StopAsyncIteration:
+                    break
+                if first:
+                    first = False
+                    if model:
+                        ttft = time.monotonic() - started
+                        hedger.ttft.observe(model, ttft)
+                        metrics.observe("upstream_ttft_seconds", ttft)
+                yield item
 
-            # Create the streaming completion
-            if extra_body:
-                streaming_completion = await self.client.chat.completions.create(**request, extra_body=extra_body)
-            else:
-                streaming_completion = await self.client.chat.completions.create(**request)
-            
-            async for chunk in streaming_completion:
-                # Check for cancellation before yielding each chunk
-                if request_id and request_id in self.active_requests:
-                    if self.active_requests[request_id].is_set():
-                        raise HTTPException(status_code=499, detail="Request cancelled by client")
-                
-                # Convert chunk to SSE format matching original HTTP client format
-                chunk_dict = chunk.model_dump()
-                chunk_json = json.dumps(chunk_dict, ensure_ascii=False)
-                yield f"data: {chunk_json}"
-            
-            # Signal end of stream
-            yield "data: [DONE]"
-                
+        except (HTTPException, StreamOverflowError):
+            raise
+        except UpstreamOverloadedError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except AuthenticationError as e:
             raise HTTPException(status_code=401, detail=self.classify_openai_error(str(e)))
         except RateLimitError as e:
@@ -159,9 +295,186 @@ class OpenAIClient:
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
         
         finally:
+            if not reader.done():
+                reader.cancel()
+            buffer.record()
             # Clean up active request tracking
-            if request_id and request_id in self.active_requests:
-                del self.active_requests[request_id]
+            if request_id:
+                self.active_requests.pop(request_id, None)
+                self.active_streams.pop(request_id, None)
+
+    async def _with_retries(self, route: str, call: Callable[[Any], Awaitable[Any]], affinity: Optional[str] = None) -> Any:
+        """Await call(sdk_client) on a picked endpoint, retrying retryable upstream errors as RetryState allows."""
+        retry = RetryState(route)
+        tried: List[Upstream] = []
+        while True:
+            attempt = self.upstreams.attempt(tried, affinity)
+            tried.append(attempt.upstream)
+            try:
+                async with attempt:
+                    completion = await call(attempt.upstream.client)
+                    usage = getattr(completion, "usage", None)
+                    if usage is not None:
+                        details = usage.prompt_tokens_details
+                        attempt.usage(usage.prompt_tokens or 0, (details.cached_tokens or 0) if details else 0)
+                    return completion
+            except Exception as e:
+                if not await self._backoff(retry, e, tried):
+                    raise
+
+    async def _backoff(self, retry: RetryState, error: Exception, tried: List[Upstream]) -> bool:
+        """Wait before the next attempt; return False if `error` must not be retried."""
+        delay = retry.next_delay(error, other_endpoint=self.upstreams.has_untried(tried))
+        if delay is None:
+            return False
+        logger.warning(f"Upstream {tried[-1].name} failed ({error.__class__.__name__}), retry {retry.attempts}/{config.max_retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        return True
+
+    async def _hedge(self, read: Callable[[StreamBuffer, List[Upstream]], Awaitable[None]], buffer: StreamBuffer, reader: asyncio.Task, tried: List[Upstream], started: float, request_id: str, model: str):
+        """Race a duplicate request against a stream that is slow to produce its first item.
+
+        The duplicate avoids the primary's endpoint when another one is available.
+        Returns the (buffer, reader, start time) to consume. The losing attempt is
+        cancelled through cancel_request(), and request_id is re-pointed at the winner
+        so client disconnects keep cancelling the stream that is actually being read.
+        """
+        hedger.request_started()
+        primary_ready = asyncio.create_task(buffer.wait_ready())
+        hedge_ready = cancelled = None
+        hedge_id = f"{request_id}:hedge"
+        hedge_won = False
+        try:
+            done, _ = await asyncio.wait({primary_ready}, timeout=hedger.delay(model))
+            if done or not hedger.try_hedge():
+                return buffer, reader, started
+
+            hedge_started = time.monotonic()
+            hedge_buffer = StreamBuffer(config.stream_buffer_max_bytes, config.stream_buffer_policy, hedge_id)
+            hedge_reader = asyncio.create_task(read(hedge_buffer, list(tried)))
+            self.active_requests[hedge_id] = asyncio.Event()
+            self.active_streams[hedge_id] = hedge_reader
+            logger.info(f"Hedging request {request_id}: no output from {model} after {hedge_started - started:.2f}s")
+
+            hedge_ready = asyncio.create_task(hedge_buffer.wait_ready())
+            cancelled = asyncio.create_task(self.active_requests[request_id].wait())
+            racing = {primary_ready, hedge_ready}
+            while racing:
+                done, _ = await asyncio.wait(racing | {cancelled}, return_when=asyncio.FIRST_COMPLETED)
+                if cancelled in done:
+                    # Client went away: the primary was cancelled and will surface the 499
+                    break
+                if primary_ready in done:
+                    racing.discard(primary_ready)
+                    # An attempt that failed outright only wins if the other one fails too
+                    if not buffer.failed or not racing:
+                        break
+                if hedge_ready in done:
+                    racing.discard(hedge_ready)
+                    if not hedge_buffer.failed or not racing:
+                        hedge_won = True
+                        break
+        finally:
+            for task in (primary_ready, hedge_ready, cancelled):
+                if task is not None:
+                    task.cancel()
+            if hedge_id in self.active_streams and not hedge_won:
+                self.cancel_request(hedge_id)
+                hedge_buffer.record()
+            self.active_requests.pop(hedge_id, None)
+            self.active_streams.pop(hedge_id, None)
+
+        metrics.inc("hedged_requests_total", winner="hedge" if hedge_won else "primary")
+        if not hedge_won:
+            return buffer, reader, started
+
+        self.cancel_request(request_id)
+        buffer.record()
+        self.active_requests[request_id] = asyncio.Event()
+        self.active_streams[request_id] = hedge_reader
+        return hedge_buffer, hedge_reader, hedge_started
+
+    async def _read_upstream(self, request: Dict[str, Any], extra_body: Optional[Dict[str, Any]], affinity: Optional[str], buffer: StreamBuffer, tried: List[Upstream], convert: Callable[[ChatCompletionChunk], Any]):
+        """Reader task: pull chunks from the upstream and hand them to the response writer.
+
+        A failed attempt is retried only while nothing has reached the buffer yet.
+        Endpoints used are appended to `tried`, which later attempts try to avoid.
+        """
+        retry = RetryState("stream")
+        emitted = False
+        try:
+            while True:
+                attempt = self.upstreams.attempt(tried, affinity)
+                tried.append(attempt.upstream)
+                try:
+                    async with attempt:
+                        client = attempt.upstream.client
+                        # Create the streaming completion
+                        if extra_body:
+                            streaming_completion = await client.chat.completions.create(**request, extra_body=extra_body)
+                        else:
+                            streaming_completion = await client.chat.completions.create(**request)
+
+                        # Closing the stream releases the upstream connection even when cancelled mid-read
+                        async with streaming_completion:
+                            async for chunk in streaming_completion:
+                                if not emitted:
+                                    emitted = True
+                                    attempt.first_byte()
+                                if chunk.usage is not None:
+                                    details = chunk.usage.prompt_tokens_details
+                                    attempt.usage(chunk.usage.prompt_tokens or 0, (details.cached_tokens or 0) if details else 0)
+                                await buffer.put(convert(chunk))
+                    break
+                except Exception as e:
+                    if emitted or not await self._backoff(retry, e, tried):
+                        raise
+            buffer.close()
+        except asyncio.CancelledError:
+            buffer.close(HTTPException(status_code=499, detail="Request cancelled by client"))
+            raise
+        except Exception as e:
+            buffer.close(e)
+
+    async def _read_upstream_bytes(self, request: Dict[str, Any], extra_body: Optional[Dict[str, Any]], affinity: Optional[str], buffer: StreamBuffer, tried: List[Upstream]):
+        """Reader task: relay raw response bytes from the upstream without parsing chunks.
+
+        A failed attempt is retried only while no byte has reached the buffer yet.
+        """
+        retry = RetryState("passthrough")
+        emitted = False
+        try:
+            while True:
+                attempt = self.upstreams.attempt(tried, affinity)
+                tried.append(attempt.upstream)
+                try:
+                    async with attempt:
+                        client = attempt.upstream.client
+                        if extra_body:
+                            response_context = client.chat.completions.with_streaming_response.create(**request, extra_body=extra_body)
+                        else:
+                            response_context = client.chat.completions.with_streaming_response.create(**request)
+
+                        sniffer = UsageSniffer()
+                        async with response_context as response:
+                            async for data in response.iter_bytes():
+                                if not emitted:
+                                    emitted = True
+                                    attempt.first_byte()
+                                sniffer.feed(data)
+                                await buffer.put(data)
+                        if sniffer.usage is not None:
+                            attempt.usage(sniffer.usage["prompt_tokens"], sniffer.usage["cached_tokens"])
+                    break
+                except Exception as e:
+                    if emitted or not await self._backoff(retry, e, tried):
+                        raise
+            buffer.close()
+        except asyncio.CancelledError:
+            buffer.close(HTTPException(status_code=499, detail="Request cancelled by client"))
+            raise
+        except Exception as e:
+            buffer.close(e)
 
     def classify_openai_error(self, error_detail: Any) -> str:
         """Provide specific error guidance for common OpenAI API issues."""
@@ -194,5 +507,9 @@ class OpenAIClient:
         """Cancel an active request by request_id."""
         if request_id in self.active_requests:
             self.active_requests[request_id].set()
+            # Streams are read by a task that may be parked on a stalled upstream
+            reader = self.active_streams.get(request_id)
+            if reader is not None and not reader.done():
+                reader.cancel()
             return True
         return False
\ No newline at end of file
@@ -18,6 +18,13 @@ class Config:
         self.host = os.environ.get("HOST", "0.0.0.0")
         self.port = int(os.environ.get("PORT", "8082"))
         self.log_level = os.environ.get("LOG_LEVEL", "INFO")
+        # Log file rotated by size (empty: log to stderr), "text" or "json" lines,
+        # and the fraction of requests whose full body is dumped at DEBUG level
+        self.log_file = os.environ.get("LOG_FILE", "")
+        self.log_max_bytes = int(os.environ.get("LOG_MAX_BYTES", "10485760"))
+        self.log_backup_count = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+        self.log_format = os.environ.get("LOG_FORMAT", "text")
+        self.log_body_sample_rate = float(os.environ.get("LOG_BODY_SAMPLE_RATE", "1"))
         # Token limits - updated for 2026 specs (GLM-4.7: 128K output, Claude thinking: min 1024)
         self.max_tokens_limit = int(os.environ.get("MAX_TOKENS_LIMIT", "131072"))
         self.min_tokens_limit = int(os.environ.get("MIN_TOKENS_LIMIT", "1024"))
@@ -25,12 +32,114 @@ class Config:
         # Connection settings
         self.request_timeout = int(os.environ.get("REQUEST_TIMEOUT", "90"))
         self.max_retries = int(os.environ.get("MAX_RETRIES", "2"))
+        # Backoff between retries (decorrelated jitter) and the total wait allowed per request
+        self.retry_base_delay = float(os.environ.get("RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.environ.get("RETRY_MAX_DELAY", "20"))
+        self.retry_budget_seconds = float(os.environ.get("RETRY_BUDGET_SECONDS", "30"))
+
+        # Circuit breaker for each endpoint listed in OPENAI_BASE_URL
+        self.breaker_failure_threshold = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+        self.breaker_cooldown_seconds = float(os.environ.get("BREAKER_COOLDOWN_SECONDS", "30"))
+        self.upstream_probe_interval = float(os.environ.get("UPSTREAM_PROBE_INTERVAL", "5"))
+
+        # Memo of converted messages for long transcripts (0 disables)
+        self.conversion_cache_max_bytes = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", "33554432"))
+        # Last validated transcript per conversation, so only new messages are validated
+        # (0 validates everything); listed client keys are always validated in full
+        self.decode_cache_max_bytes = int(os.environ.get("DECODE_CACHE_MAX_BYTES", "67108864"))
+        self.strict_decoding_keys = {key.strip() for key in os.environ.get("STRICT_DECODING_KEYS", "").split(",") if key.strip()}
+
+        # Requests over the mapped model's context window (opt-in): "off", "reject", or
+        # policies ("truncate", "drop_oldest") tried in order before rejecting
+        self.context_fit_policy = [p.strip().lower() for p in os.environ.get("CONTEXT_FIT_POLICY", "off").split(",") if p.strip()]
+        self.context_tool_result_max_tokens = int(os.environ.get("CONTEXT_TOOL_RESULT_MAX_TOKENS", "4096"))
+        self.default_context_window = int(os.environ.get("DEFAULT_CONTEXT_WINDOW", "0"))
+        # JSON file of model capabilities merged over src/core/models.json
+        self.model_registry_file = os.environ.get("MODEL_REGISTRY_FILE", "")
+
+        # Tool results over this many characters are cut to head and tail once they are
+        # TOOL_RESULT_COMPACT_AFTER_TURNS assistant turns old (0 disables)
+        self.tool_result_compact_chars = int(os.environ.get("TOOL_RESULT_COMPACT_CHARS", "0"))
+        self.tool_result_compact_after_turns = int(os.environ.get("TOOL_RESULT_COMPACT_AFTER_TURNS", "4"))
+
+        # Distinct tool sets kept validated, converted and serialized (0 disables)
+        self.tool_cache_size = int(os.environ.get("TOOL_CACHE_SIZE", "64"))
+
+        # Route conversations with the same prompt prefix to the same endpoint (consistent hashing)
+        self.prefix_affinity_enabled = os.environ.get("PREFIX_AFFINITY_ENABLED", "true").lower() in ("true", "1", "yes", "on")
+        # Non-system messages included in the prefix fingerprint
+        self.prefix_affinity_messages = int(os.environ.get("PREFIX_AFFINITY_MESSAGES", "1"))
+
+        # Adaptive (AIMD) concurrency limit per endpoint, with a bounded wait queue (opt-in)
+        self.limiter_enabled = os.environ.get("LIMITER_ENABLED", "false").lower() in ("true", "1", "yes", "on")
+        self.limiter_min_limit = int(os.environ.get("LIMITER_MIN_LIMIT", "1"))
+        self.limiter_max_limit = int(os.environ.get("LIMITER_MAX_LIMIT", "200"))
+        self.limiter_backoff_ratio = float(os.environ.get("LIMITER_BACKOFF_RATIO", "0.5"))
+        self.limiter_latency_tolerance = float(os.environ.get("LIMITER_LATENCY_TOLERANCE", "3.0"))
+        self.limiter_queue_size = int(os.environ.get("LIMITER_QUEUE_SIZE", "100"))
+        self.limiter_queue_timeout = float(os.environ.get("LIMITER_QUEUE_TIMEOUT", "30"))
+
+        # Identical non-streaming requests in flight at the same time share one upstream call (opt-in)
+        self.singleflight_enabled = os.environ.get("SINGLEFLIGHT_ENABLED", "false").lower() in ("true", "1", "yes", "on")
+
+        # Response cache for temperature-0 /v1/messages requests (memory LRU + optional disk tier)
+        self.response_cache_enabled = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() in ("true", "1", "yes", "on")
+        self.response_cache_ttl_seconds = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+        self.response_cache_max_bytes = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", "67108864"))
+        # Directory for the disk tier; empty keeps the cache in memory only
+        self.response_cache_dir = os.environ.get("RESPONSE_CACHE_DIR", "")
+        self.response_cache_disk_max_entries = int(os.environ.get("RESPONSE_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+        # Per-client limits, keyed by the API key the client sends (0 = unlimited)
+        self.client_rpm_limit = int(os.environ.get("CLIENT_RPM_LIMIT", "0"))
+        self.client_input_tpm_limit = int(os.environ.get("CLIENT_INPUT_TPM_LIMIT", "0"))
+        self.client_output_tpm_limit = int(os.environ.get("CLIENT_OUTPUT_TPM_LIMIT", "0"))
+
+        # Hedged streams: duplicate a request whose first chunk is later than the model's p90 TTFT
+        self.hedge_enabled = os.environ.get("HEDGE_ENABLED", "false").lower() in ("true", "1", "yes", "on")
+        self.hedge_percentile = float(os.environ.get("HEDGE_PERCENTILE", "0.9"))
+        self.hedge_min_delay_ms = float(os.environ.get("HEDGE_MIN_DELAY_MS", "250"))
+        self.hedge_initial_delay_ms = float(os.environ.get("HEDGE_INITIAL_DELAY_MS", "3000"))
+        # Fraction of streamed requests that may be hedged (caps the extra upstream spend)
+        self.hedge_max_rate = float(os.environ.get("HEDGE_MAX_RATE", "0.05"))
+
+        # Upstream connection pool (shared by all requests); REQUEST_TIMEOUT is the read timeout
+        self.upstream_max_connections = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", "200"))
+        self.upstream_max_keepalive_connections = int(os.environ.get("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+        self.upstream_keepalive_expiry = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+        # HTTP/2 needs the optional "h2" package (pip install "claude-code-proxy[http2]")
+        self.upstream_http2 = os.environ.get("UPSTREAM_HTTP2", "false").lower() in ("true", "1", "yes", "on")
+        self.upstream_connect_timeout = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "10"))
+        self.upstream_write_timeout = float(os.environ.get("UPSTREAM_WRITE_TIMEOUT", "30"))
+        # How long a request may wait for a free pooled connection
+        self.upstream_pool_timeout = float(os.environ.get("UPSTREAM_POOL_TIMEOUT", "30"))
         
         # Model settings - BIG and SMALL models
         self.big_model = os.environ.get("BIG_MODEL", "gpt-4o")
         self.middle_model = os.environ.get("MIDDLE_MODEL", self.big_model)
         self.small_model = os.environ.get("SMALL_MODEL", "gpt-4o-mini")
 
+        # Streaming settings
+        # Forward tool-call argument fragments as input_json_delta events as they arrive
+        # instead of buffering until the arguments form a complete JSON value
+        self.stream_tool_arguments = os.environ.get("STREAM_TOOL_ARGUMENTS", "false").lower() in ("true", "1", "yes", "on")
+
+        # Coalesce tiny text/thinking deltas into one event per window (0 disables)
+        self.stream_coalesce_window_ms = int(os.environ.get("STREAM_COALESCE_WINDOW_MS", "0"))
+        # Flush a coalesced delta early once it reaches this many bytes
+        self.stream_coalesce_max_bytes = int(os.environ.get("STREAM_COALESCE_MAX_BYTES", "512"))
+
+        # JSON encoder for SSE frames: auto (orjson > msgspec > stdlib), orjson, msgspec, json
+        self.json_backend = os.environ.get("JSON_BACKEND", "auto")
+
+        # Per-stream byte budget between the upstream reader and a slow client, and what to do
+        # once it is full: block (pause the upstream), coalesce (merge deltas), abort (error event)
+        self.stream_buffer_max_bytes = int(os.environ.get("STREAM_BUFFER_MAX_BYTES", "262144"))
+        self.stream_buffer_policy = os.environ.get("STREAM_BUFFER_POLICY", "block").lower()
+
+        # Relay /v1/chat/completions streams as raw upstream bytes (no per-chunk parse/re-encode)
+        self.openai_stream_passthrough = os.environ.get("OPENAI_STREAM_PASSTHROUGH", "true").lower() in ("true", "1", "yes", "on")
+
         # Requesty Auto Cache configuration
         self.requesty_auto_cache = os.environ.get("REQUESTY_AUTO_CACHE", "false").lower() in ("true", "1", "yes", "on")
         self.requesty_api_key = os.environ.get("REQUESTY_API_KEY")  # Optional: for enhanced features
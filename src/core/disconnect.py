@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+
+async def _wait_for_disconnect(http_request: Request, openai_client, request_id: str):
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            logger.info(f"Client disconnected, cancelling request {request_id}")
+            openai_client.cancel_request(request_id)
+            return
+
+
+def start_disconnect_watcher(http_request: Optional[Request], openai_client, request_id: str) -> Optional[asyncio.Task]:
+    """Start one task per request that cancels the upstream as soon as the client goes away.
+
+    The task parks on the ASGI receive channel, so detection does not depend on upstream
+    chunks arriving and nothing is polled per chunk. Cancel the returned task when the
+    request finishes normally.
+    """
+    if http_request is None:
+        return None
+    return asyncio.create_task(_wait_for_disconnect(http_request, openai_client, request_id))
+
+
+def stop_disconnect_watcher(watcher: Optional[asyncio.Task]):
+    if watcher is not None and not watcher.done():
+        watcher.cancel()
+
+
+async def watch_stream(stream: AsyncIterator, http_request: Optional[Request], openai_client, request_id: str):
+    """Yield from `stream` while a disconnect watcher guards the upstream request."""
+    watcher = start_disconnect_watcher(http_request, openai_client, request_id)
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        stop_disconnect_watcher(watcher)
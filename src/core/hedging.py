@@ -0,0 +1,87 @@
+"""Hedged streaming requests (HEDGE_ENABLED).
+
+If a stream has produced nothing after the hedge delay, a duplicate request is sent
+and whichever of the two produces output first is kept; the other is cancelled. The
+delay is the model's recent HEDGE_PERCENTILE time-to-first-token (HEDGE_INITIAL_DELAY_MS
+until enough samples exist), never below HEDGE_MIN_DELAY_MS.
+
+Hedges are paid for from a token bucket refilled by HEDGE_MAX_RATE per streamed
+request, so under overload (when every request is slow) extra upstream traffic stays
+within that fraction instead of doubling.
+"""
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from src.core.config import config
+from src.core.metrics import metrics
+
+SAMPLE_WINDOW = 256
+MIN_SAMPLES = 20
+REFRESH_EVERY = 16
+BURST = 5.0
+
+
+class TTFTTracker:
+    """Recent time-to-first-token samples and their percentile, per model."""
+
+    def __init__(self):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._thresholds: Dict[str, float] = {}
+        self._since_refresh: Dict[str, int] = {}
+
+    def observe(self, model: str, seconds: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=SAMPLE_WINDOW)
+        samples.append(seconds)
+        count = self._since_refresh.get(model, 0) + 1
+        # Re-sorting on every sample is wasted work; the percentile moves slowly
+        if count >= REFRESH_EVERY or model not in self._thresholds:
+            count = 0
+            if len(samples) >= MIN_SAMPLES:
+                ordered = sorted(samples)
+                self._thresholds[model] = ordered[min(len(ordered) - 1, int(len(ordered) * config.hedge_percentile))]
+        self._since_refresh[model] = count
+
+    def percentile(self, model: str) -> Optional[float]:
+        return self._thresholds.get(model)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            model: {"samples": len(samples), "threshold_seconds": self._thresholds.get(model)}
+            for model, samples in list(self._samples.items())
+        }
+
+
+class Hedger:
+    """Hedge delay per model plus the process-wide hedge budget."""
+
+    def __init__(self):
+        self.ttft = TTFTTracker()
+        self.tokens = 1.0
+
+    def delay(self, model: str) -> float:
+        """Seconds to wait for a first item before hedging."""
+        threshold = self.ttft.percentile(model)
+        if threshold is None:
+            threshold = config.hedge_initial_delay_ms / 1000.0
+        return max(threshold, config.hedge_min_delay_ms / 1000.0)
+
+    def request_started(self):
+        self.tokens = min(BURST, self.tokens + config.hedge_max_rate)
+
+    def try_hedge(self) -> bool:
+        """Spend one hedge from the budget, if there is one."""
+        if self.tokens < 1.0:
+            metrics.inc("hedges_skipped_total", reason="budget")
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        return {"enabled": config.hedge_enabled, "budget_tokens": round(self.tokens, 3), "models": self.ttft.stats()}
+
+
+hedger = Hedger()
+metrics.register_collector("hedging", hedger.stats)
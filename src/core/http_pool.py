@@ -0,0 +1,156 @@
+"""Process-wide httpx clients for upstream API traffic.
+
+Every OpenAIClient shares one pooled AsyncClient per pool name, so keep-alive
+connections (and their TLS sessions) are reused across requests. Pool size,
+keep-alive, HTTP/2 and the connect/read/write/pool timeouts come from config;
+occupancy is reported under "upstream_pools" on /metrics.
+
+HTTP_PROXY, HTTPS_PROXY, ALL_PROXY and NO_PROXY are honored as by httpx's own
+clients: each proxy gets a pooled transport of its own, mounted by URL pattern.
+"""
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from httpx._utils import get_environment_proxies
+
+from src.core.config import config
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+# Per pool: the direct transport and the proxied ones by URL pattern
+_transports: Dict[str, Tuple["PooledTransport", Dict[str, "PooledTransport"]]] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def upstream_timeout(read: Optional[float] = None) -> httpx.Timeout:
+    """Separate connect/read/write/pool timeouts; `read` defaults to REQUEST_TIMEOUT."""
+    return httpx.Timeout(
+        connect=config.upstream_connect_timeout,
+        read=config.request_timeout if read is None else read,
+        write=config.upstream_write_timeout,
+        pool=config.upstream_pool_timeout,
+    )
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body wrapper that marks the request finished once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, transport: "PooledTransport"):
+        self._stream = stream
+        self._transport = transport
+        self._open = True
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        if self._open:
+            self._open = False
+            self._transport.in_flight -= 1
+        await self._stream.aclose()
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that counts in-flight requests and pool timeouts."""
+
+    def __init__(self, name: str, limits: httpx.Limits, http2: bool, proxy: Optional[str] = None):
+        super().__init__(limits=limits, http2=http2, proxy=proxy)
+        self.name = name
+        self.limits = limits
+        self.http2 = http2
+        self.in_flight = 0
+        self.pool_timeouts = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.in_flight -= 1
+            self.pool_timeouts += 1
+            logger.warning(f"Upstream pool '{self.name}' exhausted ({self.limits.max_connections} connections)")
+            raise
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        response.stream = _TrackedStream(response.stream, self)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        # httpcore keeps the pool on a private attribute; degrade to request counts without it
+        pool = getattr(self, "_pool", None)
+        connections = list(pool.connections) if pool is not None else []
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "connections": len(connections),
+            "active_connections": len(connections) - idle,
+            "idle_connections": idle,
+            "requests_in_flight": self.in_flight,
+            "pool_timeouts": self.pool_timeouts,
+        }
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """Return the shared AsyncClient for `name`, creating it on first use."""
+    client = _clients.get(name)
+    if client is not None and not client.is_closed:
+        return client
+
+    http2 = config.upstream_http2
+    if http2 and not _http2_available():
+        logger.warning('UPSTREAM_HTTP2 is enabled but the "h2" package is not installed; using HTTP/1.1')
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=config.upstream_max_connections,
+        max_keepalive_connections=config.upstream_max_keepalive_connections,
+        keepalive_expiry=config.upstream_keepalive_expiry,
+    )
+    transport = PooledTransport(name, limits, http2)
+    # An explicit transport turns off httpx's environment proxy support: mount a
+    # proxied transport per proxy URL pattern (None, for NO_PROXY, means `transport`)
+    mounts = {
+        pattern: None if proxy is None else PooledTransport(name, limits, http2, proxy=proxy)
+        for pattern, proxy in get_environment_proxies().items()
+    }
+    client = httpx.AsyncClient(transport=transport, mounts=mounts, timeout=upstream_timeout(), follow_redirects=True)
+    _clients[name] = client
+    proxied = {pattern: proxy for pattern, proxy in mounts.items() if proxy is not None}
+    _transports[name] = (transport, proxied)
+    logger.debug(f"Created upstream pool '{name}': {limits}, http2={http2}, proxied={sorted(proxied)}")
+    return client
+
+
+async def close_http_clients():
+    """Close every pooled client (called on application shutdown)."""
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+    _transports.clear()
+
+
+def _pool_stats():
+    stats = {}
+    for name, (transport, proxied) in list(_transports.items()):
+        stats[name] = transport.stats()
+        if proxied:
+            stats[name]["proxied"] = {pattern: proxy.stats() for pattern, proxy in proxied.items()}
+    return stats
+
+
+metrics.register_collector("upstream_pools", _pool_stats)
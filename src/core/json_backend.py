@@ -0,0 +1,104 @@
+"""JSON backend selected once at startup.
+
+JSON_BACKEND picks the implementation: "auto" (default) prefers orjson, then msgspec,
+then falls back to the standard library. All backends emit compact UTF-8 without
+ASCII-escaping, matching json.dumps(..., ensure_ascii=False) semantically;
+dumps_sorted_bytes also sorts object keys, for canonical hashing.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, Tuple
+
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+_STDLIB_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_STDLIB_SORTED_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+# (dumps_bytes, dumps_sorted_bytes, loads)
+Backend = Tuple[Callable[[Any], bytes], Callable[[Any], bytes], Callable[[Any], Any]]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return _STDLIB_ENCODER.encode(obj).encode("utf-8")
+
+
+def _stdlib_dumps_sorted(obj: Any) -> bytes:
+    return _STDLIB_SORTED_ENCODER.encode(obj).encode("utf-8")
+
+
+def _load_orjson() -> Backend:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # Non-str keys, >64-bit ints, unknown types: let the stdlib decide
+            return _stdlib_dumps(obj)
+
+    def dumps_sorted(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return _stdlib_dumps_sorted(obj)
+
+    return dumps, dumps_sorted, orjson.loads
+
+
+def _load_msgspec() -> Backend:
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any) -> bytes:
+        try:
+            return encoder.encode(obj)
+        except (TypeError, msgspec.EncodeError):
+            return _stdlib_dumps(obj)
+
+    try:
+        sorted_encoder = msgspec.json.Encoder(order="sorted")
+    except TypeError:
+        # msgspec < 0.17 cannot sort keys
+        return dumps, _stdlib_dumps_sorted, decoder.decode
+
+    def dumps_sorted(obj: Any) -> bytes:
+        try:
+            return sorted_encoder.encode(obj)
+        except (TypeError, msgspec.EncodeError):
+            return _stdlib_dumps_sorted(obj)
+
+    return dumps, dumps_sorted, decoder.decode
+
+
+_LOADERS: Dict[str, Callable[[], Backend]] = {"orjson": _load_orjson, "msgspec": _load_msgspec}
+
+
+def _select_backend(requested: str) -> Tuple[str, Callable[[Any], bytes], Callable[[Any], bytes], Callable[[Any], Any]]:
+    requested = (requested or "auto").lower()
+    candidates = ["orjson", "msgspec"] if requested == "auto" else [requested]
+    for name in candidates:
+        if name in ("json", "stdlib"):
+            break
+        loader = _LOADERS.get(name)
+        if loader is None:
+            logger.warning(f"Unknown JSON_BACKEND '{name}', using stdlib json")
+            break
+        try:
+            return (name, *loader())
+        except ImportError:
+            if requested != "auto":
+                logger.warning(f"JSON_BACKEND '{name}' is not installed, using stdlib json")
+    return "json", _stdlib_dumps, _stdlib_dumps_sorted, json.loads
+
+
+BACKEND, dumps_bytes, dumps_sorted_bytes, loads = _select_backend(config.json_backend)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a compact JSON str using the selected backend."""
+    return dumps_bytes(obj).decode("utf-8")
@@ -0,0 +1,150 @@
+"""Adaptive (AIMD) concurrency limit per upstream endpoint.
+
+Each endpoint starts at LIMITER_MAX_LIMIT concurrent requests. A 429/503/529 cuts
+the limit by LIMITER_BACKOFF_RATIO, and so (by a gentler 10%) does a latency more
+than LIMITER_LATENCY_TOLERANCE times the endpoint's baseline for that kind of
+request: time to first chunk for streams, time to the whole response otherwise.
+Successes while the limiter is busy add 1/limit, i.e. about one slot per limit's
+worth of requests. A decrease only counts for requests admitted after the
+previous decrease, so one burst of 429s halves the limit once rather than to the floor.
+
+Requests over the limit wait in a FIFO queue of at most LIMITER_QUEUE_SIZE for up to
+LIMITER_QUEUE_TIMEOUT seconds. A request whose expected wait already exceeds that
+deadline is refused at once instead of timing out at the back of the queue.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from src.core.config import config
+from src.core.metrics import metrics
+
+LATENCY_DECREASE = 0.9
+BASELINE_ALPHA = 0.05
+HOLD_ALPHA = 0.1
+
+
+class UpstreamOverloadedError(Exception):
+    """Raised when a request cannot get a concurrency slot in time."""
+
+
+class ConcurrencyLimiter:
+    """AIMD limit plus bounded, deadline-aware wait queue for one endpoint."""
+
+    def __init__(self, name: str, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.limit = float(config.limiter_max_limit)
+        self.in_flight = 0
+        self.epoch = 0
+        # Latency baseline per kind of request ("stream", "response")
+        self.baselines: Dict[str, float] = {}
+        self.hold: Optional[float] = None
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._clock = clock
+
+    def _expected_wait(self) -> float:
+        """Rough wait for a newcomer: everyone queued ahead, drained `limit` at a time."""
+        if self.hold is None:
+            return 0.0
+        return (len(self._waiters) + 1) * self.hold / max(1.0, self.limit)
+
+    def _reject(self, reason: str, message: str):
+        self.rejected += 1
+        metrics.inc("limiter_rejected_total", upstream=self.name, reason=reason)
+        raise UpstreamOverloadedError(message)
+
+    async def acquire(self) -> Tuple[int, float]:
+        """Wait for a slot; returns the token to pass to release()."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return self.epoch, self._clock()
+
+        timeout = config.limiter_queue_timeout
+        if len(self._waiters) >= config.limiter_queue_size:
+            self._reject("queue_full", f"Upstream {self.name} is overloaded ({len(self._waiters)} requests queued)")
+        if self._expected_wait() > timeout:
+            self._reject("deadline", f"Upstream {self.name} is overloaded (expected wait over {timeout:.0f}s)")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        queued = self._clock()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self._reject("timeout", f"Upstream {self.name} is overloaded (no slot within {timeout:.0f}s)")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        finally:
+            metrics.observe("limiter_queue_wait_seconds", self._clock() - queued, upstream=self.name)
+        return self.epoch, self._clock()
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            # Granted just as we gave up: hand the slot on
+            self.in_flight -= 1
+            self._wake()
+        else:
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def release(
+        self, token: Tuple[int, float], overloaded: bool = False, latency: Optional[float] = None, kind: str = "stream"
+    ):
+        """Return a slot and adjust the limit from the request's outcome.
+
+        `latency` is the time to first chunk for streams and the time to the whole
+        response for other requests (`kind` "response"); None when not comparable.
+        """
+        epoch, acquired = token
+        self.in_flight -= 1
+        held = self._clock() - acquired
+        self.hold = held if self.hold is None else self.hold + HOLD_ALPHA * (held - self.hold)
+
+        baseline = self.baselines.get(kind)
+        if overloaded:
+            self._decrease(epoch, config.limiter_backoff_ratio)
+        elif latency is not None and baseline is not None and latency > baseline * config.limiter_latency_tolerance:
+            self._decrease(epoch, LATENCY_DECREASE)
+        else:
+            if latency is not None:
+                self.baselines[kind] = latency if baseline is None else baseline + BASELINE_ALPHA * (latency - baseline)
+            # Only grow while the limit is actually in use
+            if self._waiters or self.in_flight + 1 >= self.limit / 2:
+                self.limit = min(float(config.limiter_max_limit), self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def cancel(self, token: Tuple[int, float]):
+        """Return a slot without adjusting the limit."""
+        self.in_flight -= 1
+        self._wake()
+
+    def _decrease(self, epoch: int, ratio: float):
+        if epoch != self.epoch:
+            return
+        self.epoch += 1
+        self.limit = max(float(config.limiter_min_limit), self.limit * ratio)
+        metrics.inc("limiter_decreases_total", upstream=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+        }
@@ -1,21 +1,144 @@
+"""Logging setup: records are queued on the calling thread and written by a background thread.
+
+The root logger gets a single QueueHandler; a QueueListener thread formats the records
+and does the I/O, so the event loop never blocks on a slow terminal or disk. With
+LOG_FILE set, logs go to that file instead of stderr and are rotated by size
+(LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files). LOG_FORMAT=json writes one JSON
+object per line, including any `extra=` fields passed to the logging call.
+
+Large payloads are logged as LazyJSON or through log_body(): they are only serialized
+if the record is actually emitted, and full request/response bodies are dumped for a
+LOG_BODY_SAMPLE_RATE fraction of requests at DEBUG level.
+"""
+
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
+from typing import Any, Optional
+
+from src.core import json_backend
 from src.core.config import config
 
-# Parse log level - extract just the first word to handle comments
-log_level = config.log_level.split()[0].upper()
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# LogRecord attributes that are not `extra=` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class LazyJSON:
+    """A value that is serialized to JSON only when the log record is formatted."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        return json_backend.dumps_bytes(self.value).decode("utf-8")
+
+
+def log_body(log: logging.Logger, message: str, body: Any):
+    """Dump a full body at DEBUG level for a LOG_BODY_SAMPLE_RATE fraction of calls."""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    rate = config.log_body_sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return
+    log.debug("%s: %s", message, LazyJSON(body))
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_FIELDS and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json_backend.dumps_bytes(entry).decode("utf-8")
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Resolves the message on the caller's thread; formatting happens on the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may be mutated once the call returns, so render them now
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_level(value: str) -> str:
+    # Extract just the first word to handle comments
+    level = (value.split() or ["INFO"])[0].upper()
+    if level not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+        level = 'INFO'
+    return level
+
+
+def _output_handler() -> logging.Handler:
+    if not config.log_file:
+        return logging.StreamHandler()
+    directory = os.path.dirname(config.log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return logging.handlers.RotatingFileHandler(
+        config.log_file,
+        maxBytes=config.log_max_bytes,
+        backupCount=config.log_backup_count,
+        encoding="utf-8",
+    )
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging():
+    """Route the root logger through the queue (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    output = _output_handler()
+    output.setFormatter(JSONFormatter() if config.log_format.lower() == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(queue.SimpleQueue()))
+    root.setLevel(_parse_level(config.log_level))
+
+    _listener = logging.handlers.QueueListener(root.handlers[0].queue, output)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
-# Validate and set default if invalid
-valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-if log_level not in valid_levels:
-    log_level = 'INFO'
 
-# Logging Configuration
-logging.basicConfig(
-    level=getattr(logging, log_level),
-    format='%(asctime)s - %(levelname)s - %(message)s',
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Configure uvicorn to be quieter
 for uvicorn_logger in ["uvicorn", "uvicorn.access", "uvicorn.error"]:
-    logging.getLogger(uvicorn_logger).setLevel(logging.WARNING)
\ No newline at end of file
+    logging.getLogger(uvicorn_logger).setLevel(logging.WARNING)
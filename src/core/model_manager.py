@@ -1,42 +1,38 @@
+from functools import lru_cache
+
 from src.core.config import config
 
+# Upstream model names passed through as-is (the first group is case-sensitive)
+PASSTHROUGH_PREFIXES = ("gpt-", "o1-", "ep-", "doubao-", "deepseek-")
+PASSTHROUGH_PREFIXES_ANY_CASE = ("glm-", "glm4", "minimax", "gemini")
+# Claude model families and the configured model they map to, in order
+TIERS = (("haiku", "small_model"), ("sonnet", "middle_model"), ("opus", "big_model"))
+MAP_CACHE_SIZE = 1024
+
+
 class ModelManager:
     def __init__(self, config):
         self.config = config
+        # Clients use a handful of model names; each is mapped once
+        self.map_claude_model_to_openai = lru_cache(maxsize=MAP_CACHE_SIZE)(self._map_claude_model_to_openai)
 
-    def map_claude_model_to_openai(self, claude_model: str) -> str:
+    def _map_claude_model_to_openai(self, claude_model: str) -> str:
         """Map Claude model names to OpenAI model names based on BIG/SMALL pattern"""
-        # If it's already an OpenAI model, return as-is
-        if claude_model.startswith("gpt-") or claude_model.startswith("o1-"):
-            return claude_model
-
-        # If it's other supported models (ARK/Doubao/DeepSeek), return as-is
-        if (claude_model.startswith("ep-") or claude_model.startswith("doubao-") or
-            claude_model.startswith("deepseek-")):
-            return claude_model
-
-        # 2026 providers - passthrough for GLM, MiniMax, Gemini models
+        # OpenAI, ARK/Doubao/DeepSeek and 2026 providers (GLM, MiniMax, Gemini) pass through
         model_lower = claude_model.lower()
-        if (model_lower.startswith("glm-") or model_lower.startswith("glm4") or
-            model_lower.startswith("minimax") or
-            model_lower.startswith("gemini")):
+        if claude_model.startswith(PASSTHROUGH_PREFIXES) or model_lower.startswith(PASSTHROUGH_PREFIXES_ANY_CASE):
             return claude_model
 
         # Map based on model naming patterns
-        model_lower = claude_model.lower()
-        if 'haiku' in model_lower:
-            return self.config.small_model
-        elif 'sonnet' in model_lower:
-            return self.config.middle_model
-        elif 'opus' in model_lower:
-            return self.config.big_model
-        else:
-            # Default to big model for unknown models
-            return self.config.big_model
+        for family, setting in TIERS:
+            if family in model_lower:
+                return getattr(self.config, setting)
+        # Default to big model for unknown models
+        return self.config.big_model
 
     def map_model(self, model: str) -> str:
         """Generic mapping entrypoint. For Claude-like names map to configured
         BIG/MIDDLE/SMALL; for OpenAI/other providers pass through."""
         return self.map_claude_model_to_openai(model)
 
-model_manager = ModelManager(config)
\ No newline at end of file
+model_manager = ModelManager(config)
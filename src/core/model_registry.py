@@ -0,0 +1,123 @@
+"""Capabilities of the upstream models: context window, output limit, features, tokenizer.
+
+The registry is a JSON file (src/core/models.json, extended or overridden by
+MODEL_REGISTRY_FILE). Its "models" object maps model names to their capabilities;
+a name ending in "*" is a prefix, as in PROFILE_MODELS. Names are matched in lower
+case with any provider path ("zai/", "groq/moonshotai/") removed.
+
+    "glm-4.7*": {"context_window": 200000, "max_output": 131072, "thinking": true,
+                 "images": false, "tokenizer": "glm"}
+
+Omitted fields are unknown: the global settings (MAX_TOKENS_LIMIT,
+DEFAULT_CONTEXT_WINDOW) apply and nothing is stripped. "tokenizers" maps each
+tokenizer family to its average characters per token, used by token_estimate.py.
+
+At startup the entries are compiled into an exact-match dict and a prefix trie
+(the longest matching prefix wins); resolved names are kept in an LRU cache.
+"""
+
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from src.core.config import config
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BUILTIN_REGISTRY = os.path.join(os.path.dirname(__file__), "models.json")
+DEFAULT_TOKENIZER = "default"
+RESOLVE_CACHE_SIZE = 1024
+# Trie node key holding the entry of the prefix ending at that node
+_END = ""
+
+
+class ModelInfo:
+    """What the registry knows about one model (None: unknown)."""
+
+    __slots__ = ("pattern", "context_window", "max_output", "thinking", "images", "tokenizer", "chars_per_token")
+
+    def __init__(self, pattern: str, spec: Dict[str, Any], tokenizers: Dict[str, float]):
+        self.pattern = pattern
+        self.context_window: Optional[int] = spec.get("context_window")
+        self.max_output: Optional[int] = spec.get("max_output")
+        self.thinking: Optional[bool] = spec.get("thinking")
+        self.images: Optional[bool] = spec.get("images")
+        self.tokenizer: str = spec.get("tokenizer") or DEFAULT_TOKENIZER
+        if self.tokenizer not in tokenizers:
+            logger.warning(f"Model registry: unknown tokenizer '{self.tokenizer}' for {pattern}")
+        self.chars_per_token: float = tokenizers.get(self.tokenizer) or tokenizers[DEFAULT_TOKENIZER]
+
+
+def normalize_model(model: str) -> str:
+    """Lower-case model name without its provider path."""
+    return model.lower().rsplit("/", 1)[-1]
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ModelRegistry:
+    def __init__(self, extra_path: str = ""):
+        registry = _load(BUILTIN_REGISTRY)
+        if extra_path:
+            extra = _load(extra_path)
+            registry["tokenizers"].update(extra.get("tokenizers") or {})
+            registry["models"].update(extra.get("models") or {})
+            logger.info(f"Loaded model registry from {extra_path}")
+
+        self.tokenizers: Dict[str, float] = registry["tokenizers"]
+        self.tokenizers.setdefault(DEFAULT_TOKENIZER, 4.0)
+        self._exact: Dict[str, ModelInfo] = {}
+        self._trie: Dict[str, Any] = {}
+        for pattern, spec in registry["models"].items():
+            info = ModelInfo(pattern, spec, self.tokenizers)
+            name = pattern.lower()
+            if not name.endswith("*"):
+                self._exact[name] = info
+                continue
+            node = self._trie
+            for char in name[:-1]:
+                node = node.setdefault(char, {})
+            node[_END] = info
+        self.resolve = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve)
+
+    def _resolve(self, model: str) -> Optional[ModelInfo]:
+        """The entry for `model` (exact name first, then longest prefix), or None."""
+        name = normalize_model(model)
+        info = self._exact.get(name)
+        if info is not None:
+            return info
+        node = self._trie
+        info = node.get(_END)
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                break
+            info = node.get(_END, info)
+        return info
+
+    def chars_per_token(self, model: str) -> float:
+        info = self.resolve(model)
+        return info.chars_per_token if info is not None else self.tokenizers[DEFAULT_TOKENIZER]
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self.resolve.cache_info()
+        return {
+            "models": len(self._exact) + self._count(self._trie),
+            "resolved": cache.currsize,
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        }
+
+    @classmethod
+    def _count(cls, node: Dict[str, Any]) -> int:
+        return sum(1 if key == _END else cls._count(child) for key, child in node.items())
+
+
+model_registry = ModelRegistry(config.model_registry_file)
+metrics.register_collector("model_registry", model_registry.stats)
@@ -0,0 +1,174 @@
+"""Provider profiles served from a single proxy process.
+
+PROXY_PROFILES lists extra providers as `name=env_file` pairs, e.g.
+`PROXY_PROFILES="kimi=.env-requesty-kimi-k2,glm=.env-requesty-glm"`. Each env
+file is read with dotenv_values (the process environment is left untouched) and
+gives that profile its own base URL, key, custom headers, model map, port and
+upstream connection pool. Settings missing from a profile file fall back to the
+main configuration, which is always available as the "default" profile.
+
+A request is routed to a profile by, in order: the `/{profile}/...` path prefix,
+the `x-proxy-profile` header, the port it arrived on, the requested model name,
+and finally the default profile. Model routing only uses the models a profile's
+env file names (PROFILE_MODELS, or its BIG/MIDDLE/SMALL_MODEL), and never takes
+a model the default profile serves.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+from dotenv import dotenv_values
+from starlette.requests import HTTPConnection
+
+from src.core.client import OpenAIClient
+from src.core.config import config
+from src.core.model_manager import ModelManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = "default"
+PROFILE_HEADER = "x-proxy-profile"
+MODEL_KEYS = ("BIG_MODEL", "MIDDLE_MODEL", "SMALL_MODEL")
+
+
+def _truthy(value: str) -> bool:
+    return value.lower() in ("true", "1", "yes", "on")
+
+
+class Profile:
+    """One upstream provider: connection settings, model map and client."""
+
+    def __init__(self, name: str, values: Dict[str, Optional[str]]):
+        self.name = name
+
+        def get(key: str, default=None):
+            value = values.get(key)
+            return default if value is None or value == "" else value
+
+        self.openai_api_key = get("OPENAI_API_KEY", config.openai_api_key)
+        self.openai_base_url = get("OPENAI_BASE_URL", config.openai_base_url)
+        self.azure_api_version = get("AZURE_API_VERSION", config.azure_api_version)
+        self.anthropic_api_key = get("ANTHROPIC_API_KEY", config.anthropic_api_key)
+        self.big_model = get("BIG_MODEL", config.big_model)
+        self.middle_model = get("MIDDLE_MODEL", self.big_model if "BIG_MODEL" in values else config.middle_model)
+        self.small_model = get("SMALL_MODEL", config.small_model)
+        self.request_timeout = int(get("REQUEST_TIMEOUT", config.request_timeout))
+        self.requesty_auto_cache = _truthy(get("REQUESTY_AUTO_CACHE", str(config.requesty_auto_cache)))
+        port = get("PORT")
+        self.port: Optional[int] = int(port) if port else None
+
+        # Upstream model names (exact, or prefixes ending in "*") routed to this profile:
+        # PROFILE_MODELS, else the models its env file sets (inherited ones stay with the
+        # default profile, which routes the main configuration's models)
+        routed = get("PROFILE_MODELS")
+        if routed:
+            self.routed_models = [m.strip() for m in routed.split(",") if m.strip()]
+        elif name == DEFAULT_PROFILE:
+            self.routed_models = sorted({self.big_model, self.middle_model, self.small_model})
+        else:
+            self.routed_models = sorted({get(key) for key in MODEL_KEYS if get(key)})
+
+        self.custom_headers = config.get_custom_headers()
+        for key, value in values.items():
+            if key.startswith("CUSTOM_HEADER_") and key[14:] and value is not None:
+                self.custom_headers[key[14:].replace("_", "-")] = value
+
+        self.model_manager = ModelManager(self)
+        self.client = OpenAIClient(
+            self.openai_api_key,
+            self.openai_base_url,
+            self.request_timeout,
+            api_version=self.azure_api_version,
+            custom_headers=self.custom_headers,
+            pool_name=name,
+        )
+
+    def routes_model(self, model: str) -> bool:
+        for pattern in self.routed_models:
+            if pattern.endswith("*"):
+                if model.startswith(pattern[:-1]):
+                    return True
+            elif model == pattern:
+                return True
+        return False
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "base_url": self.openai_base_url,
+            "port": self.port,
+            "big_model": self.big_model,
+            "middle_model": self.middle_model,
+            "small_model": self.small_model,
+            "routed_models": self.routed_models,
+        }
+
+
+class ProfileRegistry:
+    def __init__(self):
+        self.profiles: Dict[str, Profile] = {}
+        self.by_port: Dict[int, Profile] = {}
+        self.default: Optional[Profile] = None
+
+    def add(self, profile: Profile):
+        self.profiles[profile.name] = profile
+        if profile.port is not None and profile.port != config.port:
+            self.by_port.setdefault(profile.port, profile)
+        if self.default is None:
+            self.default = profile
+
+    def get(self, name: str) -> Optional[Profile]:
+        return self.profiles.get(name)
+
+    def ports(self) -> List[int]:
+        """Extra ports to listen on besides config.port (one per profile that sets PORT)."""
+        return sorted(self.by_port)
+
+    def resolve(self, connection: HTTPConnection, model: Optional[str] = None) -> Profile:
+        """Pick the profile for a request: path prefix, header, port, model, then default."""
+        if len(self.profiles) == 1:
+            return self.default
+
+        name = connection.scope.get("proxy_profile") or connection.headers.get(PROFILE_HEADER)
+        if name:
+            profile = self.profiles.get(name)
+            if profile is not None:
+                return profile
+            logger.warning(f"Unknown profile '{name}' requested, using routing fallbacks")
+
+        server = connection.scope.get("server")
+        if server and server[1] in self.by_port:
+            return self.by_port[server[1]]
+
+        # A model the default profile also serves stays there
+        if model and not self.default.routes_model(model):
+            for profile in self.profiles.values():
+                if profile is not self.default and profile.routes_model(model):
+                    return profile
+
+        return self.default
+
+
+def load_profiles(spec: Optional[str] = None) -> ProfileRegistry:
+    """Build the registry: the main configuration as "default" plus every PROXY_PROFILES entry."""
+    registry = ProfileRegistry()
+    registry.add(Profile(DEFAULT_PROFILE, {}))
+
+    spec = os.environ.get("PROXY_PROFILES", "") if spec is None else spec
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, env_file = entry.partition("=")
+        name, env_file = name.strip(), env_file.strip()
+        if not name or not env_file or name == DEFAULT_PROFILE:
+            raise ValueError(f"Invalid PROXY_PROFILES entry: '{entry}' (expected name=env_file)")
+        if not os.path.exists(env_file):
+            raise ValueError(f"Profile '{name}': env file not found: {env_file}")
+        registry.add(Profile(name, dotenv_values(env_file)))
+        logger.info(f"Loaded profile '{name}' from {env_file}")
+
+    return registry
+
+
+profiles = load_profiles()
@@ -0,0 +1,204 @@
+"""Per-client rate limits, keyed by the client's API key.
+
+Each key gets token buckets for requests, input tokens and output tokens per
+minute (CLIENT_RPM_LIMIT, CLIENT_INPUT_TPM_LIMIT, CLIENT_OUTPUT_TPM_LIMIT; 0 turns a
+bucket off). A bucket holds one minute of budget and refills continuously. A key
+only identifies a client when the profile checks it (ANTHROPIC_API_KEY); otherwise
+a client could send a new key with every request for fresh budgets, so callers key
+those requests by client address (client_identity()).
+
+Input tokens are charged up front from a character-based estimate of the upstream
+request and corrected once the upstream reports usage; a request that fails before
+that gets the estimate back (Charge.refund()). Output tokens are charged from usage
+after the fact; a client in output debt is refused until the bucket has refilled.
+Refusals carry the seconds until the request would fit as `retry-after`. Keys live
+in an LRU dict, so a lookup is one hash probe.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from src.core.config import config
+from src.core.metrics import metrics
+from src.core.token_estimate import estimate_prompt_tokens
+from src.core.usage_sniffer import UsageSniffer
+
+MAX_CLIENTS = 10000
+ANONYMOUS = "anonymous"
+
+
+def client_identity(client_key: Optional[str], key_checked: bool, address: Optional[str]) -> str:
+    """The rate-limit key of a request: its API key if the profile checked it, else its address."""
+    if key_checked and client_key:
+        return client_key
+    return f"address:{address or ANONYMOUS}"
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Holds up to one minute of `per_minute`; refilled lazily on access."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, per_minute: int, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity need a full bucket)."""
+        missing = min(amount, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class ClientBuckets:
+    __slots__ = ("requests", "input", "output", "limited")
+
+    def __init__(self, now: float):
+        self.requests = TokenBucket(config.client_rpm_limit, now) if config.client_rpm_limit > 0 else None
+        self.input = TokenBucket(config.client_input_tpm_limit, now) if config.client_input_tpm_limit > 0 else None
+        self.output = TokenBucket(config.client_output_tpm_limit, now) if config.client_output_tpm_limit > 0 else None
+        self.limited = 0
+
+
+class Charge:
+    """What one admitted request was charged; settle() corrects it from actual usage."""
+
+    __slots__ = ("buckets", "estimate", "settled")
+
+    def __init__(self, buckets: ClientBuckets, estimate: int):
+        self.buckets = buckets
+        self.estimate = estimate
+        self.settled = False
+
+    def settle(self, usage: Optional[Dict[str, Any]]):
+        """Apply usage ({"prompt_tokens", "completion_tokens"}); None keeps the estimate."""
+        if self.settled:
+            return
+        self.settled = True
+        if not usage:
+            return
+        if self.buckets.input is not None:
+            self.buckets.input.tokens += self.estimate - (usage.get("prompt_tokens") or 0)
+        if self.buckets.output is not None:
+            self.buckets.output.tokens -= usage.get("completion_tokens") or 0
+
+    def refund(self):
+        """Give back the input estimate of a request that failed before reporting usage."""
+        if self.settled:
+            return
+        self.settled = True
+        if self.buckets.input is not None:
+            self.buckets.input.tokens += self.estimate
+
+    async def track_deltas(self, stream: AsyncIterator) -> AsyncIterator:
+        """Pass StreamDelta records through, settling from the usage delta at the end."""
+        usage = None
+        received = False
+        try:
+            async for delta in stream:
+                received = True
+                if delta.usage:
+                    usage = delta.usage
+                yield delta
+        finally:
+            if received:
+                self.settle(usage)
+            else:
+                # Failed before its first delta
+                self.refund()
+
+    async def track_bytes(self, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pass OpenAI SSE bytes through, settling from the usage line at the end."""
+        sniffer = UsageSniffer()
+        received = False
+        try:
+            async for data in stream:
+                received = True
+                sniffer.feed(data)
+                yield data
+        finally:
+            if received:
+                self.settle(sniffer.usage)
+            else:
+                self.refund()
+
+
+class ClientRateLimiter:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clients: "OrderedDict[str, ClientBuckets]" = OrderedDict()
+        self._clock = clock
+
+    @property
+    def enabled(self) -> bool:
+        return config.client_rpm_limit > 0 or config.client_input_tpm_limit > 0 or config.client_output_tpm_limit > 0
+
+    def _buckets(self, key: str, now: float) -> ClientBuckets:
+        buckets = self._clients.get(key)
+        if buckets is None:
+            buckets = self._clients[key] = ClientBuckets(now)
+            if len(self._clients) > MAX_CLIENTS:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(key)
+        return buckets
+
+    def admit(self, client_key: Optional[str], request: Dict[str, Any]) -> Optional[Charge]:
+        """Charge one request for `client_key` or raise RateLimitExceeded; None when disabled."""
+        if not self.enabled:
+            return None
+        now = self._clock()
+        buckets = self._buckets(client_key or ANONYMOUS, now)
+        estimate = estimate_prompt_tokens(request) if buckets.input is not None else 0
+
+        waits = {}
+        if buckets.requests is not None:
+            buckets.requests.refill(now)
+            waits["requests"] = buckets.requests.wait_for(1)
+        if buckets.input is not None:
+            buckets.input.refill(now)
+            waits["input_tokens"] = buckets.input.wait_for(estimate)
+        if buckets.output is not None:
+            # Output is only known afterwards: refuse while the client is in debt
+            buckets.output.refill(now)
+            waits["output_tokens"] = buckets.output.wait_for(1) if buckets.output.tokens < 0 else 0.0
+
+        limit, wait = max(waits.items(), key=lambda item: item[1])
+        if wait > 0:
+            buckets.limited += 1
+            metrics.inc("client_rate_limited_total", limit=limit)
+            raise RateLimitExceeded(f"Rate limit exceeded for {limit} per minute; retry in {math.ceil(wait)}s", wait)
+
+        if buckets.requests is not None:
+            buckets.requests.tokens -= 1
+        if buckets.input is not None:
+            buckets.input.tokens -= estimate
+        return Charge(buckets, estimate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "clients": len(self._clients),
+            "limited_clients": sum(1 for buckets in self._clients.values() if buckets.limited),
+        }
+
+
+client_rate_limiter = ClientRateLimiter()
+metrics.register_collector("client_rate_limits", client_rate_limiter.stats)
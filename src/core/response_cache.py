@@ -0,0 +1,267 @@
+"""Response cache for deterministic /v1/messages requests.
+
+Opt-in with RESPONSE_CACHE_ENABLED; only requests with temperature 0 are cached.
+An entry is the upstream (OpenAI-format) response, keyed by the canonical hash of the
+converted request (model mapping applied, stream flags removed) and the profile. A
+streamed and a non-streamed request therefore share entries, and every hit is
+converted for the request that asked for it.
+
+The memory tier is an LRU bounded by RESPONSE_CACHE_MAX_BYTES of serialized
+responses, with entries expiring after RESPONSE_CACHE_TTL_SECONDS. With
+RESPONSE_CACHE_DIR set, entries are also written to disk (one JSON file each) and
+read back, and promoted, on a memory miss, so they survive restarts.
+
+Streamed hits are replayed as synthesized deltas through the normal stream
+translator; streamed misses are assembled into an entry as they pass through.
+Clients skip the cache with `Cache-Control: no-cache` / `no-store`,
+`X-Proxy-Cache: bypass`, or `"metadata": {"proxy_cache": "bypass"}`.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from src.core import json_backend
+from src.core.config import config
+from src.core.metrics import metrics
+from src.core.singleflight import request_key
+from src.core.stream_delta import StreamDelta, ToolCallFragment
+
+logger = logging.getLogger(__name__)
+
+# Not part of the key: a streamed and a non-streamed request share an entry
+STREAM_FIELDS = ("stream", "stream_options")
+BYPASS_DIRECTIVES = ("no-cache", "no-store")
+# Prune expired/excess files after this many disk writes
+PRUNE_EVERY = 64
+
+
+def wants_bypass(headers: Any, metadata: Optional[Dict[str, Any]]) -> bool:
+    """Whether the client asked to skip the cache (header or request metadata)."""
+    if (headers.get("x-proxy-cache") or "").lower() == "bypass":
+        return True
+    cache_control = (headers.get("cache-control") or "").lower()
+    if any(directive in cache_control for directive in BYPASS_DIRECTIVES):
+        return True
+    return bool(metadata) and str(metadata.get("proxy_cache", "")).lower() == "bypass"
+
+
+class ResponseCache:
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self._disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.response_cache_enabled
+
+    def key_for(self, profile: str, request: Dict[str, Any], headers: Any, metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Cache key for a converted request, or None if it must not be cached."""
+        if not self.enabled or request.get("temperature") != 0:
+            return None
+        if wants_bypass(headers, metadata):
+            metrics.inc("response_cache_requests_total", result="bypass")
+            return None
+        stripped = {name: value for name, value in request.items() if name not in STREAM_FIELDS}
+        return request_key(stripped, namespace=profile)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached response for `key` (with a fresh id), or None."""
+        now = self._clock()
+        entry = self._entries.get(key)
+        tier = "memory"
+        if entry is not None and entry[0] <= now:
+            self._evict(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+        elif config.response_cache_dir:
+            tier = "disk"
+            stored = await asyncio.to_thread(self._read_file, key, now)
+            if stored is not None:
+                expires_at, response = stored
+                entry = self._store(key, expires_at, response, len(json_backend.dumps_bytes(response)))
+
+        if entry is None:
+            self.misses += 1
+            metrics.inc("response_cache_requests_total", result="miss")
+            return None
+        self.hits += 1
+        metrics.inc("response_cache_requests_total", result=f"{tier}_hit")
+        return dict(entry[2], id=f"chatcmpl-cache-{uuid.uuid4().hex[:24]}")
+
+    async def put(self, key: str, response: Dict[str, Any]):
+        """Store a complete response (one with a finish_reason) in both tiers."""
+        choices = response.get("choices") or ()
+        if not choices or not choices[0].get("finish_reason"):
+            return
+        data = json_backend.dumps_bytes(response)
+        expires_at = self._clock() + config.response_cache_ttl_seconds
+        self._store(key, expires_at, response, len(data))
+        if config.response_cache_dir:
+            try:
+                await asyncio.to_thread(self._write_file, key, expires_at, data)
+            except OSError as e:
+                logger.warning(f"Response cache: could not write {key}: {e}")
+
+    def _store(self, key: str, expires_at: float, response: Dict[str, Any], size: int) -> Optional[Tuple[float, int, Dict[str, Any]]]:
+        if size > config.response_cache_max_bytes:
+            return (expires_at, size, response)
+        self._evict(key)
+        entry = self._entries[key] = (expires_at, size, response)
+        self._bytes += size
+        while self._bytes > config.response_cache_max_bytes:
+            self._evict(next(iter(self._entries)))
+        return entry
+
+    def _evict(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(config.response_cache_dir, f"{key}.json")
+
+    def _read_file(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                stored = json_backend.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Response cache: unreadable entry {path}: {e}")
+            return None
+        if stored.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return stored["expires_at"], stored["response"]
+
+    def _write_file(self, key: str, expires_at: float, data: bytes):
+        os.makedirs(config.response_cache_dir, exist_ok=True)
+        path = self._path(key)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(b'{"expires_at":' + str(expires_at).encode() + b',"response":' + data + b"}")
+        os.replace(temp, path)
+        self._disk_writes += 1
+        if self._disk_writes % PRUNE_EVERY == 0:
+            self._prune_files()
+
+    def _prune_files(self):
+        """Drop expired files, then the oldest ones beyond RESPONSE_CACHE_DISK_MAX_ENTRIES."""
+        # File modification times are wall-clock time
+        now = time.time()
+        files: List[Tuple[float, str]] = []
+        with os.scandir(config.response_cache_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    modified = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if modified + config.response_cache_ttl_seconds <= now:
+                    self._remove(entry.path)
+                else:
+                    files.append((modified, entry.path))
+        excess = len(files) - config.response_cache_disk_max_entries
+        if excess > 0:
+            for _, path in sorted(files)[:excess]:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def replay(self, response: Dict[str, Any]) -> AsyncIterator[StreamDelta]:
+        """A cached response as the StreamDelta records an upstream stream would produce."""
+        choice = response["choices"][0]
+        message = choice.get("message") or {}
+        reasoning = message.get("reasoning_content") or message.get("thinking")
+        if reasoning:
+            yield StreamDelta(True, reasoning=reasoning)
+        if message.get("content"):
+            yield StreamDelta(True, content=message["content"])
+        for index, tool_call in enumerate(message.get("tool_calls") or ()):
+            function = tool_call.get("function") or {}
+            fragment = ToolCallFragment(index, tool_call.get("id"), function.get("name"), function.get("arguments") or "{}")
+            yield StreamDelta(True, tool_calls=[fragment])
+        yield StreamDelta(True, finish_reason=choice.get("finish_reason"))
+        usage = response.get("usage") or {}
+        yield StreamDelta(usage={
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+        })
+
+    async def record(self, key: str, stream: AsyncIterator[StreamDelta]) -> AsyncIterator[StreamDelta]:
+        """Pass deltas through and store the assembled response if the stream completes."""
+        content: List[str] = []
+        reasoning: List[str] = []
+        tools: Dict[int, Dict[str, Any]] = {}
+        finish_reason = None
+        usage = None
+        async for delta in stream:
+            if delta.usage:
+                usage = delta.usage
+            if delta.content:
+                content.append(delta.content)
+            if delta.reasoning:
+                reasoning.append(delta.reasoning)
+            for fragment in delta.tool_calls or ():
+                tool = tools.setdefault(fragment.index, {"id": None, "name": None, "arguments": []})
+                tool["id"] = fragment.id or tool["id"]
+                tool["name"] = fragment.name or tool["name"]
+                if fragment.arguments:
+                    tool["arguments"].append(fragment.arguments)
+            if delta.finish_reason:
+                finish_reason = delta.finish_reason
+            yield delta
+
+        if finish_reason is None:
+            return
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(content) if content or not tools else None}
+        if reasoning:
+            message["reasoning_content"] = "".join(reasoning)
+        if tools:
+            message["tool_calls"] = [
+                {"id": tool["id"], "type": "function", "function": {"name": tool["name"], "arguments": "".join(tool["arguments"])}}
+                for _, tool in sorted(tools.items())
+            ]
+        response: Dict[str, Any] = {"choices": [{"index": 0, "message": message, "finish_reason": finish_reason}]}
+        if usage:
+            response["usage"] = {
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]},
+            }
+        await self.put(key, response)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk": bool(config.response_cache_dir),
+        }
+
+
+response_cache = ResponseCache()
+metrics.register_collector("response_cache", response_cache.stats)
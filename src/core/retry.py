@@ -0,0 +1,139 @@
+"""Retry policy for upstream requests.
+
+Waits follow the server's hint when there is one (`retry-after-ms`, `Retry-After`,
+`x-ratelimit-reset-requests/-tokens`) and decorrelated-jitter backoff otherwise.
+Each request gets MAX_RETRIES attempts and RETRY_BUDGET_SECONDS of total waiting;
+a hint that would overrun the budget fails fast instead of sleeping. Retries that
+switch to another endpoint (see src/core/upstreams.py) do not wait.
+"""
+
+import email.utils
+import random
+import re
+import time
+from typing import Any, Callable, Mapping, Optional
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from src.core.config import config
+from src.core.metrics import metrics
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse "20ms", "1.5s", "6m0s" or a bare number of seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+def retry_after_from_headers(headers: Mapping[str, str], clock: Callable[[], float] = time.time) -> Optional[float]:
+    """Seconds the upstream asked us to wait, if it said so (`clock` dates Retry-After times)."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        seconds = parse_duration(value)
+        if seconds is not None:
+            return seconds
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - clock())
+        except (TypeError, ValueError):
+            pass
+
+    # OpenAI-style rate limit headers: prefer the limit that is actually exhausted
+    resets = []
+    exhausted = []
+    for kind in ("requests", "tokens"):
+        value = headers.get(f"x-ratelimit-reset-{kind}")
+        seconds = parse_duration(value) if value else None
+        if seconds is None:
+            continue
+        resets.append(seconds)
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            exhausted.append(seconds)
+    if exhausted or resets:
+        return max(exhausted or resets)
+    return None
+
+
+def _retry_reason(error: BaseException) -> Optional[str]:
+    """Metric label for a retryable error, or None if the error must not be retried."""
+    if isinstance(error, APIStatusError):
+        should_retry = error.response.headers.get("x-should-retry")
+        if should_retry == "false":
+            return None
+        if should_retry == "true" or error.status_code in RETRYABLE_STATUS:
+            return str(error.status_code)
+        return None
+    if isinstance(error, APITimeoutError):
+        return "timeout"
+    if isinstance(error, APIConnectionError):
+        return "connection"
+    return None
+
+
+class RetryState:
+    """Retry bookkeeping for one upstream request; `rng` (the random module by default)
+    draws the jitter."""
+
+    __slots__ = ("route", "attempts", "delay", "waited", "rng")
+
+    def __init__(self, route: str, rng: Any = random):
+        self.route = route
+        self.rng = rng
+        self.attempts = 0
+        self.delay = config.retry_base_delay
+        self.waited = 0.0
+
+    def next_delay(self, error: BaseException, other_endpoint: bool = False) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None to give up.
+
+        A retry that goes to another endpoint (`other_endpoint`) is sent immediately.
+        """
+        reason = _retry_reason(error)
+        if reason is None:
+            return None
+        if self.attempts >= config.max_retries:
+            metrics.inc("upstream_retries_exhausted_total", route=self.route)
+            return None
+        if other_endpoint:
+            self.attempts += 1
+            metrics.inc("upstream_retries_total", route=self.route, reason=reason)
+            return 0.0
+
+        hint = None
+        if isinstance(error, APIStatusError):
+            hint = retry_after_from_headers(error.response.headers)
+        if hint is not None:
+            # Small jitter so clients told the same Retry-After don't return in lockstep
+            delay = hint + self.rng.uniform(0, min(1.0, hint * 0.1))
+        else:
+            # Decorrelated jitter: sleep = min(cap, uniform(base, previous * 3))
+            self.delay = min(config.retry_max_delay, self.rng.uniform(config.retry_base_delay, self.delay * 3))
+            delay = self.delay
+
+        if self.waited + delay > config.retry_budget_seconds:
+            metrics.inc("upstream_retries_exhausted_total", route=self.route)
+            return None
+
+        self.attempts += 1
+        self.waited += delay
+        metrics.inc("upstream_retries_total", route=self.route, reason=reason)
+        metrics.observe("upstream_retry_delay_seconds", delay)
+        return delay
@@ -0,0 +1,119 @@
+"""Coalescing of identical in-flight non-streaming requests ("singleflight").
+
+Clients often send byte-identical requests at nearly the same moment (title
+generation, small classification calls). While one such request is in flight,
+duplicates with the same canonical hash wait for its result instead of making
+their own upstream call. The shared call is only cancelled when every waiter
+has gone away.
+
+Hashing a multi-megabyte transcript costs about as much as converting it, and
+almost no request has a twin in flight. Calls are therefore grouped by a cheap
+request_shape(); the canonical hash is only computed, for the new request and
+the in-flight ones, when a call of the same shape is in flight.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.core import json_backend
+from src.core.metrics import metrics
+
+
+def request_key(request: Dict[str, Any], namespace: str = "") -> str:
+    """Canonical hash of an upstream request: key order and whitespace do not matter.
+
+    The whole transcript is serialized with json_backend (orjson sorts keys in
+    native code) rather than json.dumps. The bytes are not always json.dumps's:
+    floats with exponents (1e-07 vs 1e-7) and NaN are formatted differently, so keys
+    can differ between JSON backends, including for response cache files on disk.
+    """
+    tools = request.get("tools")
+    digest = getattr(tools, "digest", None)
+    if digest is not None:
+        # Converted tool sets carry a content digest (src/conversion/tool_cache.py)
+        request = dict(request, tools=digest)
+    try:
+        canonical = json_backend.dumps_sorted_bytes(request)
+    except (TypeError, ValueError):
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    key = hashlib.sha256(namespace.encode("utf-8") + b"\n")
+    key.update(canonical)
+    return key.hexdigest()
+
+
+def request_shape(request: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Summary of a request in O(1): requests with different shapes are never identical."""
+    messages = request.get("messages") or ()
+    last = messages[-1] if messages else None
+    content = last.get("content") if isinstance(last, dict) else None
+    return (
+        request.get("model"),
+        len(messages),
+        len(content) if isinstance(content, (str, list)) else None,
+        request.get("max_tokens"),
+    )
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "request", "key")
+
+    def __init__(self, task: asyncio.Task, request: Dict[str, Any], key: Optional[str]):
+        self.task = task
+        self.waiters = 0
+        self.request = request
+        self.key = key
+
+    def request_key(self) -> str:
+        if self.key is None:
+            self.key = request_key(self.request)
+        return self.key
+
+
+class SingleFlight:
+    """In-flight calls of one client, grouped by request_shape() and matched by request_key()."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Tuple[Any, ...], List[_Call]] = {}
+
+    async def do(self, request: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await call(), or the identical call already in flight for `request`.
+
+        `request` must not be modified while the call is in flight.
+        """
+        shape = request_shape(request)
+        calls = self._calls.get(shape)
+        shared = key = None
+        if calls:
+            key = request_key(request)
+            shared = next((candidate for candidate in calls if candidate.request_key() == key), None)
+        if shared is None:
+            shared = _Call(asyncio.create_task(call()), request, key)
+            self._calls.setdefault(shape, []).append(shared)
+            shared.task.add_done_callback(lambda _: self._forget(shape, shared))
+            metrics.inc("singleflight_requests_total", pool=self.name, result="leader")
+        else:
+            metrics.inc("singleflight_requests_total", pool=self.name, result="coalesced")
+
+        shared.waiters += 1
+        try:
+            # shield: cancelling one waiter must not cancel the call the others share
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                shared.task.cancel()
+                self._forget(shape, shared)
+
+    def _forget(self, shape: Tuple[Any, ...], shared: _Call):
+        calls = self._calls.get(shape)
+        if calls is not None and shared in calls:
+            calls.remove(shared)
+            if not calls:
+                del self._calls[shape]
+
+    @property
+    def in_flight(self) -> int:
+        return sum(len(calls) for calls in self._calls.values())
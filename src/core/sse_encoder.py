@@ -0,0 +1,161 @@
+"""Server-sent event frame encoder for Claude and OpenAI streams.
+
+Constant frames are rendered once at import time. Hot frames (text, thinking and
+input_json deltas) are built from per-index byte templates, so only the variable
+payload goes through the JSON backend on each event.
+"""
+
+from typing import Any, Dict, List
+
+from src.core.constants import Constants
+from src.core.json_backend import dumps_bytes
+
+
+def event(event_type: str, payload: Dict[str, Any]) -> bytes:
+    """Encode an arbitrary Claude SSE event."""
+    return b"event: " + event_type.encode() + b"\ndata: " + dumps_bytes(payload) + b"\n\n"
+
+
+PING = event(Constants.EVENT_PING, {"type": Constants.EVENT_PING})
+MESSAGE_STOP = event(Constants.EVENT_MESSAGE_STOP, {"type": Constants.EVENT_MESSAGE_STOP})
+OPENAI_DONE = b"data: [DONE]\n\n"
+
+_INDEX_CACHE_SIZE = 64
+
+
+def _build_indexed(render) -> List[Any]:
+    return [render(index) for index in range(_INDEX_CACHE_SIZE)]
+
+
+def _render_block_stop(index: int) -> bytes:
+    return event(
+        Constants.EVENT_CONTENT_BLOCK_STOP,
+        {"type": Constants.EVENT_CONTENT_BLOCK_STOP, "index": index},
+    )
+
+
+def _delta_prefix(index: int, delta_type: str, field: str) -> bytes:
+    return (
+        b"event: " + Constants.EVENT_CONTENT_BLOCK_DELTA.encode()
+        + b'\ndata: {"type":"' + Constants.EVENT_CONTENT_BLOCK_DELTA.encode()
+        + b'","index":' + str(index).encode()
+        + b',"delta":{"type":"' + delta_type.encode() + b'","' + field.encode() + b'":'
+    )
+
+
+_DELTA_SUFFIX = b"}}\n\n"
+_BLOCK_STOP = _build_indexed(_render_block_stop)
+_TEXT_PREFIX = _build_indexed(lambda i: _delta_prefix(i, Constants.DELTA_TEXT, "text"))
+_THINKING_PREFIX = _build_indexed(lambda i: _delta_prefix(i, Constants.DELTA_THINKING, "thinking"))
+_JSON_PREFIX = _build_indexed(lambda i: _delta_prefix(i, Constants.DELTA_INPUT_JSON, "partial_json"))
+_TEXT_BLOCK_START = _build_indexed(
+    lambda i: event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": i,
+            "content_block": {"type": Constants.CONTENT_TEXT, "text": ""},
+        },
+    )
+)
+
+
+def content_block_stop(index: int) -> bytes:
+    if index < _INDEX_CACHE_SIZE:
+        return _BLOCK_STOP[index]
+    return _render_block_stop(index)
+
+
+def text_block_start(index: int) -> bytes:
+    if index < _INDEX_CACHE_SIZE:
+        return _TEXT_BLOCK_START[index]
+    return event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": index,
+            "content_block": {"type": Constants.CONTENT_TEXT, "text": ""},
+        },
+    )
+
+
+def tool_block_start(index: int, tool_id: str, name: str) -> bytes:
+    return event(
+        Constants.EVENT_CONTENT_BLOCK_START,
+        {
+            "type": Constants.EVENT_CONTENT_BLOCK_START,
+            "index": index,
+            "content_block": {
+                "type": Constants.CONTENT_TOOL_USE,
+                "id": tool_id,
+                "name": name,
+                "input": {},
+            },
+        },
+    )
+
+
+def _delta(prefixes: List[bytes], delta_type: str, field: str, index: int, value: str) -> bytes:
+    prefix = prefixes[index] if index < _INDEX_CACHE_SIZE else _delta_prefix(index, delta_type, field)
+    return prefix + dumps_bytes(value) + _DELTA_SUFFIX
+
+
+def text_delta(index: int, text: str) -> bytes:
+    return _delta(_TEXT_PREFIX, Constants.DELTA_TEXT, "text", index, text)
+
+
+def thinking_delta(index: int, thinking: str) -> bytes:
+    return _delta(_THINKING_PREFIX, Constants.DELTA_THINKING, "thinking", index, thinking)
+
+
+def input_json_delta(index: int, partial_json: str) -> bytes:
+    return _delta(_JSON_PREFIX, Constants.DELTA_INPUT_JSON, "partial_json", index, partial_json)
+
+
+def message_start(message_id: str, model: str) -> bytes:
+    return event(
+        Constants.EVENT_MESSAGE_START,
+        {
+            "type": Constants.EVENT_MESSAGE_START,
+            "message": {
+                "id": message_id,
+                "type": "message",
+                "role": Constants.ROLE_ASSISTANT,
+                "model": model,
+                "content": [],
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": {"input_tokens": 0, "output_tokens": 0},
+            },
+        },
+    )
+
+
+def message_delta(stop_reason: str, usage: Dict[str, int]) -> bytes:
+    return event(
+        Constants.EVENT_MESSAGE_DELTA,
+        {
+            "type": Constants.EVENT_MESSAGE_DELTA,
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": usage,
+        },
+    )
+
+
+def error(error_type: str, message: str) -> bytes:
+    return event("error", {"type": "error", "error": {"type": error_type, "message": message}})
+
+
+def error_type_for_status(status_code: int) -> str:
+    """Anthropic error type for an upstream HTTP status, for errors raised mid-stream."""
+    return {429: "rate_limit_error", 503: "overloaded_error", 529: "overloaded_error"}.get(status_code, "api_error")
+
+
+def openai_chunk(chunk: Dict[str, Any]) -> bytes:
+    """Encode one OpenAI chat.completion.chunk as a `data:` frame."""
+    return b"data: " + dumps_bytes(chunk) + b"\n\n"
+
+
+def openai_error(error_type: str, message: str) -> bytes:
+    """Encode an in-stream error the way OpenAI-compatible APIs report one."""
+    return b"data: " + dumps_bytes({"error": {"type": error_type, "message": message}}) + b"\n\n"
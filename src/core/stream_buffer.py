@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+from src.core.metrics import metrics
+from src.core.stream_delta import StreamDelta
+
+logger = logging.getLogger(__name__)
+
+POLICY_BLOCK = "block"
+POLICY_COALESCE = "coalesce"
+POLICY_ABORT = "abort"
+POLICIES = (POLICY_BLOCK, POLICY_COALESCE, POLICY_ABORT)
+
+# Rough size of the SSE envelope a single delta turns into on the wire
+DELTA_OVERHEAD = 96
+# Coalescing may grow the buffer up to this multiple of the budget before blocking
+COALESCE_HEADROOM = 2
+
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_live: Dict[int, "StreamBuffer"] = {}
+
+
+class StreamOverflowError(Exception):
+    """Raised to the writer when an abort-policy buffer exceeds its byte budget."""
+
+
+def item_size(item: Any) -> int:
+    if isinstance(item, (bytes, bytearray)):
+        return len(item)
+    if isinstance(item, StreamDelta):
+        size = DELTA_OVERHEAD
+        if item.content:
+            size += len(item.content)
+        if item.reasoning:
+            size += len(item.reasoning)
+        for tc in item.tool_calls or ():
+            size += DELTA_OVERHEAD + len(tc.arguments or "")
+        return size
+    return DELTA_OVERHEAD
+
+
+def _merge(tail: Any, item: Any) -> Optional[Any]:
+    """Merge `item` into the buffered `tail` if that cannot change what the client sees."""
+    if isinstance(tail, bytes) and isinstance(item, bytes):
+        return tail + item
+    if not (isinstance(tail, StreamDelta) and isinstance(item, StreamDelta)):
+        return None
+    for delta in (tail, item):
+        if not delta.has_choice or delta.tool_calls or delta.finish_reason or delta.usage:
+            return None
+    # Only join runs of the same kind so text never moves ahead of thinking
+    if tail.content and item.content and not tail.reasoning and not item.reasoning:
+        tail.content += item.content
+        return tail
+    if tail.reasoning and item.reasoning and not tail.content and not item.content:
+        tail.reasoning += item.reasoning
+        return tail
+    return None
+
+
+class StreamBuffer:
+    """Bounded hand-off between an upstream reader task and the response writer.
+
+    The reader put()s items and finally close()s the buffer, optionally with an
+    error. close() never blocks, so a cancelled reader can always wake the writer.
+
+    Buffered items are accounted in bytes (see item_size). Once max_bytes is
+    reached the policy decides: "block" parks the reader until the writer drains,
+    "coalesce" merges deltas into the last buffered item (up to COALESCE_HEADROOM
+    times the budget, then blocks), and "abort" fails the stream with
+    StreamOverflowError. A single item is always admitted into an empty buffer.
+    """
+
+    def __init__(self, max_bytes: int = 262144, policy: str = POLICY_BLOCK, request_id: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.policy = policy if policy in POLICIES else POLICY_BLOCK
+        self.request_id = request_id
+        self.buffered_bytes = 0
+        self.high_water = 0
+        self.overflows = 0
+        self._items: deque = deque()
+        self._sizes: deque = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        _live[id(self)] = self
+
+    def _over(self, limit: int) -> bool:
+        return bool(self._items) and self.buffered_bytes >= limit
+
+    async def put(self, item: Any):
+        size = item_size(item)
+        if self._over(self.max_bytes):
+            self.overflows += 1
+            if self.policy == POLICY_ABORT:
+                self._items.clear()
+                self._sizes.clear()
+                self.buffered_bytes = 0
+                self.close(StreamOverflowError(
+                    f"Client is not reading the stream fast enough (over {self.max_bytes} buffered bytes)"
+                ))
+                return
+            if self.policy == POLICY_COALESCE and not self._over(self.max_bytes * COALESCE_HEADROOM):
+                merged = _merge(self._items[-1], item)
+                if merged is not None:
+                    self._items[-1] = merged
+                    grown = size - DELTA_OVERHEAD if isinstance(item, StreamDelta) else size
+                    self._sizes[-1] += grown
+                    self._grow(grown)
+                    return
+            limit = self.max_bytes * COALESCE_HEADROOM if self.policy == POLICY_COALESCE else self.max_bytes
+            while self._over(limit) and not self._closed:
+                self._writable.clear()
+                await self._writable.wait()
+        if self._closed:
+            return
+        self._items.append(item)
+        self._sizes.append(size)
+        self._grow(size)
+        self._readable.set()
+
+    def _grow(self, size: int):
+        self.buffered_bytes += size
+        if self.buffered_bytes > self.high_water:
+            self.high_water = self.buffered_bytes
+
+    def close(self, error: Optional[BaseException] = None):
+        if self._closed:
+            return
+        self._closed = True
+        self._error = error
+        self._readable.set()
+        self._writable.set()
+
+    @property
+    def failed(self) -> bool:
+        """Closed with an error before anything was buffered."""
+        return self._closed and self._error is not None and not self._items
+
+    async def wait_ready(self):
+        """Wait until an item is buffered or the buffer is closed, without consuming anything."""
+        while not self._items and not self._closed:
+            self._readable.clear()
+            await self._readable.wait()
+
+    async def get(self) -> Any:
+        """Return the next item; raise the close() error, or StopAsyncIteration once drained."""
+        while not self._items:
+            if self._closed:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            self._readable.clear()
+            await self._readable.wait()
+        item = self._items.popleft()
+        self.buffered_bytes -= self._sizes.popleft()
+        self._writable.set()
+        return item
+
+    def record(self):
+        """Publish this stream's high-water mark and stop reporting it as live."""
+        if _live.pop(id(self), None) is None:
+            return
+        metrics.observe("stream_buffer_high_water_bytes", self.high_water, buckets=SIZE_BUCKETS)
+        if self.overflows:
+            metrics.inc("stream_buffer_overflows_total", policy=self.policy)
+            logger.info(
+                f"Stream {self.request_id} hit its {self.max_bytes}-byte buffer {self.overflows} times "
+                f"(policy={self.policy}, high water {self.high_water} bytes); the client is the bottleneck"
+            )
+
+
+def _buffer_stats():
+    return {
+        "active": len(_live),
+        "streams": {
+            buffer.request_id or str(key): {
+                "buffered_bytes": buffer.buffered_bytes,
+                "high_water_bytes": buffer.high_water,
+                "overflows": buffer.overflows,
+            }
+            for key, buffer in list(_live.items())
+        },
+    }
+
+
+metrics.register_collector("stream_buffers", _buffer_stats)
@@ -0,0 +1,130 @@
+from typing import Any, Dict, List, Optional
+
+from openai.types.chat import ChatCompletionChunk
+
+
+class ToolCallFragment:
+    """One streamed piece of a tool call (OpenAI `delta.tool_calls[i]`)."""
+
+    __slots__ = ("index", "id", "name", "arguments")
+
+    def __init__(
+        self,
+        index: int = 0,
+        id: Optional[str] = None,
+        name: Optional[str] = None,
+        arguments: Optional[str] = None,
+    ):
+        self.index = index
+        self.id = id
+        self.name = name
+        self.arguments = arguments
+
+
+class StreamDelta:
+    """Lightweight record of everything the Claude converter needs from one upstream chunk.
+
+    Built straight from the SDK chunk object, so the /v1/messages streaming path never
+    serializes a chunk to JSON and parses it back.
+    """
+
+    __slots__ = ("has_choice", "content", "reasoning", "tool_calls", "finish_reason", "usage")
+
+    def __init__(
+        self,
+        has_choice: bool = False,
+        content: Optional[str] = None,
+        reasoning: Optional[str] = None,
+        tool_calls: Optional[List[ToolCallFragment]] = None,
+        finish_reason: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ):
+        self.has_choice = has_choice
+        self.content = content
+        self.reasoning = reasoning
+        self.tool_calls = tool_calls
+        self.finish_reason = finish_reason
+        self.usage = usage
+
+
+def delta_from_chunk(chunk: ChatCompletionChunk) -> StreamDelta:
+    """Build a StreamDelta from an OpenAI SDK chunk using attribute access only."""
+    usage = None
+    if chunk.usage is not None:
+        details = chunk.usage.prompt_tokens_details
+        usage = {
+            "prompt_tokens": chunk.usage.prompt_tokens or 0,
+            "completion_tokens": chunk.usage.completion_tokens or 0,
+            "cached_tokens": (details.cached_tokens or 0) if details else 0,
+        }
+
+    if not chunk.choices:
+        return StreamDelta(usage=usage)
+
+    choice = chunk.choices[0]
+    delta = choice.delta
+
+    # reasoning_content / thinking are provider extensions (GLM-4.7, MiniMax), kept as extras
+    reasoning = None
+    extra = delta.model_extra
+    if extra:
+        reasoning = extra.get("reasoning_content") or extra.get("thinking")
+
+    tool_calls = None
+    if delta.tool_calls:
+        tool_calls = []
+        for tc in delta.tool_calls:
+            function = tc.function
+            tool_calls.append(
+                ToolCallFragment(
+                    tc.index or 0,
+                    tc.id,
+                    function.name if function else None,
+                    function.arguments if function else None,
+                )
+            )
+
+    return StreamDelta(True, delta.content, reasoning, tool_calls, choice.finish_reason, usage)
+
+
+def delta_from_dict(chunk: Dict[str, Any]) -> StreamDelta:
+    """Build a StreamDelta from an already-decoded chunk dict (recorded streams, replays)."""
+    usage = None
+    raw_usage = chunk.get("usage")
+    if raw_usage:
+        details = raw_usage.get("prompt_tokens_details") or {}
+        usage = {
+            "prompt_tokens": raw_usage.get("prompt_tokens") or 0,
+            "completion_tokens": raw_usage.get("completion_tokens") or 0,
+            "cached_tokens": details.get("cached_tokens") or 0,
+        }
+
+    choices = chunk.get("choices")
+    if not choices:
+        return StreamDelta(usage=usage)
+
+    choice = choices[0]
+    delta = choice.get("delta") or {}
+
+    tool_calls = None
+    if delta.get("tool_calls"):
+        tool_calls = []
+        for tc in delta["tool_calls"]:
+            function = tc.get("function") or {}
+            tool_calls.append(
+                ToolCallFragment(
+                    tc.get("index", 0),
+                    tc.get("id"),
+                    function.get("name"),
+                    function.get("arguments"),
+                )
+            )
+
+    return StreamDelta(
+        True,
+        delta.get("content"),
+        delta.get("reasoning_content") or delta.get("thinking"),
+        tool_calls,
+        choice.get("finish_reason"),
+        usage,
+    )
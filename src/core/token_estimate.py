@@ -0,0 +1,52 @@
+"""Character-based token estimates of OpenAI-format requests.
+
+Used where a request has to be sized before any upstream call: per-client input
+budgets (rate_limit.py) and context fitting (context_fit.py). Only text is counted:
+message content, tool-call arguments and the serialized tool definitions. Characters
+are converted to tokens with the average of the model's tokenizer family from the
+model registry (4 characters per token for unknown models); running a real BPE
+tokenizer over a multi-megabyte transcript on every request would cost more than
+converting it.
+"""
+
+from typing import Any, Dict
+
+from src.core import json_backend
+from src.core.model_registry import model_registry
+
+
+def message_chars(message: Dict[str, Any]) -> int:
+    """Characters of text in one OpenAI message."""
+    chars = 0
+    content = message.get("content")
+    if isinstance(content, str):
+        chars += len(content)
+    elif isinstance(content, list):
+        for part in content:
+            text = part.get("text") if isinstance(part, dict) else None
+            if isinstance(text, str):
+                chars += len(text)
+    for tool_call in message.get("tool_calls") or ():
+        chars += len((tool_call.get("function") or {}).get("arguments") or "")
+    return chars
+
+
+def tools_chars(tools: Any) -> int:
+    """Characters of the serialized tool definitions."""
+    if not tools:
+        return 0
+    # Converted tool sets carry their serialized JSON (src/conversion/tool_cache.py)
+    data = getattr(tools, "data", None)
+    return len(data if data is not None else json_backend.dumps_bytes(tools))
+
+
+def chars_per_token(model: str) -> float:
+    """Average characters per token of the model's tokenizer."""
+    return model_registry.chars_per_token(model or "")
+
+
+def estimate_prompt_tokens(request: Dict[str, Any]) -> int:
+    """Rough input token count of an OpenAI-format request."""
+    chars = sum(message_chars(message) for message in request.get("messages") or ())
+    chars += tools_chars(request.get("tools"))
+    return max(1, int(chars / chars_per_token(request.get("model"))))
@@ -0,0 +1,337 @@
+"""Load balancing and circuit breaking across equivalent upstream endpoints.
+
+OPENAI_BASE_URL may list several endpoints that serve the same models, separated by
+commas (e.g. several Azure deployments, or a router and the provider behind it).
+OPENAI_API_KEY is either shared or given per endpoint in the same order.
+
+Each attempt picks an endpoint at random, weighted by its EWMA latency and error
+rate; retries and hedges prefer endpoints the request has not used yet. After
+BREAKER_FAILURE_THRESHOLD consecutive failures (connection errors, timeouts, 5xx)
+an endpoint's breaker opens and it gets no traffic. A background probe checks open
+endpoints every UPSTREAM_PROBE_INTERVAL seconds once BREAKER_COOLDOWN_SECONDS have
+passed; a reachable endpoint goes half-open, and the single live request it is then
+given either closes the breaker or opens it again.
+
+Requests carrying a prefix fingerprint (see convert_claude_to_openai) are routed by
+consistent hashing instead, so every turn of a conversation reaches the endpoint that
+holds its prompt cache. When that endpoint is open, already tried, or at its
+concurrency limit, the request moves to the next endpoint on the ring; only the
+sessions of an endpoint that drops out move.
+
+Each endpoint also has its own adaptive concurrency limit (src/core/limiter.py).
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import random
+import time
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+from openai import APIConnectionError, APIStatusError
+
+from src.core.config import config
+from src.core.limiter import ConcurrencyLimiter
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+OVERLOAD_STATUS = frozenset({429, 503, 529})
+
+# Request key holding the prefix fingerprint; popped before the request is sent
+AFFINITY_KEY = "_prefix_fingerprint"
+# Points per endpoint on the hash ring (evens out the share of sessions each gets)
+RING_POINTS = 64
+
+LATENCY_ALPHA = 0.2
+ERROR_ALPHA = 0.1
+MIN_WEIGHT = 1e-6
+
+_sets: Dict[str, "UpstreamSet"] = {}
+
+
+def _failure_kind(error: BaseException) -> Optional[str]:
+    """"breaker" for errors that mean the endpoint is unhealthy, "soft" for 429, else None."""
+    if isinstance(error, APIStatusError):
+        if error.status_code >= 500:
+            return "breaker"
+        if error.status_code == 429:
+            return "soft"
+        return None
+    if isinstance(error, APIConnectionError):
+        return "breaker"
+    return None
+
+
+class Upstream:
+    """One endpoint: its SDK client, health averages and breaker state."""
+
+    def __init__(self, name: str, base_url: str, client: Any):
+        self.name = name
+        self.base_url = base_url
+        self.client = client
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.limiter = ConcurrencyLimiter(name) if config.limiter_enabled else None
+
+    def available(self) -> bool:
+        return self.state == CLOSED or (self.state == HALF_OPEN and not self.trial_in_flight)
+
+    def saturated(self) -> bool:
+        """Whether a new request would have to queue for a concurrency slot."""
+        return self.limiter is not None and self.limiter.in_flight >= int(self.limiter.limit)
+
+    def weight(self, default_latency: float) -> float:
+        latency = self.latency if self.latency is not None else default_latency
+        return max(MIN_WEIGHT, (1.0 - self.error_rate) ** 2 / max(latency, 0.001))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "concurrency": self.limiter.stats() if self.limiter is not None else None,
+            "state": self.state,
+            "latency_ewma_seconds": round(self.latency, 4) if self.latency is not None else None,
+            "error_rate_ewma": round(self.error_rate, 4),
+            "consecutive_failures": self.failures,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "prompt_cache_hit_rate": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None,
+        }
+
+
+class Attempt:
+    """One request to one upstream, used as `async with`: waits for a concurrency
+    slot on entry, records the outcome and frees the slot on exit.
+
+    Streams call first_byte() so the latency sample is time-to-first-chunk rather
+    than the length of the generation.
+    """
+
+    __slots__ = ("upstreams", "upstream", "started", "latency", "token")
+
+    def __init__(self, upstreams: "UpstreamSet", upstream: Upstream):
+        self.upstreams = upstreams
+        self.upstream = upstream
+        self.started = upstreams.clock()
+        self.latency: Optional[float] = None
+        self.token = None
+
+    def first_byte(self):
+        if self.latency is None:
+            self.latency = self.upstreams.clock() - self.started
+
+    def usage(self, prompt_tokens: int, cached_tokens: int):
+        """Record the prompt tokens this attempt was billed and how many came from the provider's cache."""
+        self.upstream.prompt_tokens += prompt_tokens
+        self.upstream.cached_tokens += cached_tokens
+        metrics.inc("upstream_prompt_tokens_total", prompt_tokens, upstream=self.upstream.name)
+        metrics.inc("upstream_cached_tokens_total", cached_tokens, upstream=self.upstream.name)
+
+    async def __aenter__(self) -> "Attempt":
+        limiter = self.upstream.limiter
+        if limiter is not None:
+            try:
+                self.token = await limiter.acquire()
+            except BaseException:
+                self.upstream.trial_in_flight = False
+                raise
+        # Latency is measured from when the request can actually go out
+        self.started = self.upstreams.clock()
+        self.upstream.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.upstream.in_flight -= 1
+        if exc is None:
+            self.upstreams.success(self.upstream, self.latency if self.latency is not None else self.upstreams.clock() - self.started)
+        elif isinstance(exc, Exception):
+            self.upstreams.failure(self.upstream, exc)
+        else:
+            # Cancelled: says nothing about the endpoint, but frees a half-open trial slot
+            self.upstream.trial_in_flight = False
+        if self.token is None:
+            return False
+        if exc is None:
+            if self.latency is not None:
+                self.upstream.limiter.release(self.token, latency=self.latency)
+            else:
+                self.upstream.limiter.release(self.token, latency=self.upstreams.clock() - self.started, kind="response")
+        elif isinstance(exc, APIStatusError) and exc.status_code in OVERLOAD_STATUS:
+            self.upstream.limiter.release(self.token, overloaded=True)
+        else:
+            # Cancellations and other errors say nothing about how loaded the endpoint is
+            self.upstream.limiter.cancel(self.token)
+        return False
+
+
+class UpstreamSet:
+    """The endpoints behind one OpenAIClient.
+
+    `clock` and `rng` (time.monotonic and the random module by default) are
+    injectable, so breaker timing and weighted choices can be replayed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        upstreams: List[Upstream],
+        clock: Callable[[], float] = time.monotonic,
+        rng: Any = random,
+    ):
+        self.name = name
+        self.upstreams = upstreams
+        self.clock = clock
+        self._rng = rng
+        self._prober: Optional[asyncio.Task] = None
+        ring = sorted((_ring_hash(f"{upstream.name}#{point}"), index) for index, upstream in enumerate(upstreams) for point in range(RING_POINTS))
+        self._ring_hashes = [point for point, _ in ring]
+        self._ring_upstreams = [upstreams[index] for _, index in ring]
+        _sets[name] = self
+
+    @property
+    def primary(self) -> Upstream:
+        return self.upstreams[0]
+
+    def attempt(self, tried: Collection[Upstream] = (), affinity: Optional[str] = None) -> Attempt:
+        return Attempt(self, self.pick(tried, affinity))
+
+    def has_untried(self, tried: Collection[Upstream]) -> bool:
+        return any(u.available() and u not in tried for u in self.upstreams)
+
+    def pick(self, tried: Collection[Upstream] = (), affinity: Optional[str] = None) -> Upstream:
+        """The endpoint for `affinity` on the hash ring if usable, else a weighted random
+        choice among available endpoints, preferring ones not yet tried."""
+        if len(self.upstreams) == 1:
+            upstream = self.upstreams[0]
+        elif affinity is not None and (upstream := self._ring_pick(affinity, tried)) is not None:
+            pass
+        else:
+            candidates = [u for u in self.upstreams if u.available() and u not in tried]
+            if not candidates:
+                candidates = [u for u in self.upstreams if u.available()]
+            if not candidates:
+                # Every breaker is open: fail open to the endpoint that has rested longest
+                upstream = min(self.upstreams, key=lambda u: u.opened_at)
+            elif len(candidates) == 1:
+                upstream = candidates[0]
+            else:
+                known = [u.latency for u in candidates if u.latency is not None]
+                default_latency = sum(known) / len(known) if known else 1.0
+                upstream = self._rng.choices(candidates, [u.weight(default_latency) for u in candidates])[0]
+        if upstream.state == HALF_OPEN:
+            upstream.trial_in_flight = True
+        upstream.requests += 1
+        return upstream
+
+    def _ring_pick(self, affinity: str, tried: Collection[Upstream]) -> Optional[Upstream]:
+        """First usable endpoint clockwise from the fingerprint's point on the ring."""
+        start = bisect.bisect(self._ring_hashes, _ring_hash(affinity))
+        seen = []
+        count = len(self._ring_upstreams)
+        for offset in range(count):
+            upstream = self._ring_upstreams[(start + offset) % count]
+            if upstream in seen:
+                continue
+            seen.append(upstream)
+            if upstream.available() and upstream not in tried and not upstream.saturated():
+                metrics.inc("upstream_affinity_picks_total", result="home" if len(seen) == 1 else "moved")
+                return upstream
+            if len(seen) == len(self.upstreams):
+                break
+        return None
+
+    def success(self, upstream: Upstream, latency: float):
+        upstream.latency = latency if upstream.latency is None else upstream.latency + LATENCY_ALPHA * (latency - upstream.latency)
+        upstream.error_rate -= ERROR_ALPHA * upstream.error_rate
+        upstream.failures = 0
+        if upstream.state == HALF_OPEN:
+            upstream.trial_in_flight = False
+            self._transition(upstream, CLOSED)
+
+    def failure(self, upstream: Upstream, error: BaseException):
+        kind = _failure_kind(error)
+        if kind is None:
+            # The endpoint answered (e.g. a 400), so it is reachable
+            upstream.failures = 0
+            if upstream.state == HALF_OPEN:
+                upstream.trial_in_flight = False
+                self._transition(upstream, CLOSED)
+            return
+        upstream.errors += 1
+        upstream.error_rate += ERROR_ALPHA * (1.0 - upstream.error_rate)
+        if kind != "breaker":
+            return
+        upstream.failures += 1
+        if upstream.state == HALF_OPEN:
+            upstream.trial_in_flight = False
+            self._transition(upstream, OPEN)
+        elif upstream.state == CLOSED and upstream.failures >= config.breaker_failure_threshold:
+            self._transition(upstream, OPEN)
+
+    def _transition(self, upstream: Upstream, state: str):
+        previous, upstream.state = upstream.state, state
+        metrics.inc("upstream_breaker_transitions_total", upstream=upstream.name, state=state)
+        if state == OPEN:
+            upstream.opened_at = self.clock()
+            logger.warning(f"Upstream {upstream.name} ({self.name}): breaker open after {upstream.failures} failures")
+            if self._prober is None or self._prober.done():
+                self._prober = asyncio.get_running_loop().create_task(self._probe_loop())
+        else:
+            logger.info(f"Upstream {upstream.name} ({self.name}): breaker {previous} -> {state}")
+
+    async def _probe_loop(self):
+        """Re-check open endpoints in the background until none is left open."""
+        while any(u.state == OPEN for u in self.upstreams):
+            await asyncio.sleep(config.upstream_probe_interval)
+            await self.probe_open()
+
+    async def probe_open(self):
+        """Probe each open endpoint whose cooldown has passed; reachable ones go half-open."""
+        for upstream in self.upstreams:
+            if upstream.state != OPEN or self.clock() - upstream.opened_at < config.breaker_cooldown_seconds:
+                continue
+            if await self._probe(upstream):
+                self._transition(upstream, HALF_OPEN)
+            else:
+                upstream.opened_at = self.clock()
+
+    async def _probe(self, upstream: Upstream) -> bool:
+        metrics.inc("upstream_probes_total", upstream=upstream.name)
+        try:
+            await upstream.client.with_options(timeout=config.upstream_connect_timeout).models.list()
+        except APIStatusError as e:
+            # Any non-5xx answer (401, 404 for routers without /models, ...) means it is up
+            return e.status_code < 500
+        except Exception as e:
+            logger.debug(f"Probe of {upstream.name} failed: {e}")
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {upstream.name: upstream.stats() for upstream in self.upstreams}
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _upstream_stats():
+    return {name: upstreams.stats() for name, upstreams in list(_sets.items())}
+
+
+metrics.register_collector("upstreams", _upstream_stats)
@@ -0,0 +1,67 @@
+import logging
+from typing import Dict, Optional
+
+from src.core import json_backend
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_USAGE_MARKER = b'"prompt_tokens"'
+# A partial line longer than this is not an SSE event we care about
+_MAX_TAIL = 1 << 16
+
+
+class UsageSniffer:
+    """Picks the usage object out of a raw OpenAI SSE byte stream.
+
+    Chunks are only scanned for the `"prompt_tokens"` marker; the single line that
+    contains it is decoded, everything else is forwarded without being parsed.
+    """
+
+    __slots__ = ("tail", "usage", "bytes_seen")
+
+    def __init__(self):
+        self.tail = b""
+        self.usage: Optional[Dict[str, int]] = None
+        self.bytes_seen = 0
+
+    def feed(self, data: bytes):
+        self.bytes_seen += len(data)
+        buf = self.tail + data if self.tail else data
+        end = buf.rfind(b"\n")
+        if end < 0:
+            self.tail = buf if len(buf) <= _MAX_TAIL else b""
+            return
+        self.tail = buf[end + 1:] if end + 1 < len(buf) else b""
+
+        pos = buf.find(_USAGE_MARKER, 0, end)
+        if pos < 0:
+            return
+        start = buf.rfind(b"\n", 0, pos) + 1
+        line = buf[start:buf.find(b"\n", pos)].strip()
+        if line.startswith(b"data:"):
+            self._parse(line[5:])
+
+    def _parse(self, payload: bytes):
+        try:
+            usage = json_backend.loads(payload).get("usage")
+        except Exception:
+            logger.debug("Could not decode usage line from upstream stream")
+            return
+        if not isinstance(usage, dict):
+            return
+        details = usage.get("prompt_tokens_details") or {}
+        self.usage = {
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "cached_tokens": details.get("cached_tokens") or 0,
+        }
+
+    def record(self, route: str):
+        """Publish relayed bytes and token usage for this stream."""
+        metrics.inc("stream_passthrough_bytes_total", self.bytes_seen, route=route)
+        if self.usage is None:
+            return
+        metrics.inc("usage_prompt_tokens_total", self.usage["prompt_tokens"], route=route)
+        metrics.inc("usage_completion_tokens_total", self.usage["completion_tokens"], route=route)
+        metrics.inc("usage_cached_tokens_total", self.usage["cached_tokens"], route=route)
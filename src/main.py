@@ -1,12 +1,25 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
 from fastapi import FastAPI
 from src.api.endpoints import router as api_router
+from src.api.middleware import ProfilePathMiddleware
 import uvicorn
 import sys
 from src.core.config import config
+from src.core.http_pool import close_http_clients
+from src.core.profiles import profiles
 
-app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.2.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_http_clients()
+
+
+app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.2.0", lifespan=lifespan)
 
 app.include_router(api_router)
+app.add_middleware(ProfilePathMiddleware)
 
 
 def main():
@@ -30,9 +43,13 @@ def main():
         print(f"  HOST - Server host (default: 0.0.0.0)")
         print(f"  PORT - Server port (default: 8082)")
         print(f"  LOG_LEVEL - Logging level (default: INFO)")
-        print(f"  MAX_TOKENS_LIMIT - Token limit (default: 131072 for GLM-4.7 128K output)")
+        print(f"  MAX_TOKENS_LIMIT - Token limit for models without a registry max_output (default: 131072)")
+        print(f"  MODEL_REGISTRY_FILE - JSON of model capabilities added to src/core/models.json")
         print(f"  MIN_TOKENS_LIMIT - Minimum token limit (default: 1024 for thinking mode)")
-        print(f"  REQUEST_TIMEOUT - Request timeout in seconds (default: 90)")
+        print(f"  REQUEST_TIMEOUT - Upstream read timeout in seconds (default: 90)")
+        print(f"  PROXY_PROFILES - Extra providers as name=env_file,... served from this process")
+        print(f"  UPSTREAM_MAX_CONNECTIONS - Upstream connection pool size (default: 200)")
+        print(f"  UPSTREAM_HTTP2 - Use HTTP/2 to the upstream, needs h2 (default: false)")
         print("")
         print("2026 Supported Providers (passthrough):")
         print("  GLM-4.7, MiniMax-M2.1, Gemini 3 Pro, DeepSeek, Kimi")
@@ -54,6 +71,8 @@ def main():
     print(f"   Request Timeout: {config.request_timeout}s")
     print(f"   Server: {config.host}:{config.port}")
     print(f"   Client API Key Validation: {'Enabled' if config.anthropic_api_key else 'Disabled'}")
+    if len(profiles.profiles) > 1:
+        print(f"   Profiles: {', '.join(profiles.profiles)} (path prefix /<profile>/v1/...)")
     print("")
 
     # Parse log level - extract just the first word to handle comments
@@ -65,13 +84,47 @@ def main():
         log_level = 'info'
 
     # Start server
-    uvicorn.run(
-        "src.main:app",
-        host=config.host,
-        port=config.port,
-        log_level=log_level,
-        reload=False,
-    )
+    extra_ports = profiles.ports()
+    if not extra_ports:
+        uvicorn.run(
+            "src.main:app",
+            host=config.host,
+            port=config.port,
+            log_level=log_level,
+            reload=False,
+        )
+        return
+
+    # Profiles with their own PORT are also served from this process
+    for port in extra_ports:
+        print(f"   Profile '{profiles.by_port[port].name}': {config.host}:{port}")
+    primary = uvicorn.Server(uvicorn.Config(app, host=config.host, port=config.port, log_level=log_level))
+    secondaries = [
+        _SecondaryServer(uvicorn.Config(app, host=config.host, port=port, log_level=log_level, lifespan="off"))
+        for port in extra_ports
+    ]
+    try:
+        asyncio.run(_serve_all(primary, secondaries))
+    except KeyboardInterrupt:
+        pass
+
+
+class _SecondaryServer(uvicorn.Server):
+    """Extra listener for a profile port; the primary server owns signal handling."""
+
+    @contextmanager
+    def capture_signals(self):
+        yield
+
+
+async def _serve_all(primary: uvicorn.Server, secondaries):
+    tasks = [asyncio.create_task(server.serve()) for server in secondaries]
+    try:
+        await primary.serve()
+    finally:
+        for server in secondaries:
+            server.should_exit = True
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 if __name__ == "__main__":
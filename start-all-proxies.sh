@@ -140,13 +140,14 @@ start_proxy() {
         fi
     fi
 
-    # 日誌檔案
+    # 日誌檔案 (由代理自行依大小輪替，見 LOG_MAX_BYTES / LOG_BACKUP_COUNT)
     local log_file="$LOG_DIR/${name}.log"
+    local console_file="$LOG_DIR/${name}.console"
     local pid_file="$PID_DIR/${name}.pid"
 
     # 啟動代理
     echo -e "${GREEN}正在啟動...${NC}"
-    nohup $PYTHON_CMD start_proxy.py --env="$env_file" > "$log_file" 2>&1 &
+    LOG_FILE="$log_file" nohup $PYTHON_CMD start_proxy.py --env="$env_file" > "$console_file" 2>&1 &
     local pid=$!
     echo $pid > "$pid_file"
 
@@ -183,7 +184,7 @@ start_proxy() {
         return 0
     else
         echo -e "${RED}✗ 代理 $name 啟動失敗${NC}"
-        echo -e "${RED}  請查看日誌: $log_file${NC}"
+        echo -e "${RED}  請查看日誌: $log_file, $console_file${NC}"
         rm -f "$pid_file"
         return 1
     fi
@@ -83,6 +83,102 @@ async def test_streaming_cancellation():
         except Exception as e:
             print(f"❌ Streaming test error: {e}")
 
+STALL_UPSTREAM_PORT = 8098
+STALL_PROXY_PORT = 8099
+
+
+class StallingUpstream:
+    """Minimal OpenAI-compatible ASGI upstream that sends one chunk and then stalls.
+
+    Records the moment the proxy closes the upstream connection.
+    """
+
+    def __init__(self):
+        self.closed_at = None
+        self.first_chunk_sent = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        # Drain the request body
+        message = await receive()
+        while message.get("more_body"):
+            message = await receive()
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        chunk = {
+            "id": "chatcmpl-stall", "object": "chat.completion.chunk", "created": 0, "model": "stall",
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": "thinking..."}, "finish_reason": None}],
+        }
+        await send({"type": "http.response.body", "body": f"data: {json.dumps(chunk)}\n\n".encode(), "more_body": True})
+        self.first_chunk_sent.set()
+
+        # Stall (like a long thinking phase) until the proxy hangs up
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        self.closed_at = time.perf_counter()
+
+
+async def test_stalled_upstream_cancel_latency():
+    """Measure client-disconnect -> upstream-close latency while the upstream is stalled.
+
+    Runs a fake stalling upstream and a proxy instance in-process, so no running
+    server or API key is needed.
+    """
+    print("🧪 Testing cancellation latency with a stalled upstream...")
+
+    import os
+    import uvicorn
+
+    os.environ["OPENAI_API_KEY"] = "stall-test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STALL_UPSTREAM_PORT}/v1"
+    os.environ["ANTHROPIC_API_KEY"] = ""
+    from src.main import app
+
+    upstream = StallingUpstream()
+    servers = [
+        uvicorn.Server(uvicorn.Config(upstream, host="127.0.0.1", port=STALL_UPSTREAM_PORT, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=STALL_PROXY_PORT, log_level="warning")),
+    ]
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    try:
+        while not all(server.started for server in servers):
+            await asyncio.sleep(0.05)
+
+        async with httpx.AsyncClient(timeout=30) as client:
+            async with client.stream(
+                "POST",
+                f"http://127.0.0.1:{STALL_PROXY_PORT}/v1/messages",
+                json={
+                    "model": "gpt-4o",
+                    "max_tokens": 100,
+                    "messages": [{"role": "user", "content": "Think for a long time."}],
+                    "stream": True,
+                },
+            ) as response:
+                async for line in response.aiter_lines():
+                    if "thinking..." in line:
+                        break
+                print("🔌 First delta received, upstream is now stalled; disconnecting...")
+                disconnected_at = time.perf_counter()
+
+        for _ in range(100):
+            if upstream.closed_at is not None:
+                break
+            await asyncio.sleep(0.05)
+
+        if upstream.closed_at is None:
+            print("❌ Upstream connection was not closed within 5s of the client disconnect")
+        else:
+            latency_ms = (upstream.closed_at - disconnected_at) * 1000
+            print(f"✅ Upstream closed {latency_ms:.1f} ms after client disconnect")
+    finally:
+        for server in servers:
+            server.should_exit = True
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def test_server_running():
     """Test if the server is running."""
     print("🔍 Checking if server is running...")
@@ -105,7 +201,12 @@ async def main():
     """Main test function."""
     print("🚀 Starting HTTP request cancellation tests")
     print("=" * 50)
-    
+
+    # Self-contained: runs its own fake upstream and proxy instance
+    await test_stalled_upstream_cancel_latency()
+
+    print("\n" + "=" * 50)
+
     # Check if server is running
     if not await test_server_running():
         return
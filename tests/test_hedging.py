@@ -0,0 +1,88 @@
+"""Tests for the hedge delay and the hedge budget."""
+
+import os
+import random
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.core import hedging
+from src.core.hedging import BURST, MIN_SAMPLES, REFRESH_EVERY, Hedger
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    config = hedging.config
+    monkeypatch.setattr(config, "hedge_percentile", 0.9)
+    monkeypatch.setattr(config, "hedge_min_delay_ms", 250)
+    monkeypatch.setattr(config, "hedge_initial_delay_ms", 3000)
+    monkeypatch.setattr(config, "hedge_max_rate", 0.25)
+    return config
+
+
+def test_initial_delay_until_enough_samples():
+    hedger = Hedger()
+    for _ in range(MIN_SAMPLES - 1):
+        hedger.ttft.observe("model", 1.0)
+
+    assert hedger.delay("model") == 3.0
+    hedger.ttft.observe("model", 1.0)
+    assert hedger.delay("model") == 1.0
+
+
+def test_delay_is_the_models_recent_percentile():
+    hedger = Hedger()
+    samples = [index / 100 for index in range(1, 101)]
+    random.Random(0).shuffle(samples)
+    for sample in samples:
+        hedger.ttft.observe("fast", sample)
+        hedger.ttft.observe("slow", sample * 10)
+
+    assert hedger.delay("fast") == pytest.approx(0.91, abs=0.06)
+    assert hedger.delay("slow") == pytest.approx(9.1, abs=0.6)
+    assert hedger.delay("unseen") == 3.0
+
+
+def test_percentile_is_refreshed_every_few_samples():
+    hedger = Hedger()
+    for _ in range(MIN_SAMPLES):
+        hedger.ttft.observe("model", 1.0)
+    for _ in range(REFRESH_EVERY - 1):
+        hedger.ttft.observe("model", 5.0)
+    stale = hedger.delay("model")
+    hedger.ttft.observe("model", 5.0)
+
+    assert stale == 1.0
+    assert hedger.delay("model") == 5.0
+
+
+def test_delay_never_drops_below_the_minimum():
+    hedger = Hedger()
+    for _ in range(MIN_SAMPLES):
+        hedger.ttft.observe("model", 0.01)
+
+    assert hedger.delay("model") == 0.25
+
+
+def test_hedges_are_paid_from_a_token_bucket():
+    hedger = Hedger()
+    assert hedger.try_hedge()
+    assert not hedger.try_hedge()
+
+    # HEDGE_MAX_RATE 0.25: one hedge per four streamed requests
+    granted = []
+    for _ in range(12):
+        hedger.request_started()
+        granted.append(hedger.try_hedge())
+    assert granted.count(True) == 3
+    assert granted == [False, False, False, True] * 3
+
+
+def test_hedge_budget_is_capped_at_the_burst():
+    hedger = Hedger()
+    for _ in range(100):
+        hedger.request_started()
+
+    assert hedger.tokens == BURST
+    assert sum(hedger.try_hedge() for _ in range(10)) == BURST
@@ -0,0 +1,79 @@
+"""Tests for environment proxy support of the pooled upstream clients."""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.core import http_pool
+
+PROXY_VARIABLES = ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY")
+
+
+async def start_server(body: bytes, request_lines: list):
+    """Minimal HTTP/1.1 server answering every request with `body`, recording request lines."""
+
+    async def handle(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        request_lines.append(head.split(b"\r\n", 1)[0].decode())
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s" % (len(body), body))
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+@pytest.fixture
+def clean_proxy_env(monkeypatch):
+    for name in PROXY_VARIABLES:
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.lower(), raising=False)
+    return monkeypatch
+
+
+def test_environment_proxies_are_honored(clean_proxy_env):
+    async def scenario():
+        proxy_lines, direct_lines = [], []
+        proxy, proxy_port = await start_server(b"via proxy", proxy_lines)
+        direct, direct_port = await start_server(b"direct", direct_lines)
+        clean_proxy_env.setenv("HTTP_PROXY", f"http://127.0.0.1:{proxy_port}")
+        clean_proxy_env.setenv("NO_PROXY", "localhost")
+        try:
+            client = http_pool.get_http_client("test-env-proxy")
+            proxied = await client.get("http://upstream.test/v1/models")
+            bypassed = await client.get(f"http://localhost:{direct_port}/v1/models")
+            stats = http_pool._pool_stats()["test-env-proxy"]
+        finally:
+            await http_pool.close_http_clients()
+            proxy.close()
+            direct.close()
+
+        assert proxied.text == "via proxy"
+        assert proxy_lines == ["GET http://upstream.test/v1/models HTTP/1.1"]
+        assert bypassed.text == "direct"
+        assert direct_lines == ["GET /v1/models HTTP/1.1"]
+        assert set(stats["proxied"]) == {"http://"}
+
+    asyncio.run(scenario())
+
+
+def test_no_proxy_environment_connects_directly(clean_proxy_env):
+    async def scenario():
+        lines = []
+        server, port = await start_server(b"direct", lines)
+        try:
+            client = http_pool.get_http_client("test-no-proxy")
+            response = await client.get(f"http://127.0.0.1:{port}/v1/models")
+            stats = http_pool._pool_stats()["test-no-proxy"]
+        finally:
+            await http_pool.close_http_clients()
+            server.close()
+
+        assert response.text == "direct"
+        assert lines == ["GET /v1/models HTTP/1.1"]
+        assert "proxied" not in stats
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+"""Tests for the incremental JSON scanner and buffering of streamed tool arguments."""
+
+import json
+import logging
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.conversion import stream_translator
+from src.conversion.json_scanner import IncrementalJSONScanner
+from src.conversion.stream_translator import ToolCallState
+
+
+def scan(fragments):
+    """End offset returned for each fragment."""
+    scanner = IncrementalJSONScanner()
+    return [scanner.feed(fragment) for fragment in fragments], scanner
+
+
+@pytest.fixture(autouse=True)
+def buffered_tool_arguments(monkeypatch):
+    monkeypatch.setattr(stream_translator.config, "stream_tool_arguments", False)
+
+
+def test_nested_value_closes_at_its_last_bracket():
+    ends, scanner = scan(['{"a": [1, {"b": ', "[]}]", "}"])
+
+    assert ends == [-1, -1, 1]
+    assert scanner.complete
+
+
+def test_brackets_and_escaped_quotes_inside_strings_are_ignored():
+    value = json.dumps({"q": 'a"b}]{[', "p": "c:\\\\d\\"})
+    ends, scanner = scan([value])
+
+    assert ends == [len(value)]
+    assert scanner.depth == 0
+
+
+@pytest.mark.parametrize("split", range(1, 14))
+def test_value_split_anywhere_closes_at_the_same_place(split):
+    # Includes splits right after the backslash of an escaped quote
+    value = '{"q": "x\\"}y"}'
+    ends, _ = scan([value[:split], value[split:]])
+
+    assert ends == [-1, len(value) - split]
+
+
+def test_top_level_string_closes():
+    ends, scanner = scan(['  "ab', 'c\\"d" trailing'])
+
+    assert ends == [-1, 5]
+    assert scanner.complete
+
+
+@pytest.mark.parametrize("value", ["42", "true", "null", "-1.5e3"])
+def test_scalars_never_close(value):
+    ends, scanner = scan([value, " "])
+
+    assert ends == [-1, -1]
+    assert scanner.scalar and not scanner.complete
+
+
+def test_input_after_close_is_ignored():
+    ends, _ = scan(["{}", "{}"])
+
+    assert ends == [2, 0]
+
+
+def test_consume_sends_buffered_object_once_closed():
+    tool = ToolCallState()
+
+    assert tool.consume('{"path": "a') is None
+    assert tool.consume('.py"}') == '{"path": "a.py"}'
+    assert tool.close() is None
+
+
+def test_consume_drops_repeated_arguments_after_close():
+    tool = ToolCallState()
+
+    assert tool.consume('{"a": 1}{"a": 1}') == '{"a": 1}'
+    assert tool.consume('{"a": 1}') is None
+
+
+def test_scalar_arguments_are_sent_on_close():
+    tool = ToolCallState()
+
+    assert tool.consume("12") is None
+    assert tool.consume("34") is None
+    assert tool.close() == "1234"
+    assert tool.close() is None
+
+
+def test_malformed_arguments_are_sent_as_raw_arguments(caplog):
+    tool = ToolCallState()
+    tool.name = "Read"
+
+    with caplog.at_level(logging.WARNING, logger=stream_translator.__name__):
+        assert tool.consume('{"path": }') == json.dumps({"raw_arguments": '{"path": }'})
+    assert "Read" in caplog.text
+
+
+def test_truncated_arguments_are_sent_as_raw_arguments_on_close():
+    tool = ToolCallState()
+    tool.consume('{"path": "a.p')
+
+    assert json.loads(tool.close()) == {"raw_arguments": '{"path": "a.p'}
+
+
+def test_streamed_arguments_are_forwarded_as_they_arrive(monkeypatch):
+    monkeypatch.setattr(stream_translator.config, "stream_tool_arguments", True)
+    tool = ToolCallState()
+
+    assert tool.consume('{"a": ') == '{"a": '
+    assert tool.consume('1}{"a": 1}') == "1}"
+    assert tool.consume("{}") is None
+    assert tool.close() is None
@@ -0,0 +1,188 @@
+"""Tests for the adaptive concurrency limiter."""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.core import limiter as limiter_module
+from src.core.limiter import ConcurrencyLimiter, UpstreamOverloadedError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    config = limiter_module.config
+    monkeypatch.setattr(config, "limiter_min_limit", 1)
+    monkeypatch.setattr(config, "limiter_max_limit", 4)
+    monkeypatch.setattr(config, "limiter_backoff_ratio", 0.5)
+    monkeypatch.setattr(config, "limiter_latency_tolerance", 3.0)
+    monkeypatch.setattr(config, "limiter_queue_size", 2)
+    monkeypatch.setattr(config, "limiter_queue_timeout", 0.05)
+    return config
+
+
+@pytest.fixture
+def single_slot(settings, monkeypatch):
+    """A limit of one slot that successes cannot grow."""
+    monkeypatch.setattr(settings, "limiter_max_limit", 1)
+    return settings
+
+
+def test_overload_halves_the_limit_once_per_burst(settings):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        tokens = [await limiter.acquire() for _ in range(4)]
+        for token in tokens[:3]:
+            limiter.release(token, overloaded=True)
+        after_burst = limiter.limit
+        # Admitted after the decrease: counts again
+        limiter.release(await limiter.acquire(), overloaded=True)
+        return after_burst, limiter.limit, limiter.in_flight
+
+    assert asyncio.run(scenario()) == (2.0, 1.0, 1)
+
+
+def test_limit_never_drops_below_the_minimum(settings):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        for _ in range(5):
+            limiter.release(await limiter.acquire(), overloaded=True)
+        return limiter.limit
+
+    assert asyncio.run(scenario()) == 1.0
+
+
+def test_busy_successes_grow_the_limit_back(settings):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        limiter.limit = 2.0
+        grown = []
+        for _ in range(3):
+            first, second = await limiter.acquire(), await limiter.acquire()
+            limiter.release(first)
+            limiter.release(second)
+            grown.append(round(limiter.limit, 3))
+        return grown
+
+    # +1/limit for the success released while at least half the limit was in use
+    assert asyncio.run(scenario()) == [2.5, 2.9, 3.245]
+
+
+def test_idle_successes_do_not_grow_the_limit(settings):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        limiter.limit = 3.0
+        for _ in range(5):
+            limiter.release(await limiter.acquire())
+        return limiter.limit
+
+    assert asyncio.run(scenario()) == 3.0
+
+
+@pytest.mark.parametrize("kind", ["stream", "response"])
+def test_slow_latency_decreases_against_its_own_baseline(settings, kind):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        limiter.release(await limiter.acquire(), latency=1.0, kind=kind)
+        # A slow request of the other kind has no baseline to compare with yet
+        other = "response" if kind == "stream" else "stream"
+        limiter.release(await limiter.acquire(), latency=10.0, kind=other)
+        unchanged = limiter.limit
+        limiter.release(await limiter.acquire(), latency=3.5, kind=kind)
+        return unchanged, limiter.limit, limiter.baselines
+
+    unchanged, limit, baselines = asyncio.run(scenario())
+    assert unchanged == 4.0
+    assert limit == pytest.approx(3.6)
+    assert set(baselines) == {"stream", "response"}
+
+
+def test_queued_request_gets_the_next_free_slot(single_slot):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        token = await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 1
+        limiter.release(token)
+        await waiter
+        return limiter.stats()
+
+    assert asyncio.run(scenario())["in_flight"] == 1
+
+
+def test_queue_timeout_and_full_queue_are_refused(single_slot):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        await limiter.acquire()
+        waiters = [asyncio.create_task(limiter.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamOverloadedError, match="queued"):
+            await limiter.acquire()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        return results, limiter.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert all(isinstance(result, UpstreamOverloadedError) and "no slot" in str(result) for result in results)
+    assert stats == {"limit": 1.0, "in_flight": 1, "queued": 0, "rejected": 3}
+
+
+def test_expected_wait_over_the_deadline_is_refused_at_once(single_slot):
+    async def scenario():
+        clock = FakeClock()
+        limiter = ConcurrencyLimiter("test", clock)
+        token = await limiter.acquire()
+        clock.now += 1.0
+        limiter.release(token)
+        await limiter.acquire()
+        with pytest.raises(UpstreamOverloadedError, match="expected wait"):
+            await limiter.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_waiters_are_skipped_and_do_not_leak_slots(single_slot):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        token = await limiter.acquire()
+        abandoned = asyncio.create_task(limiter.acquire())
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await asyncio.gather(abandoned, return_exceptions=True)
+        limiter.release(token)
+        second = await waiting
+        limiter.release(second)
+        return limiter.stats()
+
+    assert asyncio.run(scenario()) == {"limit": 1.0, "in_flight": 0, "queued": 0, "rejected": 0}
+
+
+def test_waiter_cancelled_after_being_granted_hands_the_slot_on(single_slot):
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", FakeClock())
+        token = await limiter.acquire()
+        granted = asyncio.create_task(limiter.acquire())
+        next_waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot is granted and the waiter cancelled before it runs again; depending on
+        # the Python version it either gives the slot up or returns it as acquired
+        limiter.release(token)
+        granted.cancel()
+        (result,) = await asyncio.gather(granted, return_exceptions=True)
+        if not isinstance(result, BaseException):
+            limiter.release(result)
+        limiter.release(await next_waiter)
+        return limiter.stats()
+
+    assert asyncio.run(scenario()) == {"limit": 1.0, "in_flight": 0, "queued": 0, "rejected": 0}
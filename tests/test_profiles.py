@@ -0,0 +1,77 @@
+"""Tests for client API key validation with several provider profiles."""
+
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import endpoints
+from src.core.profiles import load_profiles
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Default profile expecting "default-key", plus profiles routed by model: "kimi"
+    (PROFILE_MODELS) expecting "kimi-key" and "glm" (BIG_MODEL only) expecting "glm-key"."""
+    monkeypatch.setattr(endpoints.config, "anthropic_api_key", "default-key")
+    env_file = tmp_path / ".env-kimi"
+    env_file.write_text(
+        'OPENAI_BASE_URL="http://127.0.0.1:9/v1"\n'
+        'ANTHROPIC_API_KEY="kimi-key"\n'
+        'PROFILE_MODELS="kimi-*"\n'
+    )
+    glm_env_file = tmp_path / ".env-glm"
+    glm_env_file.write_text(
+        'OPENAI_BASE_URL="http://127.0.0.1:9/v1"\n'
+        'ANTHROPIC_API_KEY="glm-key"\n'
+        'BIG_MODEL="glm-4.7"\n'
+    )
+    monkeypatch.setattr(endpoints, "profiles", load_profiles(f"kimi={env_file},glm={glm_env_file}"))
+
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    return TestClient(app)
+
+
+def count_tokens(client, model, api_key):
+    return client.post(
+        "/v1/messages/count_tokens",
+        json={"model": model, "messages": [{"role": "user", "content": "Hello"}]},
+        headers={"x-api-key": api_key},
+    )
+
+
+def test_key_checked_against_default_profile(client):
+    assert count_tokens(client, "claude-haiku-4-5", "default-key").status_code == 200
+    assert count_tokens(client, "claude-haiku-4-5", "kimi-key").status_code == 401
+
+
+def test_model_routed_request_needs_that_profiles_key(client):
+    assert count_tokens(client, "kimi-k2", "kimi-key").status_code == 200
+    assert count_tokens(client, "kimi-k2", "default-key").status_code == 401
+
+
+@pytest.mark.parametrize("path", ["/v1/messages", "/v1/chat/completions"])
+def test_model_routing_does_not_bypass_auth(client, path):
+    body = {"model": "kimi-k2", "max_tokens": 10, "messages": [{"role": "user", "content": "Hello"}]}
+
+    response = client.post(path, json=body, headers={"x-api-key": "default-key"})
+    assert response.status_code == 401
+
+    response = client.post(path, json=body, headers={"authorization": "Bearer default-key"})
+    assert response.status_code == 401
+
+
+def test_profile_routes_only_models_its_env_file_sets(client):
+    assert count_tokens(client, "glm-4.7", "glm-key").status_code == 200
+    assert count_tokens(client, "glm-4.7", "default-key").status_code == 401
+
+
+def test_default_profile_models_stay_on_default_profile(client):
+    # "glm" inherits SMALL_MODEL from the main configuration; that must not route to it
+    for model in (endpoints.config.big_model, endpoints.config.middle_model, endpoints.config.small_model):
+        assert count_tokens(client, model, "default-key").status_code == 200
+        assert count_tokens(client, model, "glm-key").status_code == 401
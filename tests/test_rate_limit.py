@@ -0,0 +1,179 @@
+"""Tests for per-client rate limits."""
+
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from src.api import endpoints
+from src.core import rate_limit
+from src.core.rate_limit import ClientRateLimiter, RateLimitExceeded, client_identity
+from src.core.stream_delta import StreamDelta
+
+REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "x" * 400}]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    def set_limits(rpm=0, input_tpm=0, output_tpm=0):
+        monkeypatch.setattr(rate_limit.config, "client_rpm_limit", rpm)
+        monkeypatch.setattr(rate_limit.config, "client_input_tpm_limit", input_tpm)
+        monkeypatch.setattr(rate_limit.config, "client_output_tpm_limit", output_tpm)
+    return set_limits
+
+
+def test_burst_up_to_one_minute_of_budget_then_refused(limits, clock):
+    limits(rpm=3)
+    limiter = ClientRateLimiter(clock)
+    for _ in range(3):
+        limiter.admit("key", REQUEST)
+
+    with pytest.raises(RateLimitExceeded) as error:
+        limiter.admit("key", REQUEST)
+    assert error.value.retry_after == pytest.approx(20.0)
+    assert error.value.retry_after_header == "20"
+    limiter.admit("other-key", REQUEST)
+
+
+def test_buckets_refill_continuously(limits, clock):
+    limits(rpm=60)
+    limiter = ClientRateLimiter(clock)
+    for _ in range(60):
+        limiter.admit("key", REQUEST)
+    with pytest.raises(RateLimitExceeded):
+        limiter.admit("key", REQUEST)
+
+    clock.now += 1.0
+    limiter.admit("key", REQUEST)
+    with pytest.raises(RateLimitExceeded):
+        limiter.admit("key", REQUEST)
+    clock.now += 120.0
+    for _ in range(60):
+        limiter.admit("key", REQUEST)
+
+
+def test_settle_corrects_input_estimate_and_charges_output(limits, clock):
+    limits(input_tpm=10000, output_tpm=100)
+    limiter = ClientRateLimiter(clock)
+    charge = limiter.admit("key", REQUEST)
+    assert charge.estimate > 0
+    assert charge.buckets.input.tokens == 10000 - charge.estimate
+
+    charge.settle({"prompt_tokens": 50, "completion_tokens": 150})
+    charge.settle({"prompt_tokens": 5000, "completion_tokens": 5000})
+    assert charge.buckets.input.tokens == 9950
+    assert charge.buckets.output.tokens == -50
+
+    with pytest.raises(RateLimitExceeded) as error:
+        limiter.admit("key", REQUEST)
+    assert error.value.retry_after == pytest.approx(30.6)
+
+
+def test_refund_returns_the_input_estimate_once(limits, clock):
+    limits(rpm=10, input_tpm=10000)
+    limiter = ClientRateLimiter(clock)
+    charge = limiter.admit("key", REQUEST)
+    charge.refund()
+    charge.refund()
+
+    assert charge.buckets.input.tokens == 10000
+    assert charge.buckets.requests.tokens == 9
+
+
+def test_stream_failing_before_first_delta_is_refunded(limits, clock):
+    limits(input_tpm=10000)
+    limiter = ClientRateLimiter(clock)
+
+    async def failing():
+        raise HTTPException(status_code=502, detail="upstream down")
+        yield
+
+    async def usage_stream():
+        yield StreamDelta(True, content="Hi")
+        yield StreamDelta(usage={"prompt_tokens": 40, "completion_tokens": 2, "cached_tokens": 0})
+
+    async def scenario():
+        failed = limiter.admit("a", REQUEST)
+        with pytest.raises(HTTPException):
+            async for _ in failed.track_deltas(failing()):
+                pass
+        settled = limiter.admit("b", REQUEST)
+        async for _ in settled.track_deltas(usage_stream()):
+            pass
+        return failed, settled
+
+    failed, settled = asyncio.run(scenario())
+    assert failed.buckets.input.tokens == 10000
+    assert settled.buckets.input.tokens == 9960
+
+
+def test_unchecked_keys_are_limited_by_address():
+    assert client_identity("sk-1", True, "10.0.0.1") == "sk-1"
+    assert client_identity("sk-1", False, "10.0.0.1") == client_identity("sk-2", False, "10.0.0.1")
+    assert client_identity(None, True, None) == "address:anonymous"
+
+
+@pytest.fixture
+def client(monkeypatch, limits, clock):
+    limits(rpm=1, input_tpm=100000)
+    limiter = ClientRateLimiter(clock)
+    monkeypatch.setattr(endpoints, "client_rate_limiter", limiter)
+    monkeypatch.setattr(endpoints.profiles.default, "anthropic_api_key", None)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    return TestClient(app), limiter
+
+
+def post(test_client, api_key):
+    return test_client.post(
+        "/v1/messages",
+        json={"model": "claude-sonnet-4", "max_tokens": 10, "messages": [{"role": "user", "content": "Hello"}]},
+        headers={"x-api-key": api_key},
+    )
+
+
+def test_over_limit_request_gets_429_with_retry_after(client, monkeypatch):
+    test_client, _ = client
+
+    async def respond(request, request_id=None):
+        return {"choices": [{"message": {"content": "Hi"}, "finish_reason": "stop"}], "usage": {"prompt_tokens": 3, "completion_tokens": 1}}
+
+    monkeypatch.setattr(endpoints.profiles.default.client, "create_chat_completion", respond)
+    assert post(test_client, "key-1").status_code == 200
+
+    # Without ANTHROPIC_API_KEY a different key does not get a fresh budget
+    response = post(test_client, "key-2")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "60"
+    assert response.json()["error"]["type"] == "rate_limit_error"
+
+
+def test_failed_upstream_call_refunds_the_estimate(client, monkeypatch):
+    test_client, limiter = client
+
+    async def fail(request, request_id=None):
+        raise HTTPException(status_code=502, detail="upstream down")
+
+    monkeypatch.setattr(endpoints.profiles.default.client, "create_chat_completion", fail)
+    assert post(test_client, "key").status_code == 502
+
+    (buckets,) = limiter._clients.values()
+    assert buckets.input.tokens == 100000
+    assert buckets.requests.tokens == 0
@@ -0,0 +1,140 @@
+"""Tests for /v1/messages decoding with tail-only validation."""
+
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from src.api import endpoints
+from src.conversion.request_decoder import RequestDecoder
+from src.models.claude import ClaudeMessagesRequest
+
+
+def body(messages, **fields):
+    return json.dumps({"model": "claude-sonnet-4", "max_tokens": 100, "messages": messages, **fields}).encode()
+
+
+def turns(count):
+    messages = []
+    for index in range(count):
+        messages.append({"role": "user", "content": f"question {index}"})
+        messages.append({"role": "assistant", "content": [{"type": "text", "text": f"answer {index}"}]})
+    return messages
+
+
+@pytest.fixture
+def decoder(monkeypatch):
+    monkeypatch.setattr(endpoints.config, "decode_cache_max_bytes", 1 << 20)
+    monkeypatch.setattr(endpoints.config, "strict_decoding_keys", set())
+    return RequestDecoder()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(endpoints.config, "anthropic_api_key", None)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    return TestClient(app)
+
+
+def test_later_turns_validate_only_new_messages(decoder):
+    messages = turns(5)
+    first = decoder.decode(body(messages[:6]), "key")
+    second = decoder.decode(body(messages), "key")
+
+    assert second == ClaudeMessagesRequest.model_validate_json(body(messages))
+    assert all(new is old for new, old in zip(second.messages, first.messages))
+    assert decoder.stats()["reused_messages"] == 6
+    assert decoder.stats()["validated_messages"] == 10
+
+
+def test_divergent_transcript_revalidates_from_first_difference(decoder):
+    messages = turns(3)
+    decoder.decode(body(messages), "key")
+    edited = messages[:3] + [{"role": "assistant", "content": "edited answer"}]
+    request = decoder.decode(body(edited), "key")
+
+    assert request == ClaudeMessagesRequest.model_validate_json(body(edited))
+    assert request.messages[3].content == "edited answer"
+    assert decoder.stats()["reused_messages"] == 3
+
+
+def test_top_level_fields_are_validated_every_turn(decoder):
+    messages = turns(2)
+    decoder.decode(body(messages, temperature=0.5), "key")
+    request = decoder.decode(body(messages, temperature=0, stream=True), "key")
+
+    assert request.temperature == 0
+    assert request.stream is True
+
+
+def test_conversations_are_kept_per_client_key(decoder):
+    messages = turns(2)
+    decoder.decode(body(messages), "key")
+    decoder.decode(body(messages), "other-key")
+
+    assert decoder.stats()["conversations"] == 2
+    assert decoder.stats()["reused_messages"] == 0
+
+
+def test_strict_keys_and_disabled_memo_validate_in_full(decoder, monkeypatch):
+    messages = turns(2)
+    monkeypatch.setattr(endpoints.config, "strict_decoding_keys", {"strict"})
+    decoder.decode(body(messages), "strict")
+    decoder.decode(body(messages), "strict")
+    monkeypatch.setattr(endpoints.config, "decode_cache_max_bytes", 0)
+    decoder.decode(body(messages), "key")
+    decoder.decode(body(messages), "key")
+
+    assert decoder.stats()["conversations"] == 0
+    assert decoder.stats()["reused_messages"] == 0
+
+
+def test_transcripts_are_evicted_by_body_size(decoder, monkeypatch):
+    first, second = body(turns(2)), body(turns(3))
+    monkeypatch.setattr(endpoints.config, "decode_cache_max_bytes", len(first) + len(second) - 1)
+    decoder.decode(first, "a")
+    decoder.decode(second, "b")
+
+    assert decoder.stats()["conversations"] == 1
+    assert decoder.stats()["bytes"] == len(second)
+
+
+def test_error_in_tail_is_reported_relative_to_whole_body(decoder):
+    messages = turns(3)
+    decoder.decode(body(messages[:4]), "key")
+    broken = messages[:4] + [{"role": "user", "content": [{"type": "text"}]}]
+
+    with pytest.raises(ValidationError) as error:
+        decoder.decode(body(broken), "key")
+    with pytest.raises(ValidationError) as expected:
+        ClaudeMessagesRequest.model_validate_json(body(broken))
+    assert error.value.errors(include_url=False) == expected.value.errors(include_url=False)
+    assert error.value.errors()[0]["loc"][:2] == ("messages", 4)
+
+
+def test_malformed_json_returns_422(client):
+    response = client.post("/v1/messages", content=b'{"model": "claude-sonnet-4", "messages": [', headers={"content-type": "application/json"})
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+
+def test_invalid_schema_returns_422_with_body_location(client):
+    response = client.post("/v1/messages", content=body([{"role": "user", "content": 3}]))
+
+    assert response.status_code == 422
+    locations = [tuple(error["loc"]) for error in response.json()["detail"]]
+    assert all(location[:3] == ("body", "messages", 0) for location in locations)
+
+
+def test_missing_field_returns_422(client):
+    response = client.post("/v1/messages", content=json.dumps({"model": "claude-sonnet-4", "messages": turns(1)}).encode())
+
+    assert response.status_code == 422
+    assert ["body", "max_tokens"] in [error["loc"] for error in response.json()["detail"]]
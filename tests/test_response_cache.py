@@ -0,0 +1,207 @@
+"""Tests for the memory and disk tiers of the response cache."""
+
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.core import json_backend
+from src.core import response_cache as response_cache_module
+from src.core.response_cache import ResponseCache
+from src.core.stream_delta import StreamDelta, ToolCallFragment
+
+HEADERS = {}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def response(text, finish_reason="stop"):
+    return {
+        "id": "chatcmpl-upstream",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "prompt_tokens_details": {"cached_tokens": 4}},
+    }
+
+
+def size(value):
+    return len(json_backend.dumps_bytes(value))
+
+
+@pytest.fixture
+def cache_config(monkeypatch):
+    config = response_cache_module.config
+    monkeypatch.setattr(config, "response_cache_enabled", True)
+    monkeypatch.setattr(config, "response_cache_ttl_seconds", 60)
+    monkeypatch.setattr(config, "response_cache_max_bytes", 1 << 20)
+    monkeypatch.setattr(config, "response_cache_dir", "")
+    return config
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_only_temperature_zero_requests_without_bypass_are_keyed(cache_config):
+    cache = ResponseCache()
+    request = {"model": "gpt-4o", "temperature": 0, "messages": [{"role": "user", "content": "Hi"}]}
+
+    key = cache.key_for("default", request, HEADERS)
+    assert key == cache.key_for("default", dict(request, stream=True, stream_options={"include_usage": True}), HEADERS)
+    assert key != cache.key_for("other-profile", request, HEADERS)
+    assert cache.key_for("default", dict(request, temperature=0.7), HEADERS) is None
+    assert cache.key_for("default", request, {"cache-control": "no-cache"}) is None
+    assert cache.key_for("default", request, {"x-proxy-cache": "bypass"}) is None
+    assert cache.key_for("default", request, HEADERS, {"proxy_cache": "bypass"}) is None
+
+
+def test_hits_get_a_fresh_id_and_expire_after_the_ttl(cache_config, clock):
+    async def scenario():
+        cache = ResponseCache(clock)
+        await cache.put("key", response("Hi"))
+        hit = await cache.get("key")
+        clock.now += 59.0
+        still_fresh = await cache.get("key") is not None
+        clock.now += 1.0
+        return hit, still_fresh, await cache.get("key"), cache.stats()
+
+    hit, still_fresh, expired, stats = asyncio.run(scenario())
+    assert hit["choices"] == response("Hi")["choices"]
+    assert hit["id"].startswith("chatcmpl-cache-")
+    assert still_fresh
+    assert expired is None
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (0, 0, 2, 1)
+
+
+def test_incomplete_responses_are_not_stored(cache_config):
+    async def scenario():
+        cache = ResponseCache()
+        await cache.put("key", response("Hi", finish_reason=None))
+        await cache.put("other", {"choices": []})
+        return cache.stats()["entries"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_least_recently_used_entries_are_evicted_by_bytes(cache_config, monkeypatch):
+    entry_size = size(response("a"))
+    monkeypatch.setattr(cache_config, "response_cache_max_bytes", 2 * entry_size)
+
+    async def scenario():
+        cache = ResponseCache()
+        await cache.put("a", response("a"))
+        await cache.put("b", response("b"))
+        await cache.get("a")
+        await cache.put("c", response("c"))
+        present = [key for key in "abc" if await cache.get(key) is not None]
+        await cache.put("huge", response("x" * entry_size * 2))
+        return present, await cache.get("huge"), cache.stats()
+
+    present, huge, stats = asyncio.run(scenario())
+    assert present == ["a", "c"]
+    assert huge is None
+    assert stats["bytes"] == 2 * entry_size
+
+
+def test_disk_entries_are_promoted_to_memory(cache_config, clock, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_config, "response_cache_dir", str(tmp_path))
+
+    async def scenario():
+        await ResponseCache(clock).put("key", response("Hi"))
+        # A new process: empty memory tier, same directory
+        cache = ResponseCache(clock)
+        first = await cache.get("key")
+        (tmp_path / "key.json").unlink()
+        second = await cache.get("key")
+        return first, second, cache.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert first["choices"][0]["message"]["content"] == "Hi"
+    assert second["choices"] == first["choices"]
+    assert stats["entries"] == 1
+
+
+def test_expired_disk_entries_are_removed(cache_config, clock, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_config, "response_cache_dir", str(tmp_path))
+
+    async def scenario():
+        await ResponseCache(clock).put("key", response("Hi"))
+        clock.now += 61.0
+        return await ResponseCache(clock).get("key")
+
+    assert asyncio.run(scenario()) is None
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_corrupt_disk_entry_is_a_miss(cache_config, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(cache_config, "response_cache_dir", str(tmp_path))
+    (tmp_path / "key.json").write_bytes(b'{"expires_at": 99999999999, "response": {"choi')
+
+    async def scenario():
+        cache = ResponseCache()
+        return await cache.get("key"), cache.stats()
+
+    entry, stats = asyncio.run(scenario())
+    assert entry is None
+    assert stats["misses"] == 1
+    assert "unreadable entry" in caplog.text
+
+
+def test_recorded_stream_is_stored_and_replayed(cache_config):
+    deltas = [
+        StreamDelta(True, reasoning="Thinking"),
+        StreamDelta(True, content="Reading "),
+        StreamDelta(True, content="the file"),
+        StreamDelta(True, tool_calls=[ToolCallFragment(0, "call_1", "Read", '{"path": ')]),
+        StreamDelta(True, tool_calls=[ToolCallFragment(0, None, None, '"a.py"}')]),
+        StreamDelta(True, finish_reason="tool_calls"),
+        StreamDelta(usage={"prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 4}),
+    ]
+
+    async def upstream():
+        for delta in deltas:
+            yield delta
+
+    async def scenario():
+        cache = ResponseCache()
+        passed = [delta async for delta in cache.record("key", upstream())]
+        stored = await cache.get("key")
+        replayed = [delta async for delta in cache.replay(stored)]
+        return passed, stored, replayed
+
+    passed, stored, replayed = asyncio.run(scenario())
+    assert passed == deltas
+    message = stored["choices"][0]["message"]
+    assert message["content"] == "Reading the file"
+    assert message["reasoning_content"] == "Thinking"
+    assert message["tool_calls"] == [{"id": "call_1", "type": "function", "function": {"name": "Read", "arguments": '{"path": "a.py"}'}}]
+    assert [(d.reasoning, d.content, d.finish_reason, d.usage) for d in replayed if not d.tool_calls] == [
+        ("Thinking", None, None, None),
+        (None, "Reading the file", None, None),
+        (None, None, "tool_calls", None),
+        (None, None, None, {"prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 4}),
+    ]
+    (tool_delta,) = [d for d in replayed if d.tool_calls]
+    fragment = tool_delta.tool_calls[0]
+    assert (fragment.id, fragment.name, json.loads(fragment.arguments)) == ("call_1", "Read", {"path": "a.py"})
+
+
+def test_interrupted_stream_is_not_stored(cache_config):
+    async def upstream():
+        yield StreamDelta(True, content="Partial")
+
+    async def scenario():
+        cache = ResponseCache()
+        [delta async for delta in cache.record("key", upstream())]
+        return cache.stats()["entries"]
+
+    assert asyncio.run(scenario()) == 0
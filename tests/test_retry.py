@@ -0,0 +1,118 @@
+"""Tests for the upstream retry policy."""
+
+import email.utils
+import os
+import random
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from src.core import retry as retry_module
+from src.core.retry import RetryState, parse_duration, retry_after_from_headers
+
+REQUEST = httpx.Request("POST", "http://upstream.test/v1/chat/completions")
+
+
+def status_error(code, headers=None):
+    return APIStatusError(f"status {code}", response=httpx.Response(code, headers=headers or {}, request=REQUEST), body=None)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    config = retry_module.config
+    monkeypatch.setattr(config, "max_retries", 10)
+    monkeypatch.setattr(config, "retry_base_delay", 0.5)
+    monkeypatch.setattr(config, "retry_max_delay", 8.0)
+    monkeypatch.setattr(config, "retry_budget_seconds", 30.0)
+    return config
+
+
+def test_decorrelated_jitter_stays_within_bounds():
+    retry = RetryState("test", rng=random.Random(1))
+    previous = 0.5
+    for _ in range(8):
+        delay = retry.next_delay(status_error(503))
+        if delay is None:
+            break
+        assert 0.5 <= delay <= min(8.0, previous * 3)
+        previous = delay
+
+
+def test_jitter_is_reproducible_with_a_seeded_rng():
+    def delays(seed):
+        retry = RetryState("test", rng=random.Random(seed))
+        return [retry.next_delay(APIConnectionError(request=REQUEST)) for _ in range(4)]
+
+    assert delays(3) == delays(3)
+    assert delays(3) != delays(4)
+
+
+def test_retry_after_is_honoured_with_small_jitter():
+    retry = RetryState("test", rng=random.Random(0))
+    delay = retry.next_delay(status_error(429, {"retry-after": "4"}))
+
+    assert 4.0 <= delay <= 4.4
+    assert retry.attempts == 1
+
+
+def test_retry_after_beyond_the_budget_fails_fast(settings):
+    retry = RetryState("test", rng=random.Random(0))
+
+    assert retry.next_delay(status_error(429, {"retry-after": "31"})) is None
+    assert retry.attempts == 0
+    assert retry.waited == 0.0
+
+
+def test_budget_is_shared_by_all_waits_of_a_request():
+    retry = RetryState("test", rng=random.Random(0))
+    waits = []
+    while (delay := retry.next_delay(status_error(429, {"retry-after-ms": "9000"}))) is not None:
+        waits.append(delay)
+
+    assert len(waits) == 3
+    assert sum(waits) <= 30.0
+    assert retry.waited == sum(waits)
+
+
+def test_attempts_are_capped_by_max_retries(settings, monkeypatch):
+    monkeypatch.setattr(settings, "max_retries", 2)
+    retry = RetryState("test", rng=random.Random(0))
+
+    assert retry.next_delay(APITimeoutError(request=REQUEST)) is not None
+    assert retry.next_delay(APITimeoutError(request=REQUEST), other_endpoint=True) == 0.0
+    assert retry.next_delay(APITimeoutError(request=REQUEST)) is None
+
+
+@pytest.mark.parametrize("error, retried", [
+    (status_error(400), False),
+    (status_error(401), False),
+    (status_error(500), True),
+    (status_error(529), True),
+    (status_error(503, {"x-should-retry": "false"}), False),
+    (status_error(400, {"x-should-retry": "true"}), True),
+    (ValueError("bug"), False),
+])
+def test_only_retryable_errors_are_retried(error, retried):
+    assert (RetryState("test", rng=random.Random(0)).next_delay(error) is not None) == retried
+
+
+@pytest.mark.parametrize("value, seconds", [("20ms", 0.02), ("1.5s", 1.5), ("6m0s", 360.0), ("2", 2.0), ("soon", None)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+
+def test_retry_after_headers_in_order_of_preference():
+    assert retry_after_from_headers({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert retry_after_from_headers({"retry-after": "9"}) == 9.0
+    date = email.utils.formatdate(1_000_012.0, usegmt=True)
+    assert retry_after_from_headers({"retry-after": date}, clock=lambda: 1_000_000.0) == 12.0
+    assert retry_after_from_headers({"retry-after": date}, clock=lambda: 1_000_100.0) == 0.0
+    # The exhausted limit decides, not the longer reset
+    assert retry_after_from_headers({
+        "x-ratelimit-reset-requests": "2s", "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-tokens": "40s", "x-ratelimit-remaining-tokens": "100",
+    }) == 2.0
+    assert retry_after_from_headers({}) is None
@@ -0,0 +1,122 @@
+"""Tests for coalescing of identical in-flight requests."""
+
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.core.singleflight import SingleFlight, request_key
+
+REQUEST = {"model": "gpt-4o", "max_tokens": 10, "messages": [{"role": "user", "content": "Title?"}]}
+
+
+class Upstream:
+    """Call that blocks until released, counting how often it was made."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"id": f"response-{self.calls}"}
+
+
+def test_identical_requests_share_the_leaders_call():
+    async def scenario():
+        flights, upstream = SingleFlight("test"), Upstream()
+        leader = asyncio.create_task(flights.do(REQUEST, upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do(json.loads(json.dumps(REQUEST)), upstream))
+        await asyncio.sleep(0)
+        assert flights.in_flight == 1
+        upstream.release.set()
+        return await leader, await follower, upstream.calls, flights.in_flight
+
+    leader, follower, calls, in_flight = asyncio.run(scenario())
+    assert leader == follower == {"id": "response-1"}
+    assert calls == 1
+    assert in_flight == 0
+
+
+def test_different_requests_are_not_coalesced():
+    async def scenario():
+        flights, upstream = SingleFlight("test"), Upstream()
+        other = dict(REQUEST, messages=[{"role": "user", "content": "Other?"}])
+        first = asyncio.create_task(flights.do(REQUEST, upstream))
+        second = asyncio.create_task(flights.do(other, upstream))
+        await asyncio.sleep(0)
+        upstream.release.set()
+        await asyncio.gather(first, second)
+        return upstream.calls
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_follower_disconnecting_does_not_cancel_the_leader():
+    async def scenario():
+        flights, upstream = SingleFlight("test"), Upstream()
+        leader = asyncio.create_task(flights.do(REQUEST, upstream))
+        follower = asyncio.create_task(flights.do(REQUEST, upstream))
+        await asyncio.sleep(0)
+        follower.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await leader, follower.cancelled(), upstream.cancelled
+
+    response, follower_cancelled, upstream_cancelled = asyncio.run(scenario())
+    assert response == {"id": "response-1"}
+    assert follower_cancelled
+    assert not upstream_cancelled
+
+
+def test_call_is_cancelled_once_every_waiter_is_gone():
+    async def scenario():
+        flights, upstream = SingleFlight("test"), Upstream()
+        waiters = [asyncio.create_task(flights.do(REQUEST, upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return upstream.cancelled, flights.in_flight
+
+    assert asyncio.run(scenario()) == (True, 0)
+
+
+def test_leader_failure_propagates_to_followers():
+    async def scenario():
+        flights = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def failing():
+            started.set()
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream failed")
+
+        leader = asyncio.create_task(flights.do(REQUEST, failing))
+        await started.wait()
+        follower = asyncio.create_task(flights.do(REQUEST, failing))
+        results = await asyncio.gather(leader, follower, return_exceptions=True)
+        return results, flights.in_flight
+
+    results, in_flight = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["upstream failed", "upstream failed"]
+    assert in_flight == 0
+
+
+def test_request_key_ignores_key_order_and_namespaces_differ():
+    reordered = {"messages": REQUEST["messages"], "max_tokens": 10, "model": "gpt-4o"}
+
+    assert request_key(REQUEST) == request_key(reordered)
+    assert request_key(REQUEST, namespace="a") != request_key(REQUEST, namespace="b")
+    assert request_key(dict(REQUEST, temperature=0.7)) != request_key(dict(REQUEST, temperature=0.5))
@@ -0,0 +1,131 @@
+"""Tests for the translation of OpenAI stream deltas into Claude SSE events."""
+
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from src.conversion import stream_translator
+from src.conversion.stream_translator import FINISHED, StreamTranslator
+from src.core.stream_delta import StreamDelta, ToolCallFragment
+
+
+def events(frames):
+    """(event type, payload) of every SSE frame in `frames`."""
+    parsed = []
+    for frame in (frames or b"").split(b"\n\n"):
+        if frame:
+            event_line, data_line = frame.split(b"\n", 1)
+            parsed.append((event_line[len(b"event: "):].decode(), json.loads(data_line[len(b"data: "):])))
+    return parsed
+
+
+def types(frames):
+    return [event_type for event_type, _ in events(frames)]
+
+
+def text(content):
+    return StreamDelta(True, content=content)
+
+
+def tool(index, arguments, id=None, name=None):
+    return StreamDelta(True, tool_calls=[ToolCallFragment(index, id, name, arguments)])
+
+
+@pytest.fixture(autouse=True)
+def buffered_tool_arguments(monkeypatch):
+    monkeypatch.setattr(stream_translator.config, "stream_tool_arguments", False)
+
+
+def test_start_opens_message_and_text_block():
+    translator = StreamTranslator("claude-sonnet-4", message_id="msg_1")
+    start = events(translator.start())
+
+    assert [event_type for event_type, _ in start] == ["message_start", "content_block_start", "ping"]
+    assert start[0][1]["message"]["id"] == "msg_1"
+    assert start[0][1]["message"]["model"] == "claude-sonnet-4"
+    assert start[1][1] == {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+
+
+def test_text_and_thinking_go_to_the_primary_block():
+    translator = StreamTranslator("claude-sonnet-4")
+    translator.start()
+    out = events(translator.feed(StreamDelta(True, content="Hello", reasoning="Let me think")))
+
+    assert [payload["delta"] for _, payload in out] == [
+        {"type": "thinking_delta", "thinking": "Let me think"},
+        {"type": "text_delta", "text": "Hello"},
+    ]
+    assert all(payload["index"] == 0 for _, payload in out)
+
+
+def test_tool_block_starts_once_id_and_name_are_known():
+    translator = StreamTranslator("claude-sonnet-4")
+    translator.start()
+
+    assert translator.feed(tool(0, None, id="call_1")) is None
+    started = events(translator.feed(tool(0, '{"path": ', name="Read")))
+    sent = events(translator.feed(tool(0, '"a.py"}')))
+
+    assert started == [("content_block_start", {
+        "type": "content_block_start", "index": 1,
+        "content_block": {"type": "tool_use", "id": "call_1", "name": "Read", "input": {}},
+    })]
+    assert sent[0][1]["delta"] == {"type": "input_json_delta", "partial_json": '{"path": "a.py"}'}
+    assert sent[0][1]["index"] == 1
+
+
+def test_finish_closes_blocks_in_order_with_usage_and_stop_reason():
+    translator = StreamTranslator("claude-sonnet-4")
+    translator.start()
+    translator.feed(text("Reading"))
+    translator.feed(tool(0, "{}", id="call_1", name="Read"))
+    translator.feed(tool(1, "{}", id="call_2", name="Grep"))
+    translator.feed(StreamDelta(True, finish_reason="tool_calls"))
+    translator.feed(StreamDelta(usage={"prompt_tokens": 12, "completion_tokens": 5, "cached_tokens": 4}))
+    out = events(translator.finish())
+
+    assert [(event_type, payload.get("index")) for event_type, payload in out] == [
+        ("content_block_stop", 0), ("content_block_stop", 1), ("content_block_stop", 2),
+        ("message_delta", None), ("message_stop", None),
+    ]
+    assert out[3][1]["delta"]["stop_reason"] == "tool_use"
+    assert out[3][1]["usage"] == {"input_tokens": 12, "output_tokens": 5, "cache_read_input_tokens": 4}
+
+
+@pytest.mark.parametrize("finish_reason, stop_reason", [
+    ("stop", "end_turn"),
+    ("length", "max_tokens"),
+    ("tool_calls", "tool_use"),
+    ("function_call", "tool_use"),
+    ("content_filter", "end_turn"),
+])
+def test_stop_reason_mapping(finish_reason, stop_reason):
+    translator = StreamTranslator("claude-sonnet-4")
+    translator.start()
+    translator.feed(StreamDelta(True, finish_reason=finish_reason))
+
+    assert events(translator.finish())[-2][1]["delta"]["stop_reason"] == stop_reason
+
+
+def test_feed_and_finish_start_a_pending_message():
+    translator = StreamTranslator("claude-sonnet-4")
+    assert types(translator.feed(text("Hi"))) == ["message_start", "content_block_start", "ping", "content_block_delta"]
+
+    empty = StreamTranslator("claude-sonnet-4")
+    assert types(empty.finish()) == [
+        "message_start", "content_block_start", "ping", "content_block_stop", "message_delta", "message_stop",
+    ]
+
+
+def test_feed_after_finish_is_dropped():
+    translator = StreamTranslator("claude-sonnet-4")
+    translator.start()
+    translator.finish()
+
+    assert translator.feed(text("late")) is None
+    assert translator.feed(tool(0, "{}", id="call_1", name="Read")) is None
+    assert translator.state == FINISHED
+    assert translator.finish() == b""
@@ -0,0 +1,124 @@
+"""Tests for the cache of validated and converted tool sets."""
+
+import copy
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from pydantic import ValidationError
+
+from src.conversion.request_converter import convert_claude_to_openai
+from src.conversion.request_decoder import RequestDecoder
+from src.conversion.tool_cache import ToolCache
+from src.core.config import config
+from src.core.model_manager import ModelManager
+
+
+def tools(*names, schema=None):
+    return [
+        {"name": name, "description": f"{name} tool", "input_schema": schema or {"type": "object", "properties": {"path": {"type": "string"}}}}
+        for name in names
+    ]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(config, "tool_cache_size", 2)
+    return ToolCache()
+
+
+def test_same_tool_set_reuses_validated_models(cache):
+    first = cache.validate(tools("Read", "Edit"))
+    second = cache.validate(tools("Read", "Edit"))
+
+    assert second is first
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_converted_tools_are_shared_between_requests(cache):
+    validated = cache.validate(tools("Read", "Edit"))
+    payload = cache.convert(validated)
+
+    assert cache.convert(cache.validate(tools("Read", "Edit"))) is payload
+    assert [tool["function"]["name"] for tool in payload] == ["Read", "Edit"]
+    assert json.loads(payload.data) == list(payload)
+
+
+def test_changed_tool_set_is_a_miss(cache):
+    first = cache.validate(tools("Read", "Edit"))
+    other = cache.validate(tools("Read", "Write"))
+
+    assert other is not first
+    assert [tool.name for tool in other] == ["Read", "Write"]
+    assert cache.stats()["misses"] == 2
+
+
+def test_changed_schema_replaces_the_entry(cache):
+    first = cache.validate(tools("Read"))
+    payload = cache.convert(first)
+    changed = tools("Read", schema={"type": "object", "properties": {"file": {"type": "string"}}})
+    second = cache.validate(changed)
+
+    assert second is not first
+    assert second[0].input_schema == changed[0]["input_schema"]
+    assert cache.convert(second) is not payload
+    assert cache.convert(second)[0]["function"]["parameters"] == changed[0]["input_schema"]
+    assert cache.stats() == {"entries": 1, "hits": 0, "misses": 2}
+
+
+def test_changed_description_is_a_miss(cache):
+    first = cache.validate(tools("Read"))
+    changed = copy.deepcopy(tools("Read"))
+    changed[0]["description"] = "Reads files"
+
+    assert cache.validate(changed) is not first
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_set_is_evicted_at_tool_cache_size(cache):
+    read = cache.validate(tools("Read"))
+    cache.validate(tools("Edit"))
+    assert cache.validate(tools("Read")) is read
+    cache.validate(tools("Write"))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.validate(tools("Read")) is read
+    assert cache.stats()["misses"] == 3
+    cache.validate(tools("Edit"))
+    assert cache.stats()["misses"] == 4
+
+
+def test_invalid_tools_raise_and_are_not_cached(cache):
+    with pytest.raises(ValidationError):
+        cache.validate([{"name": "Read"}])
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_validates_every_time(cache, monkeypatch):
+    monkeypatch.setattr(config, "tool_cache_size", 0)
+
+    assert cache.validate(tools("Read")) is not cache.validate(tools("Read"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_decoded_request_carries_cached_tools_into_openai_request(monkeypatch):
+    monkeypatch.setattr(config, "tool_cache_size", 2)
+    cache = ToolCache()
+    monkeypatch.setattr("src.conversion.request_decoder.tool_cache", cache)
+    monkeypatch.setattr("src.conversion.request_converter.tool_cache", cache)
+    decoder = RequestDecoder()
+    model_manager = ModelManager(config)
+    body = json.dumps({
+        "model": "claude-sonnet-4", "max_tokens": 100, "tools": tools("Read", "Edit"),
+        "messages": [{"role": "user", "content": "Hello"}],
+    }).encode()
+
+    first = convert_claude_to_openai(decoder.decode(body), model_manager)
+    second_request = decoder.decode(body)
+    second = convert_claude_to_openai(second_request, model_manager)
+
+    assert second["tools"] is first["tools"]
+    assert second_request.tools is cache.validate(tools("Read", "Edit"))
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
@@ -0,0 +1,242 @@
+"""Tests for endpoint selection and circuit breaking across upstream endpoints."""
+
+import asyncio
+import os
+import random
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError
+
+from src.core import upstreams as upstreams_module
+from src.core.upstreams import CLOSED, HALF_OPEN, OPEN, Upstream, UpstreamSet
+
+REQUEST = httpx.Request("POST", "http://upstream.test/v1/chat/completions")
+
+
+def status_error(code):
+    return APIStatusError(f"status {code}", response=httpx.Response(code, request=REQUEST), body=None)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Stands in for the SDK client in probes: models.list() succeeds while `up`."""
+
+    def __init__(self):
+        self.up = False
+        self.probes = 0
+        self.models = self
+
+    def with_options(self, **options):
+        return self
+
+    async def list(self):
+        self.probes += 1
+        if not self.up:
+            raise APIConnectionError(request=REQUEST)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    config = upstreams_module.config
+    monkeypatch.setattr(config, "breaker_failure_threshold", 3)
+    monkeypatch.setattr(config, "breaker_cooldown_seconds", 30.0)
+    # The background prober only sleeps; tests call probe_open() themselves
+    monkeypatch.setattr(config, "upstream_probe_interval", 3600.0)
+    monkeypatch.setattr(config, "limiter_enabled", False)
+    return config
+
+
+def endpoint_set(*names, clock=None, rng=None):
+    endpoints = [Upstream(name, f"http://{name}/v1", FakeClient()) for name in names]
+    return UpstreamSet("test-" + "-".join(names), endpoints, clock=clock or FakeClock(), rng=rng or random.Random(0))
+
+
+def run(scenario):
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            for name, upstream_set in list(upstreams_module._sets.items()):
+                if name.startswith("test-"):
+                    del upstreams_module._sets[name]
+                    if upstream_set._prober is not None:
+                        upstream_set._prober.cancel()
+
+    return asyncio.run(wrapped())
+
+
+def test_breaker_opens_after_consecutive_failures():
+    async def scenario():
+        upstream_set = endpoint_set("a", "b")
+        a = upstream_set.upstreams[0]
+        upstream_set.failure(a, status_error(502))
+        upstream_set.failure(a, APIConnectionError(request=REQUEST))
+        upstream_set.success(a, 0.1)
+        states = [a.state]
+        for _ in range(3):
+            upstream_set.failure(a, status_error(500))
+        states.append(a.state)
+        return states, a.available(), upstream_set.pick().name
+
+    states, available, picked = run(scenario)
+    assert states == [CLOSED, OPEN]
+    assert not available
+    assert picked == "b"
+
+
+def test_client_errors_and_rate_limits_do_not_open_the_breaker():
+    async def scenario():
+        upstream_set = endpoint_set("a", "b")
+        a = upstream_set.upstreams[0]
+        for _ in range(5):
+            upstream_set.failure(a, status_error(429))
+            upstream_set.failure(a, status_error(400))
+        return a.state, a.error_rate
+
+    state, error_rate = run(scenario)
+    assert state == CLOSED
+    assert error_rate > 0
+
+
+def test_probe_waits_for_cooldown_then_moves_to_half_open():
+    async def scenario():
+        clock = FakeClock()
+        upstream_set = endpoint_set("a", "b", clock=clock)
+        a = upstream_set.upstreams[0]
+        for _ in range(3):
+            upstream_set.failure(a, status_error(503))
+
+        clock.now += 29.0
+        await upstream_set.probe_open()
+        before_cooldown = a.client.probes
+        clock.now += 1.0
+        await upstream_set.probe_open()
+        still_down = (a.state, a.opened_at)
+        a.client.up = True
+        await upstream_set.probe_open()
+        recently_probed = a.state
+        clock.now += 30.0
+        await upstream_set.probe_open()
+        return before_cooldown, still_down, recently_probed, a.state
+
+    before_cooldown, still_down, recently_probed, state = run(scenario)
+    assert before_cooldown == 0
+    # A failed probe restarts the cooldown
+    assert still_down == (OPEN, 1030.0)
+    assert recently_probed == OPEN
+    assert state == HALF_OPEN
+
+
+def test_half_open_endpoint_gets_one_trial_that_closes_or_reopens_it():
+    async def scenario():
+        upstream_set = endpoint_set("a", "b")
+        a, b = upstream_set.upstreams
+        results = []
+        for outcome in ("failure", "success"):
+            for _ in range(3):
+                upstream_set.failure(a, status_error(503))
+            upstream_set._transition(a, HALF_OPEN)
+            # b is busy elsewhere: only a is left to try
+            assert upstream_set.pick(tried=[b]) is a
+            trial_taken = not a.available()
+            if outcome == "failure":
+                upstream_set.failure(a, status_error(503))
+            else:
+                upstream_set.success(a, 0.2)
+            results.append((trial_taken, a.state))
+        return results
+
+    assert run(scenario) == [(True, OPEN), (True, CLOSED)]
+
+
+def test_all_breakers_open_fails_open_to_the_longest_rested():
+    async def scenario():
+        clock = FakeClock()
+        upstream_set = endpoint_set("a", "b", clock=clock)
+        a, b = upstream_set.upstreams
+        for upstream in (b, a):
+            for _ in range(3):
+                upstream_set.failure(upstream, status_error(500))
+            clock.now += 1.0
+        return upstream_set.pick().name
+
+    assert run(scenario) == "b"
+
+
+def test_weighted_selection_prefers_faster_healthier_endpoints():
+    async def scenario():
+        upstream_set = endpoint_set("fast", "slow", rng=random.Random(42))
+        fast, slow = upstream_set.upstreams
+        upstream_set.success(fast, 0.1)
+        upstream_set.success(slow, 0.3)
+        picks = [upstream_set.pick().name for _ in range(4000)]
+        return picks.count("fast") / len(picks)
+
+    # Weights 1/0.1 and 1/0.3: three quarters of the traffic to "fast"
+    assert run(scenario) == pytest.approx(0.75, abs=0.03)
+
+
+def test_weighted_selection_is_reproducible_with_a_seeded_rng():
+    async def scenario(seed):
+        upstream_set = endpoint_set("a", "b", "c", rng=random.Random(seed))
+        return [upstream_set.pick().name for _ in range(50)]
+
+    assert run(lambda: scenario(7)) == run(lambda: scenario(7))
+
+
+def test_retries_prefer_untried_endpoints():
+    async def scenario():
+        upstream_set = endpoint_set("a", "b", "c")
+        a, b, c = upstream_set.upstreams
+        return [upstream_set.pick(tried=[a, b]).name for _ in range(20)]
+
+    assert set(run(scenario)) == {"c"}
+
+
+def home(upstream_set, sessions):
+    return {session: upstream_set.pick(affinity=session).name for session in sessions}
+
+
+def test_ring_keeps_sessions_when_endpoints_are_added_or_removed():
+    async def scenario():
+        sessions = [f"session-{index}" for index in range(2000)]
+        three = home(endpoint_set("a", "b", "c"), sessions)
+        four = home(endpoint_set("a", "b", "c", "d"), sessions)
+        two = home(endpoint_set("a", "b"), sessions)
+        return three, four, two
+
+    three, four, two = run(scenario)
+    moved_on_add = {session for session in three if three[session] != four[session]}
+    assert all(four[session] == "d" for session in moved_on_add)
+    assert 0.15 < len(moved_on_add) / len(three) < 0.35
+    moved_on_remove = {session for session in three if three[session] != two[session]}
+    assert moved_on_remove == {session for session in three if three[session] == "c"}
+
+
+def test_ring_skips_open_and_tried_endpoints_then_returns_home():
+    async def scenario():
+        upstream_set = endpoint_set("a", "b", "c")
+        session = "session-1"
+        home_endpoint = upstream_set.pick(affinity=session)
+        others = [u for u in upstream_set.upstreams if u is not home_endpoint]
+        moved_when_tried = upstream_set.pick(tried=[home_endpoint], affinity=session)
+        for _ in range(3):
+            upstream_set.failure(home_endpoint, status_error(500))
+        moved_when_open = upstream_set.pick(affinity=session)
+        upstream_set._transition(home_endpoint, CLOSED)
+        return home_endpoint, others, moved_when_tried, moved_when_open, upstream_set.pick(affinity=session)
+
+    home_endpoint, others, moved_when_tried, moved_when_open, back = run(scenario)
+    assert moved_when_tried in others
+    assert moved_when_open is moved_when_tried
+    assert back is home_endpoint